@@ -7,7 +7,6 @@ Beautiful, mobile-responsive UI with aligned evaluation questions
 import gradio as gr
 import os
 import time
-from pathlib import Path
 
 # Set environment variable to disable telemetry
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
@@ -15,6 +14,9 @@ os.environ["ANONYMIZED_TELEMETRY"] = "false"
 from src.retrieval import RAGRetriever
 from src.config import Config
 from src.ingestion import DocumentIngestion
+from src.embeddings import preload_embeddings
+from src.index_store import active_index_dir, close_vector_store
+from src.watcher import start_policy_watcher
 
 # Initialize configuration
 config = Config()
@@ -31,16 +33,17 @@ def initialize_system():
     status_messages = []
     
     try:
-        # Check if vector store exists
-        chroma_path = Path(config.CHROMA_DIR)
+        # Load the embedding model once; ingestion and retrieval share it
+        preload_embeddings(config)
         
-        if not chroma_path.exists() or not any(chroma_path.iterdir()):
+        # Check if a promoted vector store exists
+        if active_index_dir(config.CHROMA_DIR) is None:
             status_messages.append("📦 Vector store not found. Building from scratch...")
             status_messages.append("⏳ This will take 2-3 minutes on first run...")
             
             # Build vector store
             ingestion = DocumentIngestion()
-            ingestion.ingest_all()
+            close_vector_store(ingestion.ingest_all())  # the retriever opens its own handle
             
             status_messages.append("✅ Vector store created successfully!")
         else:
@@ -51,6 +54,11 @@ def initialize_system():
         rag_retriever = RAGRetriever()
         status_messages.append("✅ RAG system ready!")
         
+        # Optionally re-index edited policies live; the retriever swaps to new versions
+        if config.WATCH_POLICIES:
+            start_policy_watcher()
+            status_messages.append(f"👀 Watching {config.DATA_DIR} for policy updates")
+        
         return True, "\n".join(status_messages)
         
     except Exception as e:
@@ -71,6 +79,10 @@ def format_response(result):
         formatted += "### 📚 Sources\n\n"
         for i, citation in enumerate(citations, 1):
             source = citation.get('source', 'Unknown')
+            if 'page' in citation:
+                source += f" (page {citation['page']})"
+            if citation.get('also_in'):
+                source += f" (also in: {', '.join(citation['also_in'])})"
             snippet = citation.get('snippet', '')
             formatted += f"**[{i}] {source}**\n\n"
             formatted += f"> {snippet}\n\n"
@@ -78,30 +90,36 @@ def format_response(result):
     return formatted
 
 
-def chat_interface(message, history):
-    """Main chat interface function."""
+async def stream_chat_interface(message, history):
+    """Streaming chat interface: yields the partial answer as tokens arrive, then the full response."""
     global rag_retriever
     
     if not rag_retriever:
-        return "❌ System not initialized. Please refresh the page."
+        yield "❌ System not initialized. Please refresh the page."
+        return
     
     if not message or not message.strip():
-        return "⚠️ Please enter a question."
+        yield "⚠️ Please enter a question."
+        return
     
     try:
-        # Get response from RAG system
         start_time = time.time()
-        result = rag_retriever.query(message)
-        latency = time.time() - start_time
-        
-        # Format response
-        response = format_response(result)
-        response += f"\n---\n⏱️ *Response time: {latency:.2f}s*"
-        
-        return response
+        first_token = None
+        answer = ""
+        async for event in rag_retriever.astream_query(message):
+            if event["type"] == "token":
+                if first_token is None:
+                    first_token = time.time() - start_time
+                answer += event["text"]
+                yield f"### 💬 Answer\n\n{answer} ▌"
+            elif event["type"] == "answer":
+                latency = time.time() - start_time
+                response = format_response(event["result"])
+                response += f"\n---\n⏱️ *First token: {first_token or latency:.2f}s | Response time: {latency:.2f}s*"
+                yield response
         
     except Exception as e:
-        return f"❌ Error processing question: {str(e)}\n\nPlease try again or contact support."
+        yield f"❌ Error processing question: {str(e)}\n\nPlease try again or contact support."
 
 
 def create_interface():
@@ -423,7 +441,7 @@ def create_interface():
             |-----------|--------------|
             | **LLM Model** | {config.GROQ_MODEL} |
             | **Embedding Model** | {config.EMBEDDING_MODEL} |
-            | **Chunk Size** | {config.CHUNK_SIZE} tokens |
+            | **Chunk Size** | {config.CHUNK_SIZE} characters |
             | **Top-K Retrieval** | {config.TOP_K} documents |
             | **Temperature** | {config.TEMPERATURE} |
             | **Max Tokens** | {config.MAX_TOKENS} |
@@ -489,13 +507,16 @@ def create_interface():
                 return message, history
             return "", history + [[message, None]]
         
-        def bot_response(history):
+        async def bot_response(history):
             if not history or history[-1][1] is not None:
-                return history
+                yield history
+                return
             user_msg = history[-1][0]
-            bot_msg = chat_interface(user_msg, history)
-            history[-1][1] = bot_msg
-            return history
+            # Stream the answer into the last message as it is generated; awaiting the LLM
+            # frees the worker for other chats instead of blocking a thread per request
+            async for bot_msg in stream_chat_interface(user_msg, history):
+                history[-1][1] = bot_msg
+                yield history
         
         # Submit on Enter key or button click
         msg.submit(
@@ -530,7 +551,8 @@ if __name__ == "__main__":
     demo = create_interface()
     
     # Launch with appropriate settings for HF Spaces
-    demo.queue(max_size=20)
+    # Handlers are async, so many chats can wait on the LLM at once
+    demo.queue(max_size=config.CHAT_QUEUE_SIZE, default_concurrency_limit=config.CHAT_CONCURRENCY)
     demo.launch(
         server_name="0.0.0.0",
         server_port=7860,
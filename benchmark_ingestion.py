@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ingestion pipeline stage by stage
+Runs full builds against the policy corpus (or a generated synthetic one) in a
+scratch directory and reports per-stage wall time, throughput, peak RSS and a
+per-file-type breakdown as JSON that can be diffed between runs
+
+Examples:
+    python benchmark_ingestion.py
+    python benchmark_ingestion.py --synthetic 200 --types md,txt,html,pdf --runs 3
+    python benchmark_ingestion.py --workers 1 --output before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from src.config import Config
+
+_WORDS = (
+    "employee manager approval request policy leave remote work expense reimbursement "
+    "security access device password travel holiday schedule benefit payroll compliance "
+    "report submit within days business company equipment training review eligible"
+).split()
+
+_BOILERPLATE = (
+    "This policy applies to all full-time and part-time employees. Questions about this "
+    "policy should be directed to Human Resources. The company reserves the right to amend "
+    "this policy at any time."
+)
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(
+        " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def _write_pdf(path: Path, pages: List[str]):
+    """Write a minimal text PDF (one Helvetica text object per page) without extra dependencies."""
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    pages_id = 2 + 2 * len(pages)
+    page_ids = []
+    for text in pages:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        lines = [escaped[i:i + 90] for i in range(0, len(escaped), 90)]
+        stream = ("BT /F1 10 Tf 14 TL 50 750 Td " + " ".join(f"({line}) '" for line in lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(("<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                        "/Resources << /Font << /F1 1 0 R >> >> >>" % (pages_id, len(objects))).encode())
+        page_ids.append(len(objects))
+    objects.append(("<< /Type /Pages /Kids [%s] /Count %d >>"
+                    % (" ".join(f"{i} 0 R" for i in page_ids), len(page_ids))).encode())
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    path.write_bytes(out)
+
+
+def generate_corpus(directory: Path, files: int, types: List[str], sections: int, seed: int = 0):
+    """Generate a deterministic synthetic policy corpus, cycling through the given file types."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(files):
+        suffix = types[i % len(types)]
+        title = f"Synthetic Policy {i}"
+        bodies = [_paragraph(rng) for _ in range(sections)] + [_BOILERPLATE]
+        path = directory / f"synthetic_{i:05d}.{suffix}"
+        if suffix == "md":
+            path.write_text(f"# {title}\n\n" + "\n\n".join(
+                f"## Section {n + 1}\n\n{body}" for n, body in enumerate(bodies)), encoding="utf-8")
+        elif suffix == "html":
+            path.write_text(f"<html><body><h1>{title}</h1>" + "".join(
+                f"<h2>Section {n + 1}</h2><p>{body}</p>" for n, body in enumerate(bodies))
+                + "</body></html>", encoding="utf-8")
+        elif suffix == "txt":
+            path.write_text(title + "\n\n" + "\n\n".join(bodies), encoding="utf-8")
+        elif suffix == "pdf":
+            _write_pdf(path, bodies)
+        else:
+            raise ValueError(f"Unsupported synthetic file type: {suffix}")
+
+
+def _throughput(report: Dict) -> Dict:
+    wall = report["wall_seconds"] or float("nan")
+    stages = report["stages"]
+
+    def items(stage: str) -> int:
+        return stages.get(stage, {}).get("items", 0)
+
+    return {
+        "docs_per_s": round(items("load") / wall, 2),
+        "chunks_per_s": round(items("chunk") / wall, 2),
+        "embeddings_per_s": round(items("embed") / stages["embed"]["seconds"], 2)
+        if stages.get("embed", {}).get("seconds") else None,
+    }
+
+
+def run_benchmark(corpus: Path, runs: int, incremental: bool, embedding_cache: bool) -> List[Dict]:
+    """Ingest `corpus` into a scratch index `runs` times from scratch and collect profiles."""
+    from src.embedding_cache import CachedEmbeddings
+    from src.ingestion import DocumentIngestion
+
+    scratch = Path(tempfile.mkdtemp(prefix="ingest-bench-"))
+    Config.DATA_DIR = str(corpus)
+    Config.EMBEDDING_CACHE_PATH = str(scratch / "embedding_cache.sqlite3") if embedding_cache else ""
+
+    try:
+        ingestion = DocumentIngestion()
+        results = []
+        plan = ["full"] * runs + (["incremental"] if incremental else [])
+        for number, mode in enumerate(plan, 1):
+            # Fresh index root per full run so each one measures a cold build
+            Config.CHROMA_DIR = str(scratch / ("index" if mode == "incremental" else f"index-{number}"))
+            if mode == "incremental":
+                shutil.copytree(scratch / f"index-{runs}", Config.CHROMA_DIR)
+            ingestion.config = Config()
+
+            print(f"\n--- Run {number}/{len(plan)} ({mode}) ---")
+            ingestion.ingest_all(full_rebuild=(mode == "full"))
+            report = ingestion.profiler.report()
+            report["mode"] = mode
+            report["throughput"] = _throughput(report)
+            if isinstance(ingestion.embeddings, CachedEmbeddings):
+                report["embedding_cache"] = {"hits": ingestion.embeddings.hits,
+                                             "misses": ingestion.embeddings.misses}
+            results.append(report)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document ingestion stage by stage")
+    parser.add_argument("--corpus", default=Config.DATA_DIR,
+                        help="Directory of documents to ingest (default: DATA_DIR)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="Generate N synthetic documents instead of using --corpus")
+    parser.add_argument("--types", default="md,txt,html",
+                        help="Comma-separated file types for the synthetic corpus (md,txt,html,pdf)")
+    parser.add_argument("--sections", type=int, default=8,
+                        help="Sections (PDF pages) per synthetic document")
+    parser.add_argument("--runs", type=int, default=1, help="Number of full builds to time")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Also time an incremental run with no changes after the full builds")
+    parser.add_argument("--workers", type=int, help="Override INGEST_WORKERS (1 = serial)")
+    parser.add_argument("--batch-size", type=int, help="Override INGEST_BATCH_SIZE")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Keep the embedding cache enabled (later runs then measure warm-cache builds)")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        Config.INGEST_WORKERS = args.workers
+    if args.batch_size is not None:
+        Config.INGEST_BATCH_SIZE = args.batch_size
+
+    synthetic_dir = None
+    corpus = Path(args.corpus)
+    if args.synthetic:
+        synthetic_dir = Path(tempfile.mkdtemp(prefix="ingest-corpus-"))
+        generate_corpus(synthetic_dir, args.synthetic, args.types.split(","), args.sections)
+        corpus = synthetic_dir
+
+    try:
+        files = [p for p in corpus.glob("*") if p.is_file()]
+        corpus_bytes = sum(p.stat().st_size for p in files)
+        started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        runs = run_benchmark(corpus, args.runs, args.incremental, args.embedding_cache)
+    finally:
+        if synthetic_dir is not None:
+            shutil.rmtree(synthetic_dir, ignore_errors=True)
+
+    result = {
+        "started": started,
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "system": platform.system()},
+        "corpus": {
+            "path": "synthetic" if args.synthetic else str(corpus),
+            "files": len(files),
+            "bytes": corpus_bytes,
+        },
+        "config": {
+            "embedding_model": Config.EMBEDDING_MODEL,
+            "chunk_size": Config.CHUNK_SIZE,
+            "chunk_overlap": Config.CHUNK_OVERLAP,
+            "ingest_workers": Config.INGEST_WORKERS,
+            "ingest_batch_size": Config.INGEST_BATCH_SIZE,
+            "dedup_enabled": Config.DEDUP_ENABLED,
+            "embedding_cache": args.embedding_cache,
+        },
+        "runs": runs,
+    }
+
+    report = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n", encoding="utf-8")
+        print(f"\nBenchmark report written to {args.output}")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
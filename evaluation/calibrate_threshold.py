@@ -0,0 +1,66 @@
+"""
+Calibrate the retrieval confidence threshold
+Retrieves for the answerable evaluation questions and for off-topic negatives,
+then picks the best-match distance above which questions are refused without an LLM call
+"""
+
+import json
+import sys
+import os
+from typing import List
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.retrieval import RAGRetriever
+from src.evaluation import calibrate_distance_threshold
+
+
+def load_questions(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [q['question'] for q in json.load(f)['questions']]
+
+
+def best_distances(retriever: RAGRetriever, questions: List[str]) -> List[float]:
+    """Distance of the closest retrieved chunk per question (questions with no results are skipped)."""
+    results = retriever.retrieve_documents_batch(questions)
+    return [min(doc['score'] for doc in docs) for docs in results if docs]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Calibrate MAX_RELEVANCE_DISTANCE')
+    parser.add_argument('--questions', type=str, default='evaluation/evaluation_questions.json')
+    parser.add_argument('--negatives', type=str, default='evaluation/negative_questions.json')
+    parser.add_argument('--target-recall', type=float, default=1.0,
+                        help='Fraction of answerable questions that must not be refused')
+    parser.add_argument('--margin', type=float, default=0.02)
+    parser.add_argument('--output', type=str, help='Write the calibration report to this JSON file')
+    args = parser.parse_args()
+
+    retriever = RAGRetriever()
+    positives = best_distances(retriever, load_questions(args.questions))
+    negatives = best_distances(retriever, load_questions(args.negatives))
+    report = calibrate_distance_threshold(positives, negatives, args.target_recall, args.margin)
+    report['positives'] = len(positives)
+    report['negatives'] = len(negatives)
+
+    print(f"Answerable questions: {len(positives)}, best distance "
+          f"{min(positives):.3f}-{report['max_positive_distance']:.3f}")
+    if negatives:
+        print(f"Off-topic questions:  {len(negatives)}, best distance "
+              f"{report['min_negative_distance']:.3f}-{max(negatives):.3f}")
+    print(f"Threshold {report['threshold']}: answers {report['positive_recall']:.0%} of answerable questions"
+          + (f", refuses {report['negative_rejection']:.0%} of off-topic ones" if negatives else ""))
+    if negatives and not report['separable']:
+        print("⚠️  Some off-topic questions are closer than answerable ones; they will still reach the LLM")
+    print(f"\nSet in your environment:\nMAX_RELEVANCE_DISTANCE={report['threshold']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
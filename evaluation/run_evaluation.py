@@ -186,6 +186,7 @@ class RAGSystemEvaluator:
                 'chunk_size': self.config.CHUNK_SIZE,
                 'chunk_overlap': self.config.CHUNK_OVERLAP,
                 'top_k': self.config.TOP_K,
+                'rerank_model': self.config.RERANK_MODEL if self.config.RERANK_ENABLED else None,
                 'llm_model': self.config.GROQ_MODEL if self.config.USE_GROQ else 'OpenAI',
                 'embedding_model': self.config.EMBEDDING_MODEL,
                 'temperature': self.config.TEMPERATURE,
@@ -2,16 +2,19 @@
 """
 Rebuild the vector store with improved chunking settings
 Run this after updating config.py to get better retrieval
+
+By default only new, changed or removed policy files are re-processed.
+Pass --full to re-process every document into a fresh index version, or
+--shard NAME to rebuild one shard of a sharded store (VECTOR_SHARDING).
 """
 
-import os
-import shutil
+import argparse
 from pathlib import Path
 from src.ingestion import DocumentIngestion
 from src.config import Config
 
-def rebuild_vector_store():
-    """Delete old vector store and rebuild with new settings."""
+def rebuild_vector_store(full_rebuild: bool = False, shard: str = None):
+    """Build a new index version incrementally (or from scratch with --full) and promote it."""
     
     config = Config()
     chroma_path = Path(config.CHROMA_DIR)
@@ -25,25 +28,27 @@ def rebuild_vector_store():
     config.print_config()
     print()
     
-    # Step 1: Delete old vector store
-    if chroma_path.exists():
-        print(f"🗑️  Deleting old vector store at {chroma_path}...")
-        shutil.rmtree(chroma_path)
-        print("✅ Old vector store deleted")
+    # Step 1: Builds never touch the index being served
+    if full_rebuild:
+        print("🧱 Full rebuild: every document will be re-processed into a new index version")
+    elif shard:
+        print(f"🧩 Shard rebuild: shard '{shard}' is emptied and its documents re-embedded")
     else:
-        print(f"ℹ️  No existing vector store found at {chroma_path}")
-    
+        print("♻️  Incremental mode: only changed policy files will be re-embedded")
+        print("   (settings changes are detected and trigger a full rebuild automatically)")
+    print(f"   New versions are built under {chroma_path / 'versions'}, validated, then promoted")
+    print("   atomically; a running app swaps to them without a restart")
     print()
     
     # Step 2: Rebuild with new settings
     print("🔨 Building new vector store with improved settings...")
-    print(f"   - Chunk Size: {config.CHUNK_SIZE} tokens")
-    print(f"   - Chunk Overlap: {config.CHUNK_OVERLAP} tokens")
+    print(f"   - Chunk Size: {config.CHUNK_SIZE} characters")
+    print(f"   - Chunk Overlap: {config.CHUNK_OVERLAP} characters")
     print(f"   - This will retrieve TOP-{config.TOP_K} chunks per query")
     print()
     
     ingestion = DocumentIngestion()
-    vector_store = ingestion.ingest_all()
+    vector_store = ingestion.ingest_all(full_rebuild=full_rebuild, rebuild_shard=shard)
     
     print()
     print("=" * 70)
@@ -51,13 +56,21 @@ def rebuild_vector_store():
     print("=" * 70)
     print()
     print("📊 Improvements:")
-    print("   ✅ Larger chunks (400 tokens) for more complete context")
-    print("   ✅ More overlap (50 tokens) for better continuity")
-    print("   ✅ Retrieving 4 chunks instead of 2 for comprehensive answers")
-    print("   ✅ Lower temperature (0.2) for more focused responses")
+    print(f"   ✅ Larger chunks ({config.CHUNK_SIZE} characters) for more complete context")
+    print(f"   ✅ More overlap ({config.CHUNK_OVERLAP} characters) for better continuity")
+    print(f"   ✅ Retrieving {config.TOP_K} chunks per query for comprehensive answers")
+    print(f"   ✅ Temperature {config.TEMPERATURE} for focused responses")
     print()
     print("🚀 You can now test the chatbot with better retrieval!")
     print()
 
 if __name__ == "__main__":
-    rebuild_vector_store()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Rebuild the policy vector store')
+    parser.add_argument('--full', action='store_true',
+                        help='Re-process every document into a fresh index version and promote it; '
+                             'previous versions are kept per INDEX_KEEP_VERSIONS')
+    parser.add_argument('--shard', type=str,
+                        help='Rebuild only this shard of a sharded store (e.g. shard-01 or pto)')
+    args = parser.parse_args()
+
+    rebuild_vector_store(full_rebuild=args.full, shard=args.shard)
\ No newline at end of file
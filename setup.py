@@ -11,7 +11,6 @@ setup(
         "requests",
         "beautifulsoup4",
         "pypdf",
-        "markdown",
         "gunicorn", # <--- NEW: Gunicorn added for deployment
         "langchain",
         "langchain-community",
@@ -20,6 +19,7 @@ setup(
         "langchain-text-splitters", # <-- NEW PACKAGE ADDED
         "langchain-huggingface",  # <-- NEW PACKAGE ADDED
         "langchain-groq",
+        "tiktoken",
         "langchain-openai",
         "huggingface-hub",
         "torch",
@@ -28,5 +28,8 @@ setup(
         "scikit-learn",
         "tqdm",
     ],
+    extras_require={
+        "onnx": ["onnxruntime", "tokenizers"],
+    },
     python_requires=">=3.13",
 )
\ No newline at end of file
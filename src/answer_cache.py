@@ -0,0 +1,182 @@
+"""
+Persistent two-tier cache of generated answers
+An exact tier keyed by the normalized question and a semantic tier matching
+paraphrases by query-embedding cosine similarity. Entries belong to the index
+version they were answered from and are dropped once another version is served.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_cache import QueryEmbeddingCache
+
+
+class AnswerCache:
+    """SQLite-backed answer cache with TTL expiry and least-recently-used eviction."""
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 86400,
+                 similarity_threshold: float = 0.95):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                   question TEXT NOT NULL,
+                   index_version TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   result TEXT NOT NULL,
+                   created REAL NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (question, index_version)
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers (last_used)")
+        self._conn.commit()
+        # In-memory copy of the semantic tier for the version being served
+        self._version = None
+        # Versions already replaced; late requests still carrying one must not wipe the cache
+        self._retired = set()
+        self._keys: List[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _sync_version(self, index_version: str) -> bool:
+        """Switch to a newly served index version, dropping answers from the others (lock held).
+
+        Returns False for a version that was already replaced: a request that
+        started before the swap must neither read nor write the cache.
+        """
+        if index_version == self._version:
+            return True
+        if index_version in self._retired:
+            return False
+        self._conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,))
+        self._conn.commit()
+        if self._version is not None:
+            self._retired.add(self._version)
+        self._version = index_version
+        self._reload_vectors()
+        return True
+
+    def _reload_vectors(self):
+        rows = self._conn.execute(
+            "SELECT question, vector FROM answers WHERE index_version = ? AND created > ?",
+            (self._version, time.time() - self.ttl_seconds)
+        ).fetchall()
+        self._keys = [question for question, _ in rows]
+        self._matrix = (np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                        if rows else np.empty((0, 0), dtype=np.float32))
+
+    def _nearest(self, vector) -> Tuple[Optional[str], float]:
+        if not self._keys or self.similarity_threshold <= 0:
+            return None, 0.0
+        similarities = self._matrix @ self._unit(vector)
+        best = int(np.argmax(similarities))
+        return self._keys[best], float(similarities[best])
+
+    def _fetch(self, key: str, index_version: str, now: float) -> Optional[Dict]:
+        """A fresh cached result for a normalized question and index version, marked as used (lock held).
+
+        Another process sharing the file may still be answering from an older
+        version, so rows are matched on the version as well as the question.
+        """
+        row = self._conn.execute(
+            "SELECT result, created FROM answers WHERE question = ? AND index_version = ?",
+            (key, index_version)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+        self._conn.execute("UPDATE answers SET last_used = ? WHERE question = ? AND index_version = ?",
+                           (now, key, index_version))
+        self._conn.commit()
+        return json.loads(row[0])
+
+    def get_exact(self, question: str, index_version: str) -> Optional[Dict]:
+        """Exact-tier lookup, which needs no query embedding; a miss is not counted yet."""
+        with self._lock:
+            if not self._sync_version(index_version):
+                return None
+            result = self._fetch(QueryEmbeddingCache.normalize(question), index_version, time.time())
+            if result is not None:
+                self.hits["exact"] += 1
+        return result
+
+    def get_similar(self, vector: List[float], index_version: str) -> Optional[Dict]:
+        """Semantic-tier lookup for a question that missed the exact tier."""
+        with self._lock:
+            result = None
+            if self._sync_version(index_version):
+                nearest, similarity = self._nearest(vector)
+                if nearest is not None and similarity >= self.similarity_threshold:
+                    result = self._fetch(nearest, index_version, time.time())
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits["semantic"] += 1
+        return result
+
+    def put(self, question: str, vector: List[float], index_version: str, result: Dict):
+        """Store an answer and evict expired and least recently used entries.
+
+        Answers from an index version that has since been replaced are dropped.
+        """
+        key = QueryEmbeddingCache.normalize(question)
+        unit = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            if not self._sync_version(index_version):
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (question, index_version, vector, result, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, index_version, unit.tobytes(), json.dumps(result), now, now)
+            )
+            evicted = self._evict(now)
+            self._conn.commit()
+            if evicted or key in self._keys or (self._keys and self._matrix.shape[1] != len(unit)):
+                self._reload_vectors()
+            else:
+                self._keys.append(key)
+                self._matrix = np.vstack([self._matrix, unit]) if self._keys[:-1] else unit[None, :]
+
+    def _evict(self, now: float) -> int:
+        """Delete expired entries, then the least recently used beyond capacity; returns rows deleted."""
+        deleted = self._conn.execute(
+            "DELETE FROM answers WHERE created <= ?", (now - self.ttl_seconds,)
+        ).rowcount
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            deleted += self._conn.execute(
+                "DELETE FROM answers WHERE rowid IN "
+                "(SELECT rowid FROM answers ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            ).rowcount
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        return {"entries": count, "exact_hits": self.hits["exact"],
+                "semantic_hits": self.hits["semantic"], "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
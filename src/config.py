@@ -17,17 +17,108 @@ class Config:
     
     # Embedding Model - Small and efficient
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'huggingface')  # huggingface (PyTorch) or onnx (ONNX Runtime)
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
+    # Created by `python -m src.embeddings export`; the int8 model is used unless ONNX_QUANTIZED=false
+    ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', os.path.join('models', 'onnx', EMBEDDING_MODEL.split('/')[-1]))
+    ONNX_QUANTIZED = os.getenv('ONNX_QUANTIZED', 'true').lower() == 'true'
+    ONNX_THREADS = int(os.getenv('ONNX_THREADS', 0))  # 0 = ONNX Runtime default
     
     # 🔥 IMPROVED: Better chunking and retrieval for more complete answers
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 400))  # Increased from 300 for more context
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 50))  # Increased overlap for better continuity
     TOP_K = int(os.getenv('TOP_K', 4))  # Increased from 2 to get more relevant chunks
     MAX_TOKENS = int(os.getenv('MAX_TOKENS', 500))  # Increased from 300 for complete answers
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1200))  # Hard ceiling on retrieved-context prompt tokens
     TEMPERATURE = float(os.getenv('TEMPERATURE', 0.2))  # Lowered for more focused answers
     
     # Paths
     DATA_DIR = 'data/policies'
     CHROMA_DIR = 'chroma_db'
+    MANIFEST_FILE = 'ingestion_manifest.json'  # Written inside each index version for incremental re-ingestion
+    
+    # Blue/green index builds: CHROMA_DIR/versions/<version>, promoted via CHROMA_DIR/CURRENT
+    INDEX_KEEP_VERSIONS = int(os.getenv('INDEX_KEEP_VERSIONS', 2))  # Active + previous, for in-flight readers
+    INDEX_REFRESH_SECONDS = float(os.getenv('INDEX_REFRESH_SECONDS', 5))  # How often retrievers check for a new version
+    
+    # Ingestion
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 0))  # Document loader processes (0 = one per CPU, 1 = serial)
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 256))  # Chunks embedded and upserted per batch
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 64))  # Larger PDFs are split across loader processes
+    PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 16))
+    
+    # Near-duplicate chunk elimination (MinHash/LSH) between chunking and embedding
+    DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+    DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', 0.9))  # Estimated Jaccard similarity of word shingles
+    DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', 64))
+    DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', 16))
+    DEDUP_INDEX_FILE = 'dedup_index.sqlite3'  # Written inside each index version
+    
+    # Live re-indexing of DATA_DIR (inotify via watchdog when installed, polling otherwise)
+    WATCH_POLICIES = os.getenv('WATCH_POLICIES', 'false').lower() == 'true'
+    WATCH_DEBOUNCE_SECONDS = float(os.getenv('WATCH_DEBOUNCE_SECONDS', 2.0))  # Quiet period before re-ingesting a burst
+    WATCH_POLL_SECONDS = float(os.getenv('WATCH_POLL_SECONDS', 1.0))
+    
+    # Embedding cache keyed by (model, sha256(chunk)); kept outside CHROMA_DIR so it survives full rebuilds
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3')  # Empty disables
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+    
+    # Hybrid retrieval: BM25 over a lexical index kept in each index version, fused with
+    # vector results by reciprocal rank
+    HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+    LEXICAL_INDEX_FILE = 'lexical_index.sqlite3'
+    BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+    BM25_B = float(os.getenv('BM25_B', 0.75))
+    RRF_K = int(os.getenv('RRF_K', 60))
+    RETRIEVAL_OVERFETCH = float(os.getenv('RETRIEVAL_OVERFETCH', 2.0))  # Candidates per retriever = TOP_K x this
+    
+    # Optional cross-encoder reranking of the overfetched candidates before the final TOP_K cut;
+    # if scoring overruns RERANK_BUDGET_MS the retrieval order is kept
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'false').lower() == 'true'
+    RERANK_MODEL = os.getenv('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+    RERANK_BUDGET_MS = float(os.getenv('RERANK_BUDGET_MS', 150))
+    RERANK_BATCH_SIZE = int(os.getenv('RERANK_BATCH_SIZE', 16))
+    
+    # Query routing: questions whose keywords clearly point to one policy category only search
+    # that category's documents; everything else searches the whole index
+    QUERY_ROUTING = os.getenv('QUERY_ROUTING', 'true').lower() == 'true'
+    ROUTER_RULES_FILE = os.getenv('ROUTER_RULES_FILE', '')  # JSON {category: {sources, keywords}}; built-in rules if empty
+    ROUTER_MIN_MATCHES = int(os.getenv('ROUTER_MIN_MATCHES', 1))  # Keyword matches the winning category needs
+    ROUTER_MARGIN = int(os.getenv('ROUTER_MARGIN', 1))  # Lead over the runner-up category
+    
+    # Questions whose closest chunk is farther than this (vector distance) are refused without
+    # an LLM call; model-specific, so 0 (off) until set from `python evaluation/calibrate_threshold.py`
+    MAX_RELEVANCE_DISTANCE = float(os.getenv('MAX_RELEVANCE_DISTANCE', 0))
+    
+    # Answer cache: exact (normalized question) and semantic (query cosine similarity) tiers, cleared
+    # whenever a new index version is served; kept outside CHROMA_DIR like the embedding cache
+    ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', 'answer_cache.sqlite3')  # Empty disables
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 5000))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', 86400))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))  # Paraphrase hit threshold (0 = exact only)
+
+    # Async pipeline (RAGRetriever.aquery, used by the Gradio app): LLM calls are awaited, while
+    # embedding and search run on a bounded thread pool so in-flight questions don't oversubscribe the CPU
+    RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', 4))
+    CHAT_CONCURRENCY = int(os.getenv('CHAT_CONCURRENCY', 200))  # Chat requests Gradio runs at once
+    CHAT_QUEUE_SIZE = int(os.getenv('CHAT_QUEUE_SIZE', 1000))  # Requests waiting beyond that
+    
+    # Vector search backend: chroma, or matrix (exact search over a memory-mapped .npy exported per index version)
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+    
+    # Sharded Chroma store: chunks split by source document across collections (hash or policy
+    # category), searched in parallel and merged; changing the layout triggers a full rebuild
+    VECTOR_SHARDING = os.getenv('VECTOR_SHARDING', 'none')  # none, hash or category
+    VECTOR_SHARDS = int(os.getenv('VECTOR_SHARDS', 4))  # Shard count for hash sharding
+    SHARD_SEARCH_WORKERS = int(os.getenv('SHARD_SEARCH_WORKERS', 0))  # Fan-out threads (0 = one per shard)
+    
+    # Compact vector storage: PCA (fitted at full rebuild) or truncation to VECTOR_DIMENSIONS, and/or
+    # float16 precision; `python -m src.vector_compression` reports the recall@k cost of each option
+    VECTOR_REDUCTION = os.getenv('VECTOR_REDUCTION', 'none')  # none, pca or truncate
+    VECTOR_DIMENSIONS = int(os.getenv('VECTOR_DIMENSIONS', 192))
+    VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float32')  # float32 or float16
+    VECTOR_FIT_SAMPLES = int(os.getenv('VECTOR_FIT_SAMPLES', 4096))  # Chunks embedded to fit PCA
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 1024))  # In-memory LRU of query vectors (0 disables)
     
     # Application
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
@@ -51,10 +142,11 @@ class Config:
         print("=" * 60)
         print(f"LLM Provider:      {'Groq (API)' if cls.USE_GROQ else 'OpenAI'}")
         print(f"LLM Model:         {cls.GROQ_MODEL}")
-        print(f"Embedding Model:   {cls.EMBEDDING_MODEL}")
-        print(f"Chunk Size:        {cls.CHUNK_SIZE} tokens")
-        print(f"Chunk Overlap:     {cls.CHUNK_OVERLAP} tokens")
+        print(f"Embedding Model:   {cls.EMBEDDING_MODEL} ({cls.EMBEDDING_BACKEND})")
+        print(f"Chunk Size:        {cls.CHUNK_SIZE} characters")
+        print(f"Chunk Overlap:     {cls.CHUNK_OVERLAP} characters")
         print(f"Top-K Retrieval:   {cls.TOP_K} chunks")
+        print(f"Context Budget:    {cls.CONTEXT_TOKEN_BUDGET} tokens")
         print(f"Max Tokens:        {cls.MAX_TOKENS} tokens")
         print(f"Temperature:       {cls.TEMPERATURE}")
         print(f"API Key Set:       {'✅' if cls.GROQ_API_KEY else '❌'}")
@@ -0,0 +1,88 @@
+"""
+Token-budgeted context packing
+Fills the prompt's context section greedily by relevance under a hard token
+ceiling, truncating or skipping chunks that do not fit
+"""
+
+import math
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+# Truncated chunks shorter than this are more noise than context
+MIN_TRUNCATED_TOKENS = 48
+
+
+class TokenCounter:
+    """Counts (and truncates to) LLM tokens.
+
+    Uses tiktoken's cl100k_base encoding when available, which tracks the
+    Llama 3 BPE closely; otherwise falls back to a ~3.5 characters/token estimate
+    that errs on the side of overcounting.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 3.5)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+        return text[:int(max_tokens * 3.5)]
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    return TokenCounter()
+
+
+def format_source_header(index: int, doc: Dict) -> str:
+    """Header line introducing one chunk in the prompt context."""
+    source_label = f"{doc['source']}, page {doc['page']}" if "page" in doc else doc["source"]
+    return f"[Source {index}: {source_label}]\n"
+
+
+def pack_context(docs: List[Dict], budget: int, counter: TokenCounter = None,
+                 separator: str = "\n\n---\n\n",
+                 header: Callable[[int, Dict], str] = format_source_header) -> List[Dict]:
+    """Select docs (already sorted by relevance) whose formatted context fits in `budget` tokens.
+
+    Docs are taken in order while they fit. A doc that does not fit is truncated
+    if at least MIN_TRUNCATED_TOKENS remain, otherwise skipped so a smaller,
+    less relevant doc can still use the space. Returned docs are copies; truncated
+    ones carry "truncated": True.
+    """
+    counter = counter or get_token_counter()
+    separator_tokens = counter.count(separator)
+    packed, used = [], 0
+
+    for doc in docs:
+        overhead = counter.count(header(len(packed) + 1, doc)) + (separator_tokens if packed else 0)
+        remaining = budget - used - overhead
+        if remaining <= 0:
+            continue
+
+        content_tokens = counter.count(doc["content"])
+        if content_tokens <= remaining:
+            packed.append(dict(doc))
+            used += overhead + content_tokens
+        elif remaining >= MIN_TRUNCATED_TOKENS:
+            content = counter.truncate(doc["content"], remaining)
+            packed.append({**doc, "content": content, "truncated": True})
+            used += overhead + counter.count(content)
+
+    return packed
@@ -0,0 +1,130 @@
+"""
+Near-duplicate chunk detection with MinHash and locality-sensitive hashing
+Used at ingest time so boilerplate repeated across policies is embedded once
+"""
+
+import random
+import re
+import sqlite3
+import zlib
+from array import array
+from pathlib import Path
+from typing import Container, Iterable, List, Optional
+
+from .manifest import hash_bytes
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN = re.compile(r"\w+")
+
+
+class MinHasher:
+    """Computes MinHash signatures over word shingles."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # Fixed seed: signatures must be comparable across ingestion runs
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def _shingles(self, text: str) -> set:
+        tokens = _TOKEN.findall(text.lower())
+        if len(tokens) < self.shingle_size:
+            return {" ".join(tokens)}
+        return {
+            " ".join(tokens[i:i + self.shingle_size])
+            for i in range(len(tokens) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> List[int]:
+        hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in self._shingles(text)]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class NearDuplicateIndex:
+    """SQLite-persisted LSH index over the signatures of canonical (embedded) chunks."""
+
+    def __init__(self, path: str, num_perm: int = 64, bands: int = 16, threshold: float = 0.9):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.path = Path(path)
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.threshold = threshold
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (chunk_id TEXT PRIMARY KEY, signature BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (band INTEGER NOT NULL, bucket TEXT NOT NULL, "
+            "chunk_id TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_chunk ON buckets (chunk_id)")
+        self._conn.commit()
+
+    def _buckets(self, signature: List[int]):
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, hash_bytes(array("Q", values).tobytes())[:16]
+
+    def find(self, signature: List[int], exclude: Container[str] = ()) -> Optional[str]:
+        """Return the id of the most similar indexed chunk above the threshold, if any.
+
+        Chunks in `exclude` are never returned (e.g. chunks about to be deleted).
+        """
+        candidates = set()
+        for band, bucket in self._buckets(signature):
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+            ).fetchall()
+            candidates.update(chunk_id for (chunk_id,) in rows if chunk_id not in exclude)
+
+        best_id, best_score = None, self.threshold
+        for chunk_id in sorted(candidates):
+            row = self._conn.execute(
+                "SELECT signature FROM signatures WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            score = estimate_similarity(signature, array("Q", row[0]).tolist())
+            if score >= best_score:
+                best_id, best_score = chunk_id, score
+        return best_id
+
+    def add(self, chunk_id: str, signature: List[int]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO signatures (chunk_id, signature) VALUES (?, ?)",
+            (chunk_id, array("Q", signature).tobytes())
+        )
+        self._conn.executemany(
+            "INSERT INTO buckets (band, bucket, chunk_id) VALUES (?, ?, ?)",
+            [(band, bucket, chunk_id) for band, bucket in self._buckets(signature)]
+        )
+
+    def remove(self, chunk_ids: Iterable[str]):
+        ids = [(chunk_id,) for chunk_id in chunk_ids]
+        self._conn.executemany("DELETE FROM signatures WHERE chunk_id = ?", ids)
+        self._conn.executemany("DELETE FROM buckets WHERE chunk_id = ?", ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM signatures WHERE chunk_id = ?", (chunk_id,)
+        ).fetchone() is not None
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
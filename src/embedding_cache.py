@@ -0,0 +1,214 @@
+"""
+Persistent on-disk embedding cache
+Vectors are keyed by (embedding model, sha256 of chunk text) so re-ingestion and
+re-chunking experiments only pay the model for texts it has never seen
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from .manifest import hash_text
+
+# Stay well below SQLite's host-parameter limit
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """SQLite-backed vector store with least-recently-used eviction."""
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                   model TEXT NOT NULL,
+                   text_hash TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (model, text_hash)
+               )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, text_hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the given hashes, refreshing their recency."""
+        found = {}
+        now = time.time()
+        unique = list(dict.fromkeys(text_hashes))
+        with self._lock:
+            for start in range(0, len(unique), _SQL_BATCH):
+                batch = unique[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash, _ in rows]
+                )
+            self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """Store vectors and evict the least recently used entries beyond capacity."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (model, text_hash, array("f", vector).tobytes(), now)
+                    for text_hash, vector in items.items()
+                ]
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """Bounded, thread-safe in-memory LRU of normalized query text -> query vector."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        # Spacing only: EMBEDDING_MODEL may be cased, so "IT" and "it" can embed differently
+        return " ".join(query.split())
+
+    def get_or_compute(self, query: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Return the cached vector for `query`, computing (outside the lock) and storing it on a miss."""
+        key = self.normalize(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = compute(query)
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return vector
+
+    def get_or_compute_many(self, queries: Sequence[str],
+                            compute_many: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """get_or_compute() for several queries; all misses are computed with one call."""
+        keys = [self.normalize(query) for query in queries]
+        vectors = {}
+        missing = {}
+        with self._lock:
+            for key, query in zip(keys, queries):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    vectors[key] = vector
+                elif key in missing:
+                    self.hits += 1  # repeated within the batch
+                else:
+                    self.misses += 1
+                    missing[key] = query
+
+        if missing:
+            computed = dict(zip(missing.keys(), compute_many(list(missing.values()))))
+            vectors.update(computed)
+            if self.max_entries > 0:
+                with self._lock:
+                    for key, vector in computed.items():
+                        self._entries[key] = vector
+                        self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that consults an EmbeddingCache before calling the model."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [hash_text(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, hashes)
+
+        # Embed each unseen text once, even if it repeats within the batch
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), computed))
+            self.cache.put_many(self.model_name, new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
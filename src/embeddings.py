@@ -0,0 +1,322 @@
+"""
+Pluggable embedding backends
+"huggingface" runs sentence-transformers on PyTorch; "onnx" runs the same model
+exported to ONNX (optionally int8-quantized) on ONNX Runtime, without torch
+"""
+
+import gc
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+# One loaded model per backend/model configuration, shared by ingestion and retrieval
+_registry: Dict[Tuple, Embeddings] = {}
+_registry_lock = threading.Lock()
+
+
+def embedding_model_id(config: Config) -> str:
+    """Identity of the vectors a config produces; used for cache keys and rebuild detection."""
+    if config.EMBEDDING_BACKEND.lower() == "onnx":
+        return f"{config.EMBEDDING_MODEL}@onnx-{'int8' if config.ONNX_QUANTIZED else 'fp32'}"
+    return config.EMBEDDING_MODEL
+
+
+def create_embeddings(config: Optional[Config] = None) -> Embeddings:
+    """Instantiate the embedding backend selected by Config.EMBEDDING_BACKEND."""
+    config = config or Config()
+    backend = config.EMBEDDING_BACKEND.lower()
+
+    if backend == "huggingface":
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+        except ImportError:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=config.EMBEDDING_MODEL)
+
+    if backend == "onnx":
+        embeddings = OnnxEmbeddings(
+            config.ONNX_MODEL_DIR,
+            quantized=config.ONNX_QUANTIZED,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            threads=config.ONNX_THREADS
+        )
+        if embeddings.model_name != config.EMBEDDING_MODEL:
+            raise ValueError(
+                f"ONNX model in {config.ONNX_MODEL_DIR} was exported from {embeddings.model_name}, "
+                f"but EMBEDDING_MODEL is {config.EMBEDDING_MODEL}"
+            )
+        return embeddings
+
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {config.EMBEDDING_BACKEND}")
+
+
+def _registry_key(config: Config) -> Tuple:
+    backend = config.EMBEDDING_BACKEND.lower()
+    if backend == "onnx":
+        return (backend, config.EMBEDDING_MODEL, config.ONNX_MODEL_DIR, config.ONNX_QUANTIZED,
+                config.EMBEDDING_BATCH_SIZE, config.ONNX_THREADS)
+    return (backend, config.EMBEDDING_MODEL)
+
+
+def get_embeddings(config: Optional[Config] = None) -> Embeddings:
+    """Process-wide shared embedding model for `config`, created on first use."""
+    config = config or Config()
+    key = _registry_key(config)
+    # Loading under the lock means concurrent first callers wait for one load instead of racing
+    with _registry_lock:
+        embeddings = _registry.get(key)
+        if embeddings is None:
+            embeddings = create_embeddings(config)
+            _registry[key] = embeddings
+    return embeddings
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """embed_query() for several texts, in one model call where the backend allows it."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if hasattr(embeddings, "query_encode_kwargs") and hasattr(embeddings, "_embed"):
+        # langchain_huggingface encodes queries with query_encode_kwargs (e.g. a query prompt) when set
+        return embeddings._embed(texts, embeddings.query_encode_kwargs or embeddings.encode_kwargs)
+    if type(embeddings).__name__ == "HuggingFaceEmbeddings":
+        # The langchain_community fallback's embed_query() is embed_documents([text])[0]
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def preload_embeddings(config: Optional[Config] = None, freeze: bool = False) -> Embeddings:
+    """Load the shared model now, e.g. in a pre-fork server master before workers start.
+
+    With freeze=True, gc.freeze() moves everything allocated so far into a permanent
+    generation, so garbage collection in forked workers does not write to (and thereby
+    copy) the memory pages holding the model weights.
+    """
+    embeddings = get_embeddings(config)
+    embeddings.embed_query("warm up")
+    if freeze:
+        gc.freeze()
+    return embeddings
+
+
+def _pool(hidden: np.ndarray, attention_mask: np.ndarray, pooling: str, normalize: bool) -> np.ndarray:
+    """Sentence-transformers pooling over token states: mean (mask-weighted) or CLS."""
+    if pooling == "cls":
+        vectors = hidden[:, 0]
+    else:
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an exported ONNX transformer on ONNX Runtime (CPU).
+
+    Expects the directory written by export_onnx_model(): the ONNX graph(s),
+    tokenizer.json and embedding_config.json with pooling settings.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, batch_size: int = 32, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = Path(model_dir)
+        model_file = model_path / (ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if not model_file.exists():
+            raise FileNotFoundError(
+                f"{model_file} not found; export it with: python -m src.embeddings export"
+            )
+        with open(model_path / ONNX_CONFIG_FILE, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+
+        self.model_name = settings["model_name"]
+        self.pooling = settings.get("pooling", "mean")
+        self.normalize = settings.get("normalize", True)
+        self.batch_size = max(1, batch_size)
+
+        self.tokenizer = Tokenizer.from_file(str(model_path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=settings.get("max_length", 256))
+        pad_token = settings.get("pad_token", "[PAD]")
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info("Loaded ONNX embedding model %s", model_file)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        feed = {name: value for name, value in feed.items() if name in self._input_names}
+        hidden = self.session.run(None, feed)[0]
+        return _pool(hidden, attention_mask, self.pooling, self.normalize)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Batch texts of similar length together so little compute is spent on padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True, opset: int = 17) -> Path:
+    """Export a (locally cached) sentence-transformers model to ONNX, optionally int8-quantized.
+
+    Needs torch and sentence-transformers at export time only; serving with the
+    exported model needs just onnxruntime and tokenizers.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    pooling = next((module for module in model if type(module).__name__ == "Pooling"), None)
+    pooling_mode = "cls" if pooling is not None and pooling.pooling_mode_cls_token else "mean"
+    normalize = any(type(module).__name__ == "Normalize" for module in model)
+
+    sample = tokenizer(["An example policy sentence."], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = auto_model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(),
+            tuple(sample[name] for name in input_names),
+            str(output_path / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+    tokenizer.save_pretrained(str(output_path))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(output_path / ONNX_MODEL_FILE),
+                         str(output_path / ONNX_QUANTIZED_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+
+    with open(output_path / ONNX_CONFIG_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_length": model.max_seq_length,
+            "pooling": pooling_mode,
+            "normalize": normalize,
+            "pad_token": tokenizer.pad_token,
+        }, f, indent=2)
+    return output_path
+
+
+def parity_check(reference: Embeddings, candidate: Embeddings, texts: Sequence[str],
+                 queries: Sequence[str] = ()) -> Dict:
+    """Compare two backends: per-text cosine similarity and top-1 retrieval agreement."""
+    def normalized(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    ref_docs = normalized(reference.embed_documents(list(texts)))
+    cand_docs = normalized(candidate.embed_documents(list(texts)))
+    cosine = (ref_docs * cand_docs).sum(axis=1)
+    report = {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+    }
+    if queries:
+        ref_top = (normalized([reference.embed_query(q) for q in queries]) @ ref_docs.T).argmax(axis=1)
+        cand_top = (normalized([candidate.embed_query(q) for q in queries]) @ cand_docs.T).argmax(axis=1)
+        report["queries"] = len(queries)
+        report["top1_agreement"] = round(float((ref_top == cand_top).mean()), 4)
+    return report
+
+
+def _parity_corpus(config: Config, limit: int = 300):
+    """Paragraphs from the policy documents and the evaluation questions."""
+    from .ingestion import DocumentIngestion
+
+    texts = []
+    for path in sorted(Path(config.DATA_DIR).glob("*")):
+        try:
+            doc = DocumentIngestion.load_document(str(path))
+        except Exception:
+            continue
+        for section in doc["sections"]:
+            texts.extend(p.strip() for p in section["text"].split("\n\n") if len(p.strip()) > 40)
+    try:
+        with open("evaluation/evaluation_questions.json", "r", encoding="utf-8") as f:
+            queries = [q["question"] for q in json.load(f)["questions"]]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        queries = []
+    return texts[:limit], queries
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Export and check the ONNX embedding backend")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--output", default=Config.ONNX_MODEL_DIR, help="ONNX model directory")
+    parser.add_argument("--no-quantize", action="store_true", help="Export the fp32 model only")
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="Parity fails if any text's cosine similarity falls below this")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        path = export_onnx_model(Config.EMBEDDING_MODEL, args.output, quantize=not args.no_quantize)
+        print(f"Exported {Config.EMBEDDING_MODEL} to {path}")
+    else:
+        config = Config()
+        config.EMBEDDING_BACKEND = "huggingface"
+        reference = create_embeddings(config)
+        candidate = OnnxEmbeddings(args.output, quantized=not args.no_quantize,
+                                   batch_size=config.EMBEDDING_BATCH_SIZE, threads=config.ONNX_THREADS)
+        texts, queries = _parity_corpus(config)
+        report = parity_check(reference, candidate, texts, queries)
+        print(json.dumps(report, indent=2))
+        if report["min_cosine"] < args.min_cosine:
+            raise SystemExit(f"Parity check failed: min cosine {report['min_cosine']} < {args.min_cosine}")
+        print("Parity check passed")
@@ -283,6 +283,39 @@ class RetrievalEvaluator:
         return 0.0
 
 
+def calibrate_distance_threshold(positive_distances: List[float], negative_distances: List[float],
+                                 target_recall: float = 1.0, margin: float = 0.02) -> Dict:
+    """
+    Pick the best-match distance above which a question is refused without an LLM call.
+    
+    Args:
+        positive_distances: Best retrieved distance for each answerable question
+        negative_distances: Best retrieved distance for each off-topic question
+        target_recall: Fraction of answerable questions that must stay below the threshold
+        margin: Added to the chosen positive distance as headroom for paraphrases
+        
+    Returns:
+        Dictionary with the threshold and the recall/rejection it achieves
+    """
+    positives = np.sort(np.asarray(positive_distances, dtype=float))
+    negatives = np.asarray(negative_distances, dtype=float)
+    if not len(positives):
+        raise ValueError("Calibration needs at least one answerable question")
+    
+    # Smallest distance that keeps `target_recall` of the positives answered
+    index = max(int(np.ceil(target_recall * len(positives))) - 1, 0)
+    threshold = float(positives[index] + margin)
+    
+    return {
+        "threshold": round(threshold, 4),
+        "positive_recall": round(float(np.mean(positives <= threshold)), 4),
+        "negative_rejection": round(float(np.mean(negatives > threshold)), 4) if len(negatives) else None,
+        "max_positive_distance": round(float(positives[-1]), 4),
+        "min_negative_distance": round(float(negatives.min()), 4) if len(negatives) else None,
+        "separable": bool(len(negatives) and positives[-1] < negatives.min()),
+    }
+
+
 def format_evaluation_report(results: Dict) -> str:
     """
     Format evaluation results into a readable report.
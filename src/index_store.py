@@ -0,0 +1,172 @@
+"""
+Versioned vector store directories with atomic promotion
+Builds go into CHROMA_DIR/versions/<version>, are validated, and only then
+become active by atomically rewriting the CHROMA_DIR/CURRENT pointer file.
+CHROMA_DIR/HISTORY lists promoted versions, oldest first, for pruning.
+"""
+
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+POINTER_FILE = "CURRENT"
+HISTORY_FILE = "HISTORY"
+LOCK_FILE = "build.lock"
+VERSIONS_DIR = "versions"
+LEGACY_VERSION = "legacy"
+
+
+def _write_atomic(path: Path, text: str):
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def active_version(root: str) -> Optional[str]:
+    """Name of the promoted index version, "legacy" for an unversioned store, or None."""
+    root_path = Path(root)
+    try:
+        version = (root_path / POINTER_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        version = ""
+    if version and (root_path / VERSIONS_DIR / version).is_dir():
+        return version
+    # Stores built before versioning keep their files directly in CHROMA_DIR
+    if (root_path / "chroma.sqlite3").exists():
+        return LEGACY_VERSION
+    return None
+
+
+def version_dir(root: str, version: str) -> Path:
+    if version == LEGACY_VERSION:
+        return Path(root)
+    return Path(root) / VERSIONS_DIR / version
+
+
+def active_index_dir(root: str) -> Optional[Path]:
+    """Directory of the index currently being served, or None if nothing is built."""
+    version = active_version(root)
+    return version_dir(root, version) if version else None
+
+
+@contextmanager
+def build_lock(root: str):
+    """Exclusive lock serializing index builds across threads and processes (waits until free).
+
+    Builds copy the active version and promote their copy, so two concurrent
+    builds would silently drop the changes of the one promoted first.
+    """
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    with open(root_path / LOCK_FILE, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)  # msvcrt locks bytes from the current position
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 seconds; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def create_version_dir(root: str, base: Optional[Path] = None) -> Path:
+    """Create a staging directory for a new build, optionally seeded from an existing index."""
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    path = Path(root) / VERSIONS_DIR / version
+    if base is not None:
+        shutil.copytree(base, path,
+                        ignore=shutil.ignore_patterns(VERSIONS_DIR, POINTER_FILE, HISTORY_FILE,
+                                                      LOCK_FILE, "*.tmp"))
+    else:
+        path.mkdir(parents=True)
+    return path
+
+
+def promoted_versions(root: str) -> List[str]:
+    """Promoted version names, oldest first."""
+    root_path = Path(root)
+    try:
+        return (root_path / HISTORY_FILE).read_text(encoding="utf-8").split()
+    except FileNotFoundError:
+        pass
+    # Stores promoted before the history was recorded: every kept version was promoted
+    versions_path = root_path / VERSIONS_DIR
+    current = active_version(root)
+    versions = sorted(p.name for p in versions_path.iterdir() if p.is_dir()) if versions_path.is_dir() else []
+    return [name for name in versions if name != current] + ([current] if current in versions else [])
+
+
+def promote_version(root: str, path: Path, keep: int = 2):
+    """Atomically point CURRENT at a validated build, then prune old versions.
+
+    The previously promoted version is kept (keep >= 2) so readers that have
+    not swapped yet keep working.
+    """
+    root_path = Path(root)
+    history = [name for name in promoted_versions(root) if name != path.name] + [path.name]
+    _write_atomic(root_path / POINTER_FILE, path.name)
+    _write_atomic(root_path / HISTORY_FILE, "\n".join(history) + "\n")
+    prune_versions(root, keep=keep)
+
+
+def prune_versions(root: str, keep: int = 2):
+    """Delete versions promoted before the last `keep` promotions, never the active one.
+
+    Staging directories of builds that were never promoted are left alone.
+    """
+    versions_path = Path(root) / VERSIONS_DIR
+    if not versions_path.is_dir():
+        return
+    current = active_version(root)
+    history = promoted_versions(root)
+    retained = history[-max(keep, 1):]
+    for name in history[:len(history) - len(retained)]:
+        if name != current:
+            shutil.rmtree(versions_path / name, ignore_errors=True)
+    if len(retained) < len(history):
+        _write_atomic(Path(root) / HISTORY_FILE, "\n".join(retained) + "\n")
+
+
+def discard_version(path: Path):
+    """Remove a staging build that failed or did not validate."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def close_chroma_client(client):
+    """Release a chromadb client; the last client of a directory stops its system.
+
+    chromadb keeps one system (SQLite connection, loaded HNSW segments) per
+    directory for the life of the process unless all its clients are closed.
+    Clients are reference counted from chromadb 1.0; older versions cannot
+    release a system safely while another client shares it, so nothing is done.
+    """
+    if hasattr(client, "close"):
+        client.close()
+
+
+def close_vector_store(store):
+    """Release a vector store of a retired index version (matrix stores hold no client)."""
+    if hasattr(store, "close"):
+        store.close()
+    elif getattr(store, "_client", None) is not None:
+        close_chroma_client(store._client)
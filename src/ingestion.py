@@ -1,25 +1,283 @@
 # src/ingestion.py (Import changes)
+import multiprocessing
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict
+from typing import Container, List, Dict, Iterable, Iterator, Optional, Tuple, Union
 
-import markdown
 from bs4 import BeautifulSoup
 from pypdf import PdfReader
 
 # Correct imports for modern LangChain (v0.2.x+)
 from langchain_text_splitters import RecursiveCharacterTextSplitter 
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 
 from .config import Config
+from .dedup import MinHasher, NearDuplicateIndex
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .embeddings import embedding_model_id, get_embeddings
+from .index_store import (active_index_dir, build_lock, close_vector_store, create_version_dir,
+                          discard_version, promote_version)
+from .lexical_index import LexicalIndex
+from .matrix_store import export_matrix, matrix_exists, remove_matrix
+from .manifest import IngestionManifest, hash_file, hash_text, ingestion_settings
+from .markdown_parser import HEADING_SEPARATOR, common_heading, parse_markdown
+from .profiling import StageProfiler
+from .sharded_store import ShardLayout, ShardedVectorStore
+from .vector_compression import ProjectedEmbeddings, VectorProjection
+
+
+def _load_document_safe(file_path: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """Process-pool entry point: load one file, capturing errors instead of raising."""
+    try:
+        return DocumentIngestion.load_document(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Process-pool entry point: extract text for pages [start, stop) of one PDF."""
+    reader = PdfReader(file_path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def iter_pdf_pages(file_path: str, executor: Optional[ProcessPoolExecutor] = None,
+                   pages_per_task: int = 16, window: int = 4) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) lazily, 1-based and in page order.
+
+    With an executor, page ranges are extracted in parallel with a bounded
+    number of ranges in flight, so memory stays flat for very large files.
+    """
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+
+    if executor is None:
+        for i, page in enumerate(reader.pages):
+            yield i + 1, page.extract_text() or ""
+        return
+
+    ranges = ((start, min(start + pages_per_task, page_count))
+              for start in range(0, page_count, pages_per_task))
+    jobs = ((start, executor.submit(_extract_pdf_pages, file_path, start, stop))
+            for start, stop in ranges)
+    in_flight = deque(islice(jobs, window))
+    while in_flight:
+        start, future = in_flight.popleft()
+        in_flight.extend(islice(jobs, 1))
+        for offset, text in enumerate(future.result()):
+            yield start + offset + 1, text
+
+
+class _BatchWriter:
+    """Buffers new chunks into fixed-size embed/upsert batches.
+
+    A file is recorded in the manifest only once all of its chunks are written,
+    so at most one batch of chunk texts is held in memory at a time (the
+    manifest's per-chunk records are kept in memory for the whole corpus).
+
+    With a near-duplicate index, a new chunk that matches an already stored
+    chunk is not embedded: its manifest record points at the stored chunk via
+    "duplicate_of", and the stored chunk lists the extra sources in its
+    "duplicate_sources" metadata (refreshed by finalize()).
+    """
+
+    def __init__(self, vector_store: Chroma, manifest: IngestionManifest, batch_size: int,
+                 hasher: Optional[MinHasher] = None, dedup_index: Optional[NearDuplicateIndex] = None,
+                 profiler: Optional[StageProfiler] = None, lexical_index: Optional[LexicalIndex] = None):
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.profiler = profiler or StageProfiler()
+        self.manifest = manifest
+        self.batch_size = max(1, batch_size)
+        self.hasher = hasher
+        self.dedup_index = dedup_index
+        self.buffer = []
+        self.pending_files = deque()  # (file_name, content_hash, chunk records, last buffered seq)
+        self.seq = 0
+        self.touched_canonicals = set()
+        self.totals = {"added": 0, "deleted": 0, "kept": 0, "duplicates": 0}
+
+    def _delete_records(self, records: List[Dict]) -> int:
+        """Delete stored chunks for manifest records; duplicates only touch their canonical."""
+        stored_ids = [r["id"] for r in records if "duplicate_of" not in r]
+        self.touched_canonicals.update(r["duplicate_of"] for r in records if "duplicate_of" in r)
+        if stored_ids:
+            self.vector_store.delete(ids=stored_ids)
+            if self.dedup_index is not None:
+                self.dedup_index.remove(stored_ids)
+            if self.lexical_index is not None:
+                self.lexical_index.remove(stored_ids)
+        return len(stored_ids)
+
+    def remove_file(self, file_name: str) -> int:
+        """Delete everything stored for a file that no longer exists."""
+        deleted = self._delete_records(self.manifest.chunks(file_name))
+        self.manifest.remove_file(file_name)
+        self.totals["deleted"] += deleted
+        return deleted
+
+    def _find_duplicate(self, chunk: Dict, signatures: Dict[str, List[int]],
+                        exclude: Container[str] = ()) -> Optional[str]:
+        if self.dedup_index is None:
+            return None
+        with self.profiler.stage("dedup", 1):
+            signature = self.hasher.signature(chunk["content"])
+            canonical = self.dedup_index.find(signature, exclude)
+        if canonical is None:
+            signatures[chunk["id"]] = signature
+        return canonical
+
+    def write_file(self, file_name: str, content_hash: str, chunks: Iterable[Dict]) -> int:
+        """Queue one file's chunks, embedding only chunks not stored yet.
+
+        Chunks may be a lazy iterator. Stale chunks are deleted only after the
+        whole file was read; if reading fails, the file's new chunks are rolled
+        back and its previously stored version is left untouched. Returns the
+        file's chunk count.
+        """
+        old_records = {r["id"]: r for r in self.manifest.chunks(file_name)}
+        # This file's stored chunks not yet seen again; they are deleted as stale once the
+        # file is read, so nothing may be recorded as a duplicate of them
+        unconfirmed = set(old_records)
+        records, moved, added_ids, signatures = [], [], [], {}
+        try:
+            for chunk in chunks:
+                record = {"id": chunk["id"], "hash": chunk["hash"], "chunk_id": chunk["chunk_id"]}
+                records.append(record)
+                previous = old_records.get(chunk["id"])
+                if previous is not None:
+                    canonical = previous.get("duplicate_of")
+                    if canonical is None:
+                        unconfirmed.discard(chunk["id"])
+                        if previous["chunk_id"] != chunk["chunk_id"]:
+                            moved.append(chunk)
+                        continue
+                    if (self.dedup_index is not None and canonical in self.dedup_index
+                            and canonical not in unconfirmed):
+                        record["duplicate_of"] = canonical
+                        continue
+                    # The chunk this duplicated is gone: index this copy instead
+
+                canonical = self._find_duplicate(chunk, signatures, unconfirmed)
+                if canonical is not None:
+                    record["duplicate_of"] = canonical
+                    self.touched_canonicals.add(canonical)
+                    continue
+
+                added_ids.append(chunk["id"])
+                if self.dedup_index is not None:
+                    # Register immediately so later copies in this run match it
+                    self.dedup_index.add(chunk["id"], signatures.pop(chunk["id"]))
+                self.buffer.append(chunk)
+                self.seq += 1
+                if len(self.buffer) >= self.batch_size:
+                    self.flush()
+        except Exception:
+            self._rollback(set(added_ids))
+            raise
+
+        new_ids = {record["id"] for record in records}
+        stale = [r for chunk_id, r in old_records.items() if chunk_id not in new_ids]
+        deleted = self._delete_records(stale)
+        self.touched_canonicals.update(r["duplicate_of"] for r in records if "duplicate_of" in r)
+        if moved:
+            # Position-only change: refresh metadata without re-embedding
+            self.vector_store._collection.update(
+                ids=[chunk["id"] for chunk in moved],
+                metadatas=[DocumentIngestion._chunk_metadata(chunk) for chunk in moved]
+            )
+
+        self.pending_files.append((file_name, content_hash, records, self.seq))
+        duplicates = sum(1 for r in records if "duplicate_of" in r)
+        self.totals["added"] += len(added_ids)
+        self.totals["deleted"] += deleted
+        self.totals["duplicates"] += duplicates
+        self.totals["kept"] += len(records) - len(added_ids) - duplicates
+        if not self.buffer:
+            self._record_written_files()
+        return len(records)
+
+    def _rollback(self, added_ids: set):
+        buffered = [chunk for chunk in self.buffer if chunk["id"] in added_ids]
+        self.buffer = [chunk for chunk in self.buffer if chunk["id"] not in added_ids]
+        self.seq -= len(buffered)
+        if self.dedup_index is not None:
+            self.dedup_index.remove(added_ids)
+        flushed = list(added_ids - {chunk["id"] for chunk in buffered})
+        if flushed:
+            self.vector_store.delete(ids=flushed)
+            if self.lexical_index is not None:
+                self.lexical_index.remove(flushed)
+
+    def finalize(self):
+        """Flush remaining chunks and refresh "duplicate_sources" on affected stored chunks."""
+        self.flush()
+        if self.dedup_index is not None:
+            self.dedup_index.commit()
+        if self.lexical_index is not None:
+            self.lexical_index.commit()
+        if not self.touched_canonicals:
+            return
+
+        sources = {chunk_id: set() for chunk_id in self.touched_canonicals}
+        for file_name in self.manifest.file_names():
+            for record in self.manifest.chunks(file_name):
+                if record.get("duplicate_of") in sources:
+                    sources[record["duplicate_of"]].add(file_name)
+
+        existing = self.vector_store.get(ids=list(sources))
+        if existing["ids"]:
+            self.vector_store._collection.update(
+                ids=existing["ids"],
+                metadatas=[
+                    {"duplicate_sources": ",".join(sorted(sources[chunk_id] - {meta.get("source")})) or None}
+                    for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+                ]
+            )
+        self.touched_canonicals.clear()
+
+    def flush(self):
+        """Embed and upsert the buffered chunks, then record completed files."""
+        if self.buffer:
+            texts = [chunk["content"] for chunk in self.buffer]
+            # Embed and upsert separately (as add_texts does) so both are profiled
+            with self.profiler.stage("embed", len(texts)):
+                vectors = self.vector_store.embeddings.embed_documents(texts)
+            with self.profiler.stage("persist", len(texts)):
+                self.vector_store._collection.upsert(
+                    ids=[chunk["id"] for chunk in self.buffer],
+                    embeddings=vectors,
+                    metadatas=[DocumentIngestion._chunk_metadata(chunk) for chunk in self.buffer],
+                    documents=texts
+                )
+            if self.lexical_index is not None:
+                with self.profiler.stage("lexical_index", len(texts)):
+                    self.lexical_index.add_many((chunk["id"], chunk["content"]) for chunk in self.buffer)
+            self.buffer = []
+        self._record_written_files()
+
+    def _record_written_files(self):
+        written_seq = self.seq - len(self.buffer)
+        while self.pending_files and self.pending_files[0][3] <= written_seq:
+            file_name, content_hash, records, _ = self.pending_files.popleft()
+            self.manifest.set_file(file_name, content_hash, records)
+
 
 class DocumentIngestion:
     def __init__(self):
         self.config = Config()
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.config.EMBEDDING_MODEL
-        )
+        self.profiler = StageProfiler()
+        self.embeddings = get_embeddings(self.config)
+        if self.config.EMBEDDING_CACHE_PATH:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                EmbeddingCache(self.config.EMBEDDING_CACHE_PATH,
+                               max_entries=self.config.EMBEDDING_CACHE_MAX_ENTRIES),
+                model_name=embedding_model_id(self.config)
+            )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.config.CHUNK_SIZE,
             chunk_overlap=self.config.CHUNK_OVERLAP,
@@ -27,118 +285,491 @@ class DocumentIngestion:
             separators=["\n\n", "\n", ". ", " ", ""]
         )
 
-    def load_document(self, file_path: str) -> Dict[str, str]:
-        """Load a single document and return its content and metadata."""
+    @staticmethod
+    def load_document(file_path: str, lazy: bool = False,
+                      executor: Optional[ProcessPoolExecutor] = None) -> Dict:
+        """Load a single document and return its sections and metadata.
+
+        Each section is {"text", "metadata"}; PDFs produce one section per page
+        with a "page" number and markdown one section per heading with its
+        "heading" path. With lazy=True, PDF pages are a generator that is
+        consumed by chunking, so the whole file is never held as one string.
+        """
         path = Path(file_path)
         file_name = path.name
 
         if path.suffix == ".pdf":
-            content = self._load_pdf(file_path)
+            sections = DocumentIngestion._load_pdf(file_path, executor)
+            if not lazy:
+                sections = list(sections)
         elif path.suffix == ".md":
-            content = self._load_markdown(file_path)
+            sections = DocumentIngestion._load_markdown(file_path)
         elif path.suffix == ".html":
-            content = self._load_html(file_path)
+            sections = [{"text": DocumentIngestion._load_html(file_path), "metadata": {}}]
         elif path.suffix == ".txt":
-            content = self._load_text(file_path)
+            sections = [{"text": DocumentIngestion._load_text(file_path), "metadata": {}}]
         else:
             raise ValueError(f"Unsupported file type: {path.suffix}")
 
         return {
-            "content": content,
+            "sections": sections,
             "source": file_name,
             "file_path": str(file_path)
         }
 
-    def _load_pdf(self, file_path: str) -> str:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+    @staticmethod
+    def _load_pdf(file_path: str, executor: Optional[ProcessPoolExecutor] = None) -> Iterator[Dict]:
+        for page_number, text in iter_pdf_pages(file_path, executor,
+                                                pages_per_task=Config.PDF_PAGES_PER_TASK):
+            text = text.strip()
+            if text:
+                yield {"text": text, "metadata": {"page": page_number}}
 
-    def _load_markdown(self, file_path: str) -> str:
+    @staticmethod
+    def _load_markdown(file_path: str) -> List[Dict]:
         with open(file_path, "r", encoding="utf-8") as f:
             md_content = f.read()
-        html = markdown.markdown(md_content)
-        soup = BeautifulSoup(html, "html.parser")
-        return soup.get_text().strip()
+        return parse_markdown(md_content)
 
-    def _load_html(self, file_path: str) -> str:
+    @staticmethod
+    def _load_html(file_path: str) -> str:
         with open(file_path, "r", encoding="utf-8") as f:
             html_content = f.read()
         soup = BeautifulSoup(html_content, "html.parser")
         return soup.get_text().strip()
 
-    def _load_text(self, file_path: str) -> str:
+    @staticmethod
+    def _load_text(file_path: str) -> str:
         with open(file_path, "r", encoding="utf-8") as f:
             return f.read().strip()
 
-    def chunk_documents(self, documents: List[Dict]) -> List[Dict]:
-        """Split documents into chunks with metadata."""
-        all_chunks = []
-
-        for doc in documents:
-            chunks = self.text_splitter.split_text(doc["content"])
-            for i, chunk in enumerate(chunks):
-                all_chunks.append({
-                    "content": chunk,
-                    "source": doc["source"],
-                    "chunk_id": i,
-                    "file_path": doc["file_path"]
-                })
-
-        return all_chunks
-
-    def create_vector_store(self, chunks: List[Dict]) -> Chroma:
-        """Create and persist vector store from chunks."""
-        texts = [chunk["content"] for chunk in chunks]
-        metadatas = [
-            {
-                "source": chunk["source"],
-                "chunk_id": chunk["chunk_id"],
-                "file_path": chunk["file_path"]
+    def load_documents(self, file_paths: List[Path],
+                       workers: Optional[int] = None) -> Iterator[Tuple[Path, Optional[Dict], Optional[str]]]:
+        """Load files in input order, yielding (path, document, error) per file.
+
+        Parsing is CPU-bound, so files are spread over a process pool when more
+        than one worker is configured; errors are captured per file as before.
+        Large PDFs are not handed to a single worker: their page ranges are
+        fanned out over the same pool and streamed back lazily in page order.
+        """
+        workers = workers or self.config.INGEST_WORKERS or os.cpu_count() or 1
+        paths = [str(p) for p in file_paths]
+        # No more processes than files (a watcher burst is often a single file), unless
+        # a large PDF can spread its page ranges over the spare workers
+        if len(paths) < workers and not any(self._is_large_pdf(path) for path in paths):
+            workers = min(workers, len(paths))
+
+        if workers <= 1:
+            for file_path, path in zip(file_paths, paths):
+                try:
+                    yield file_path, self.load_document(path, lazy=True), None
+                except Exception as e:
+                    yield file_path, None, str(e)
+            return
+
+        # Workers are not forked from this process: it may be multi-threaded (Gradio, the
+        # watcher) with an embedding model loaded
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+        # Keep a bounded window of files in flight so loaded documents never pile up
+        # faster than the chunk/embed stage consumes them
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            def submit(path: str):
+                if self._is_large_pdf(path):
+                    return None
+                return executor.submit(_load_document_safe, path)
+
+            jobs = ((file_path, path, submit(path)) for file_path, path in zip(file_paths, paths))
+            in_flight = deque(islice(jobs, workers * 2))
+            while in_flight:
+                file_path, path, future = in_flight.popleft()
+                in_flight.extend(islice(jobs, 1))
+                if future is not None:
+                    yield (file_path, *future.result())
+                    continue
+                try:
+                    yield file_path, self.load_document(path, lazy=True, executor=executor), None
+                except Exception as e:
+                    yield file_path, None, str(e)
+
+    def _is_large_pdf(self, file_path: str) -> bool:
+        if not file_path.endswith(".pdf"):
+            return False
+        try:
+            return len(PdfReader(file_path).pages) >= self.config.PDF_PARALLEL_MIN_PAGES
+        except Exception:
+            # Let the regular loader report unreadable files
+            return False
+
+    def _split_sections(self, sections: Iterable[Dict]) -> Iterator[Tuple[str, Dict]]:
+        """Yield (text, metadata) pieces of up to CHUNK_SIZE characters.
+
+        Heading sections are packed line by line into each piece, across heading
+        levels, and cut only at line boundaries (so never inside a list item), with
+        no overlap. A piece states the heading path its sections share once, then
+        each section's own sub-path; a section continued from the previous piece
+        repeats its path so every piece is self-contained. Sections without a
+        heading (PDF pages, HTML, text) are split on their own as before.
+        """
+        packed = []  # [heading path, body lines] per section in the current piece
+
+        def packed_text(packed: List[List]) -> Tuple[str, str]:
+            heading = common_heading([path for path, _ in packed])
+            parts = []
+            for path, lines in packed:
+                body = "\n".join(lines).strip()
+                title = path[len(heading) + len(HEADING_SEPARATOR):] if heading else path
+                parts.append(f"{title}\n{body}" if title else body)
+            text = "\n\n".join(parts)
+            return (f"{heading}\n{text}" if heading else text), heading
+
+        def flush_packed():
+            if packed:
+                text, heading = packed_text(packed)
+                yield text, ({"heading": heading} if heading else {})
+                packed.clear()
+
+        for section in sections:
+            heading = section["metadata"].get("heading")
+            if heading is None:
+                yield from flush_packed()
+                for piece in self.text_splitter.split_text(section["text"]):
+                    yield piece, section["metadata"]
+                continue
+
+            lines = section["text"][len(heading) + 1:].strip().split("\n")
+            while lines:
+                packed.append([heading, []])
+                for line in lines:
+                    packed[-1][1].append(line)
+                    if len(packed_text(packed)[0]) > self.config.CHUNK_SIZE:
+                        packed[-1][1].pop()
+                        break
+                fit = len(packed[-1][1])
+                if fit == 0 and len(packed) > 1:
+                    # Not even one line fits here: start the section in the next piece
+                    packed.pop()
+                    yield from flush_packed()
+                    continue
+                if fit == 0:
+                    # A single line longer than a piece: split it, repeating the path on each part
+                    packed.pop()
+                    body_size = max(self.config.CHUNK_SIZE - len(heading) - 1, self.config.CHUNK_SIZE // 2)
+                    body_splitter = RecursiveCharacterTextSplitter(
+                        chunk_size=body_size,
+                        chunk_overlap=min(self.config.CHUNK_OVERLAP, body_size // 2),
+                        length_function=len,
+                        separators=[". ", " ", ""]
+                    )
+                    for piece in body_splitter.split_text(lines[0]):
+                        yield f"{heading}\n{piece}", section["metadata"]
+                    lines = lines[1:]
+                    continue
+                lines = lines[fit:]
+                if lines:
+                    yield from flush_packed()
+                    while lines and not lines[0].strip():
+                        lines = lines[1:]
+
+        yield from flush_packed()
+
+    def iter_chunks(self, doc: Dict) -> Iterator[Dict]:
+        """Split one document into chunks with metadata and stable ids.
+
+        Chunks never span a page boundary, state the heading path they fall under,
+        and carry their section metadata (e.g. "page", "heading") into the vector store.
+        """
+        seen = {}
+        for position, (chunk, metadata) in enumerate(self._split_sections(doc["sections"])):
+            chunk_hash = hash_text(chunk)
+            # Ids depend on content, not position, so unchanged chunks keep their vectors
+            occurrence = seen.get(chunk_hash, 0)
+            seen[chunk_hash] = occurrence + 1
+            yield {
+                "id": f"{doc['source']}:{chunk_hash[:16]}:{occurrence}",
+                "hash": chunk_hash,
+                "content": chunk,
+                "source": doc["source"],
+                "chunk_id": position,
+                "file_path": doc["file_path"],
+                "metadata": metadata
             }
-            for chunk in chunks
-        ]
 
-        vector_store = Chroma.from_texts(
-            texts=texts,
-            embedding=self.embeddings,
-            metadatas=metadatas,
-            persist_directory=self.config.CHROMA_DIR
+    def chunk_documents(self, documents: List[Dict]) -> List[Dict]:
+        """Split documents into chunks with metadata and stable ids."""
+        return [chunk for doc in documents for chunk in self.iter_chunks(doc)]
+
+    @staticmethod
+    def _chunk_metadata(chunk: Dict) -> Dict:
+        return {
+            **chunk.get("metadata", {}),
+            "source": chunk["source"],
+            "chunk_id": chunk["chunk_id"],
+            "file_path": chunk["file_path"]
+        }
+
+    def open_vector_store(self, index_dir: Path,
+                          projection: Optional[VectorProjection] = None) -> Union[Chroma, ShardedVectorStore]:
+        """Open (or create) a persisted vector store in one index version directory."""
+        projection = projection or VectorProjection.load(index_dir)
+        embedding_function = ProjectedEmbeddings(self.embeddings, projection) if projection else self.embeddings
+        layout = ShardLayout.from_config(self.config)
+        if layout is not None:
+            return ShardedVectorStore(index_dir, layout, embedding_function, self.config.SHARD_SEARCH_WORKERS)
+        return Chroma(
+            persist_directory=str(index_dir),
+            embedding_function=embedding_function
         )
 
-        return vector_store
+    def _prepare_projection(self, build_dir: Path, rebuild: bool,
+                            file_paths: List[Path]) -> Optional[VectorProjection]:
+        """Compact-vector projection for a build: fitted on full rebuilds, inherited otherwise."""
+        if not rebuild:
+            return VectorProjection.load(build_dir)
+        projection = VectorProjection.from_config(self.config)
+        if projection.is_identity:
+            return None
+
+        with self.profiler.stage("fit_projection"):
+            if projection.method == "pca":
+                texts = self._sample_chunk_texts(file_paths, self.config.VECTOR_FIT_SAMPLES)
+                # Cached embeddings make the later write pass reuse these vectors
+                projection.fit(self.embeddings.embed_documents(texts))
+                print(f"Fitted PCA to {projection.dimensions} dimensions on {len(texts)} chunks")
+        projection.save(build_dir)
+        return projection
+
+    def _sample_chunk_texts(self, file_paths: List[Path], limit: int) -> List[str]:
+        """Up to `limit` chunk texts, spread evenly over the files."""
+        per_file = max(1, -(-limit // max(len(file_paths), 1)))
+        texts = []
+        for _, doc, error in self.load_documents(file_paths):
+            if error is None:
+                texts.extend(chunk["content"] for chunk in islice(self.iter_chunks(doc), per_file))
+            if len(texts) >= limit:
+                break
+        return texts[:limit]
 
-    def ingest_all(self):
-        """Main ingestion pipeline."""
+    def _apply_changes(self, vector_store: Chroma, manifest: IngestionManifest,
+                       changed: List[Path], removed: List[str], current_hashes: Dict[str, str]):
+        hasher = dedup_index = None
+        if self.config.DEDUP_ENABLED:
+            hasher = MinHasher(num_perm=self.config.DEDUP_NUM_PERM)
+            dedup_index = NearDuplicateIndex(
+                str(Path(manifest.path).parent / self.config.DEDUP_INDEX_FILE),
+                num_perm=self.config.DEDUP_NUM_PERM,
+                bands=self.config.DEDUP_BANDS,
+                threshold=self.config.DEDUP_THRESHOLD
+            )
+        lexical_index = None
+        if self.config.HYBRID_SEARCH:
+            lexical_index = LexicalIndex(str(Path(manifest.path).parent / self.config.LEXICAL_INDEX_FILE),
+                                         k1=self.config.BM25_K1, b=self.config.BM25_B)
+            if not len(lexical_index) and vector_store._collection.count():
+                # Index versions built before hybrid search: index what is already stored
+                with self.profiler.stage("lexical_index"):
+                    self._backfill_lexical_index(vector_store, lexical_index)
+        writer = _BatchWriter(vector_store, manifest, self.config.INGEST_BATCH_SIZE,
+                              hasher=hasher, dedup_index=dedup_index, profiler=self.profiler,
+                              lexical_index=lexical_index)
+
+        for file_name in removed:
+            deleted = writer.remove_file(file_name)
+            print(f"Removed: {file_name} ({deleted} chunks)")
+
+        # Stream load -> chunk -> embed/upsert in fixed-size batches; chunk texts in memory are
+        # bounded by the loader window plus one batch. The manifest still holds a small record
+        # (id, hash, position) per chunk of the corpus, so it grows with corpus size.
+        print(f"\nLoading, chunking and embedding in batches of {self.config.INGEST_BATCH_SIZE}...")
+        # "load" is time spent waiting on the loaders; "chunk" includes lazily extracted PDF pages
+        for file_path, doc, error in self.profiler.timed_iter("load", self.load_documents(changed)):
+            if error is not None:
+                print(f"Error loading {file_path.name}: {error}")
+                continue
+            start = time.perf_counter()
+            try:
+                chunk_count = writer.write_file(doc["source"], current_hashes[doc["source"]],
+                                                self.profiler.timed_iter("chunk", self.iter_chunks(doc)))
+            except Exception as e:
+                print(f"Error loading {file_path.name}: {e}")
+                continue
+            self.profiler.record_file(file_path.suffix, file_path.stat().st_size, chunk_count,
+                                      time.perf_counter() - start)
+            print(f"Loaded: {file_path.name}")
+        with self.profiler.stage("finalize"):
+            writer.finalize()
+            manifest.save()
+        if dedup_index is not None:
+            dedup_index.close()
+        if lexical_index is not None:
+            lexical_index.close()
+
+        totals = writer.totals
+        print(f"Stored {totals['added']} new chunks, deleted {totals['deleted']}, "
+              f"kept {totals['kept']} unchanged, skipped {totals['duplicates']} near-duplicates")
+        if isinstance(self.embeddings, CachedEmbeddings):
+            print(f"Embedding cache: {self.embeddings.hits} hits, "
+                  f"{self.embeddings.misses} computed")
+        print("Stage times: " + ", ".join(
+            f"{name} {entry['seconds']:.2f}s" for name, entry in self.profiler.stages.items()
+        ))
+
+    @staticmethod
+    def _backfill_lexical_index(vector_store: Chroma, lexical_index: LexicalIndex, page_size: int = 2000):
+        count = vector_store._collection.count()
+        for offset in range(0, count, page_size):
+            page = vector_store._collection.get(include=["documents"], limit=page_size, offset=offset)
+            lexical_index.add_many(zip(page["ids"], page["documents"]))
+        lexical_index.commit()
+        print(f"Indexed {count} stored chunks for lexical search")
+
+    @staticmethod
+    def _duplicate_dependents(manifest: IngestionManifest, changed: List[Path],
+                              removed: List[str], data_path: Path) -> List[Path]:
+        """Unchanged files whose near-duplicate chunks point at chunks of changed or removed files."""
+        affected = {p.name for p in changed} | set(removed)
+        owned_ids = {chunk_id for name in affected for chunk_id in manifest.chunk_ids(name)}
+        return [
+            data_path / name for name in manifest.file_names()
+            if name not in affected and (data_path / name).is_file() and any(
+                record.get("duplicate_of") in owned_ids for record in manifest.chunks(name)
+            )
+        ]
+
+    def _uses_matrix(self) -> bool:
+        return self.config.VECTOR_BACKEND.lower() == "matrix"
+
+    @staticmethod
+    def validate_index(vector_store: Chroma, manifest: IngestionManifest):
+        """Refuse to promote a build that is empty or disagrees with its manifest."""
+        records = [record for name in manifest.file_names() for record in manifest.chunks(name)]
+        stored = {record["id"] for record in records if "duplicate_of" not in record}
+        actual = vector_store._collection.count()
+        if not stored:
+            raise RuntimeError("Refusing to promote an empty index")
+        if actual != len(stored):
+            raise RuntimeError(f"Index has {actual} chunks but manifest lists {len(stored)}")
+        dangling = sum(1 for record in records
+                       if "duplicate_of" in record and record["duplicate_of"] not in stored)
+        if dangling:
+            raise RuntimeError(f"{dangling} near-duplicate records point at chunks that are not stored")
+
+    def ingest_all(self, full_rebuild: bool = False, only: Optional[Iterable[str]] = None,
+                   rebuild_shard: Optional[str] = None):
+        """Main ingestion pipeline.
+
+        Only new or changed files are loaded, chunked and embedded; chunks of removed
+        files are deleted. A full rebuild happens when forced, when no manifest exists
+        or when chunking/embedding settings changed since the last run. `only` limits
+        change detection to the given file names in DATA_DIR (e.g. from a watcher).
+        `rebuild_shard` drops one shard of a sharded store and re-ingests its files,
+        leaving the other shards untouched.
+
+        The active index is never modified: changes are applied to a copy in a new
+        version directory which is validated and then atomically promoted, so running
+        retrievers keep serving the old version until they swap to the new one.
+        Builds hold a lock on CHROMA_DIR, so a watcher build and a manual rebuild run
+        one after the other instead of racing to promote.
+        """
+        with build_lock(self.config.CHROMA_DIR):
+            return self._ingest(full_rebuild, only, rebuild_shard)
+
+    def _ingest(self, full_rebuild: bool, only: Optional[Iterable[str]], rebuild_shard: Optional[str]):
         print("Starting document ingestion...")
+        self.profiler.reset()
+
+        root = self.config.CHROMA_DIR
+        active_dir = active_index_dir(root)
+        settings = ingestion_settings(self.config)
+        manifest = None
+        if active_dir is not None:
+            manifest = IngestionManifest.load(str(active_dir / self.config.MANIFEST_FILE))
+
+        rebuild = full_rebuild or manifest is None or not manifest.matches(settings)
+        if full_rebuild:
+            print("Full rebuild requested")
+        elif manifest is None:
+            print("No ingestion manifest found, rebuilding from scratch")
+        elif rebuild:
+            print("Ingestion settings changed, rebuilding from scratch")
+        if rebuild:
+            manifest = IngestionManifest("", settings)
 
-        # Load all documents
-        documents = []
         data_path = Path(self.config.DATA_DIR)
+        if only is not None and not rebuild:
+            candidates = sorted(set(only))
+            file_paths = [data_path / name for name in candidates if (data_path / name).is_file()]
+            removed = [name for name in candidates
+                       if name in manifest.files and not (data_path / name).is_file()]
+        else:
+            file_paths = sorted(p for p in data_path.glob("*") if p.is_file())
+            present = {p.name for p in file_paths}
+            removed = [name for name in manifest.file_names() if name not in present]
+        with self.profiler.stage("hash", len(file_paths)):
+            current_hashes = {p.name: hash_file(str(p)) for p in file_paths}
 
-        for file_path in data_path.glob("*"):
-            if file_path.is_file():
-                try:
-                    doc = self.load_document(str(file_path))
-                    documents.append(doc)
-                    print(f"Loaded: {file_path.name}")
-                except Exception as e:
-                    print(f"Error loading {file_path.name}: {e}")
+        changed = [p for p in file_paths if manifest.content_hash(p.name) != current_hashes[p.name]]
+        print(f"{len(changed)} new or changed, {len(removed)} removed, "
+              f"{len(file_paths) - len(changed)} unchanged files")
+        reset_files = []
+        if rebuild_shard is not None and not rebuild:
+            layout = ShardLayout.from_config(self.config)
+            if layout is None or rebuild_shard not in layout.names():
+                raise ValueError(f"No shard named {rebuild_shard!r} in the configured layout")
+            # Forget the shard's files so every chunk is embedded again into the emptied shard
+            reset_files = [name for name in manifest.file_names()
+                           if name not in removed and layout.shard_for(name) == rebuild_shard]
+            changed += [p for p in file_paths if layout.shard_for(p.name) == rebuild_shard and p not in changed]
+            print(f"Rebuilding shard {rebuild_shard}: {len(reset_files)} files")
+        dependents = self._duplicate_dependents(manifest, changed, removed + reset_files, data_path)
+        current_hashes.update((p.name, hash_file(str(p))) for p in dependents)
+        if dependents:
+            # Re-check files whose duplicates point into changed files, after those are written
+            print(f"{len(dependents)} files re-checked for near-duplicates of changed chunks")
+            changed += dependents
 
-        # Chunk documents
-        print(f"\nChunking {len(documents)} documents...")
-        chunks = self.chunk_documents(documents)
-        print(f"Created {len(chunks)} chunks")
+        # Sidecar indexes enabled after the active version was built still need a build
+        needs_sidecars = (self._uses_matrix() and not matrix_exists(active_dir)) or (
+            self.config.HYBRID_SEARCH and active_dir is not None
+            and not (active_dir / self.config.LEXICAL_INDEX_FILE).exists()
+        )
+        if not rebuild and not changed and not removed and not needs_sidecars:
+            print("Vector store is already up to date")
+            return self.open_vector_store(active_dir)
 
-        # Create vector store
-        print("\nCreating vector store...")
-        vector_store = self.create_vector_store(chunks)
-        print("Vector store created successfully!")
+        with self.profiler.stage("copy"):
+            build_dir = create_version_dir(root, base=None if rebuild else active_dir)
+        manifest.path = build_dir / self.config.MANIFEST_FILE
+        print(f"Building index version {build_dir.name}...")
+        vector_store = None
+        try:
+            projection = self._prepare_projection(build_dir, rebuild, changed)
+            vector_store = self.open_vector_store(build_dir, projection)
+            if reset_files:
+                vector_store.reset_shard(rebuild_shard)
+            self._apply_changes(vector_store, manifest, changed, removed + reset_files, current_hashes)
+            if self._uses_matrix():
+                # Chroma stays the source of truth for incremental updates; the matrix is re-exported
+                with self.profiler.stage("export_matrix"):
+                    rows = export_matrix(vector_store._collection, build_dir, self.config.VECTOR_DTYPE.lower())
+                print(f"Exported {rows} vectors for exact matrix search")
+            else:
+                remove_matrix(build_dir)
+            with self.profiler.stage("validate"):
+                self.validate_index(vector_store, manifest)
+        except BaseException:
+            # Also on Ctrl+C: an abandoned staging build must not linger next to real versions
+            if vector_store is not None:
+                close_vector_store(vector_store)
+            discard_version(build_dir)
+            raise
 
-        return vector_store
+        with self.profiler.stage("promote"):
+            promote_version(root, build_dir, keep=self.config.INDEX_KEEP_VERSIONS)
+        print(f"Promoted index version {build_dir.name}")
+        print("Vector store updated successfully!")
 
+        return vector_store
 
 if __name__ == "__main__":
     ingestion = DocumentIngestion()
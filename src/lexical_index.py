@@ -0,0 +1,120 @@
+"""
+Persistent BM25 inverted index over stored chunks
+Kept in SQLite inside each index version and updated alongside the vector store,
+so exact terms ("MFA", "per diem", "W-9") can be matched lexically
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+# Keeps hyphenated and apostrophe'd words together ("w-9", "employee's")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its "
+    "may me my of on or our should so than that the their them then there these they "
+    "this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 over chunk texts, keyed by the same chunk ids as the vector store."""
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+            "tf INTEGER NOT NULL, PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (chunk_id TEXT PRIMARY KEY, length INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        self._load_stats()
+
+    def _load_stats(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        self._doc_count = count
+        self._avg_length = total / count if count else 0.0
+
+    def add_many(self, chunks: Iterable[Tuple[str, str]]):
+        """Index (chunk_id, text) pairs, replacing earlier entries for the same ids."""
+        chunks = list(chunks)
+        with self._lock:
+            self._remove([chunk_id for chunk_id, _ in chunks])
+            for chunk_id, text in chunks:
+                counts = Counter(tokenize(text))
+                self._conn.execute("INSERT INTO docs (chunk_id, length) VALUES (?, ?)",
+                                   (chunk_id, sum(counts.values())))
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()]
+                )
+
+    def remove(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            self._remove(chunk_ids)
+
+    def _remove(self, chunk_ids: Iterable[str]):
+        ids = [(chunk_id,) for chunk_id in chunk_ids]
+        self._conn.executemany("DELETE FROM postings WHERE chunk_id = ?", ids)
+        self._conn.executemany("DELETE FROM docs WHERE chunk_id = ?", ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self._doc_count:
+            return []
+
+        scores = Counter()
+        with self._lock:
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, d.length FROM postings p "
+                    "JOIN docs d ON d.chunk_id = p.chunk_id WHERE p.term = ?", (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (self._doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = self.k1 * (1 - self.b + self.b * length / self._avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._load_stats()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank), best first."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] += 1.0 / (k + rank)
+    # Ties keep the order of first appearance, i.e. favour the first ranking
+    return sorted(scores.items(), key=lambda pair: -pair[1])
@@ -0,0 +1,119 @@
+"""
+Persistent ingestion manifest for incremental re-indexing
+Tracks per-file content hashes and per-chunk ids so unchanged files are never re-embedded
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_VERSION = 1
+
+# Bump whenever loaders or the chunker change chunk boundaries for the same settings
+CHUNKER_VERSION = 3
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the hex sha256 digest of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """Return the hex sha256 digest of a unicode string."""
+    return hash_bytes(text.encode("utf-8"))
+
+
+def hash_file(file_path: str) -> str:
+    """Return the hex sha256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingestion_settings(config) -> Dict:
+    """Settings that change chunk boundaries or vectors; a mismatch forces a full rebuild."""
+    from .embeddings import embedding_model_id
+    settings = {
+        "chunker_version": CHUNKER_VERSION,
+        "embedding_model": embedding_model_id(config),
+        "chunk_size": config.CHUNK_SIZE,
+        "chunk_overlap": config.CHUNK_OVERLAP,
+        "dedup": [config.DEDUP_THRESHOLD, config.DEDUP_NUM_PERM, config.DEDUP_BANDS]
+                 if config.DEDUP_ENABLED else None,
+    }
+    if config.VECTOR_SHARDING.lower() != "none":
+        from .sharded_store import ShardLayout
+        settings["shards"] = ShardLayout.from_config(config).describe()
+    if config.VECTOR_REDUCTION.lower() != "none" or config.VECTOR_DTYPE.lower() != "float32":
+        settings["vectors"] = [config.VECTOR_REDUCTION.lower(), config.VECTOR_DIMENSIONS,
+                               config.VECTOR_DTYPE.lower()]
+    return settings
+
+
+class IngestionManifest:
+    """On-disk record of what has been embedded into the vector store."""
+
+    def __init__(self, path: str, settings: Dict, files: Optional[Dict] = None):
+        self.path = Path(path)
+        self.settings = settings
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IngestionManifest"]:
+        """Load a manifest, returning None if it is missing, unreadable or outdated."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if data.get("manifest_version") != MANIFEST_VERSION:
+            return None
+        return cls(path, data.get("settings", {}), data.get("files", {}))
+
+    def save(self):
+        """Atomically write the manifest next to the vector store."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "manifest_version": MANIFEST_VERSION,
+                "settings": self.settings,
+                "files": self.files,
+            }, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def matches(self, settings: Dict) -> bool:
+        """Check whether the manifest was produced with the given settings."""
+        return self.settings == settings
+
+    def file_names(self) -> List[str]:
+        return sorted(self.files)
+
+    def content_hash(self, file_name: str) -> Optional[str]:
+        entry = self.files.get(file_name)
+        return entry["content_hash"] if entry else None
+
+    def chunks(self, file_name: str) -> List[Dict]:
+        """Chunk records ({"id", "hash", "chunk_id"[, "duplicate_of"]}) stored for a file."""
+        entry = self.files.get(file_name)
+        return entry["chunks"] if entry else []
+
+    def chunk_ids(self, file_name: str) -> List[str]:
+        return [chunk["id"] for chunk in self.chunks(file_name)]
+
+    def set_file(self, file_name: str, content_hash: str, chunks: List[Dict]):
+        self.files[file_name] = {
+            "content_hash": content_hash,
+            "chunks": [
+                {key: c[key] for key in ("id", "hash", "chunk_id", "duplicate_of") if key in c}
+                for c in chunks
+            ],
+        }
+
+    def remove_file(self, file_name: str):
+        self.files.pop(file_name, None)
@@ -0,0 +1,111 @@
+"""
+Single-pass markdown to plain text parser
+Emits one section per heading with its heading path, replacing the
+markdown -> HTML -> BeautifulSoup round trip used previously
+"""
+
+import re
+from typing import Dict, List
+
+_ATX_HEADING = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)[ \t#]*$")
+_SETEXT_UNDERLINE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+_HORIZONTAL_RULE = re.compile(r"^ {0,3}([-*_])([ \t]*\1){2,}[ \t]*$")
+_LINK_DEFINITION = re.compile(r"^ {0,3}\[[^\]]+\]:\s+\S+")
+_BLOCKQUOTE = re.compile(r"^ {0,3}>[ \t]?")
+
+_INLINE_RULES = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),        # images -> alt text
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),         # inline links -> link text
+    (re.compile(r"\[([^\]]+)\]\[[^\]]*\]"), r"\1"),        # reference links -> link text
+    (re.compile(r"`([^`]+)`"), r"\1"),                     # inline code
+    (re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1"), r"\2"),  # bold
+    (re.compile(r"(?<![\w*])([*_])(?=\S)(.+?)(?<=\S)\1(?![\w*])"), r"\2"),  # italics
+    (re.compile(r"~~(.+?)~~"), r"\1"),                     # strikethrough
+    (re.compile(r"<[^>\n]+>"), ""),                        # inline html tags
+]
+
+HEADING_SEPARATOR = " > "
+
+
+def _strip_inline(text: str) -> str:
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def parse_markdown(md_content: str) -> List[Dict]:
+    """Parse markdown into sections of plain text tagged with their heading path.
+
+    Returns a list of {"text", "metadata": {"heading"}} dicts in document order.
+    Each section's text starts with its heading path so a chunk cut from it is
+    self-contained; sections without body text are dropped.
+    """
+    sections = []
+    heading_stack = []  # (level, title)
+    body = []
+    in_fence = False
+    lines = md_content.splitlines()
+
+    def close_section():
+        text = "\n".join(body).strip()
+        body.clear()
+        if not text:
+            return
+        path = HEADING_SEPARATOR.join(title for _, title in heading_stack)
+        sections.append({
+            "text": f"{path}\n{text}" if path else text,
+            "metadata": {"heading": path} if path else {}
+        })
+
+    def open_heading(level: int, title: str):
+        close_section()
+        while heading_stack and heading_stack[-1][0] >= level:
+            heading_stack.pop()
+        heading_stack.append((level, title))
+
+    for i, line in enumerate(lines):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            body.append(line)
+            continue
+
+        heading = _ATX_HEADING.match(line)
+        if heading:
+            open_heading(len(heading.group(1)), _strip_inline(heading.group(2)).strip())
+            continue
+
+        # Setext heading: a text line followed by === or --- (checked on the text line)
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        if line.strip() and _SETEXT_UNDERLINE.match(next_line) and not _HORIZONTAL_RULE.match(line):
+            level = 1 if next_line.strip().startswith("=") else 2
+            open_heading(level, _strip_inline(line).strip())
+            continue
+        if _SETEXT_UNDERLINE.match(line) and i > 0 and lines[i - 1].strip():
+            prev = lines[i - 1]
+            if not _ATX_HEADING.match(prev) and not _HORIZONTAL_RULE.match(prev):
+                continue
+
+        if _HORIZONTAL_RULE.match(line) or _LINK_DEFINITION.match(line):
+            continue
+
+        line = _BLOCKQUOTE.sub("", line)
+        body.append(_strip_inline(line).rstrip())
+
+    close_section()
+    return sections
+
+
+def common_heading(headings: List[str]) -> str:
+    """Longest shared heading path of several sections."""
+    paths = [h.split(HEADING_SEPARATOR) for h in headings if h]
+    if not paths:
+        return ""
+    common = []
+    for parts in zip(*paths):
+        if len(set(parts)) != 1:
+            break
+        common.append(parts[0])
+    return HEADING_SEPARATOR.join(common)
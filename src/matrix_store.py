@@ -0,0 +1,222 @@
+"""
+In-process exact-search vector backend over a memory-mapped matrix
+Each index version can carry an export of its Chroma collection as a .npy
+matrix plus a SQLite chunk table; search is one blocked matrix-vector product
+and argpartition, with the same squared-L2 scores Chroma reports
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+MATRIX_FILE = "vectors.npy"
+NORMS_FILE = "vector_norms.npy"
+CHUNKS_FILE = "chunks.sqlite3"
+# JSON chunk table of versions exported before the SQLite one; dropped on re-export
+_LEGACY_CHUNKS_FILE = "chunks.json"
+
+# Rows multiplied per step; bounds the float32 temporaries for float16 matrices
+_BLOCK_ROWS = 8192
+_EXPORT_PAGE = 2000
+# Below SQLite's default limit on bound parameters
+_SQL_BATCH = 900
+
+
+def matrix_exists(index_dir: Optional[Path]) -> bool:
+    return index_dir is not None and all(
+        (Path(index_dir) / name).exists() for name in (MATRIX_FILE, NORMS_FILE, CHUNKS_FILE)
+    )
+
+
+def remove_matrix(index_dir: Path):
+    """Delete an exported matrix, e.g. one copied from the previous version that would go stale."""
+    for name in (MATRIX_FILE, NORMS_FILE, CHUNKS_FILE, _LEGACY_CHUNKS_FILE):
+        (Path(index_dir) / name).unlink(missing_ok=True)
+
+
+def export_matrix(collection, index_dir: Path, dtype: str = "float32") -> int:
+    """Write a Chroma collection's vectors, squared norms and chunk table into `index_dir`.
+
+    Vectors are streamed page by page into a memory-mapped .npy and chunks into
+    a SQLite table keyed by row, so the export never holds more than one page of
+    the collection in memory.
+    """
+    index_dir = Path(index_dir)
+    count = collection.count()
+    matrix = norms = None
+    chunks_tmp = index_dir / (CHUNKS_FILE + ".tmp")
+    chunks_tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(chunks_tmp))
+    conn.execute(
+        "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT, "
+        "metadata TEXT, source TEXT)"
+    )
+
+    for offset in range(0, count, _EXPORT_PAGE):
+        page = collection.get(include=["embeddings", "documents", "metadatas"],
+                              limit=_EXPORT_PAGE, offset=offset)
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                index_dir / (MATRIX_FILE + ".tmp"), mode="w+",
+                dtype=np.float16 if dtype == "float16" else np.float32, shape=(count, vectors.shape[1])
+            )
+            norms = np.empty(count, dtype=np.float32)
+        stored = vectors.astype(matrix.dtype)
+        matrix[offset:offset + len(vectors)] = stored
+        # Norms of the stored (possibly float16-rounded) vectors keep scores consistent
+        norms[offset:offset + len(vectors)] = np.square(stored.astype(np.float32)).sum(axis=1)
+        conn.executemany(
+            "INSERT INTO chunks (row, id, document, metadata, source) VALUES (?, ?, ?, ?, ?)",
+            [(offset + i, chunk_id, document, json.dumps(metadata), (metadata or {}).get("source"))
+             for i, (chunk_id, document, metadata)
+             in enumerate(zip(page["ids"], page["documents"], page["metadatas"]))]
+        )
+
+    if matrix is None:
+        conn.close()
+        chunks_tmp.unlink()
+        raise RuntimeError("Refusing to export an empty collection")
+    conn.execute("CREATE UNIQUE INDEX idx_chunks_id ON chunks (id)")
+    conn.execute("CREATE INDEX idx_chunks_source ON chunks (source, row)")
+    conn.commit()
+    conn.close()
+    matrix.flush()
+    del matrix
+    os.replace(index_dir / (MATRIX_FILE + ".tmp"), index_dir / MATRIX_FILE)
+    np.save(index_dir / NORMS_FILE, norms)
+    os.replace(chunks_tmp, index_dir / CHUNKS_FILE)
+    (index_dir / _LEGACY_CHUNKS_FILE).unlink(missing_ok=True)
+    return count
+
+
+class MatrixVectorStore:
+    """Read-only exact nearest-neighbour search over an exported index version.
+
+    The matrix is opened with mmap_mode="r" and the chunk table is queried from
+    SQLite by row, so opening reads neither; worker processes serving the same
+    version share both files' pages via the OS cache. Only the squared norms
+    (4 bytes per chunk) are loaded into memory.
+    Implements the subset of the Chroma interface the retriever uses.
+    """
+
+    def __init__(self, index_dir: Path, embedding_function: Optional[Embeddings] = None):
+        index_dir = Path(index_dir)
+        self.matrix = np.load(index_dir / MATRIX_FILE, mmap_mode="r")
+        self.norms = np.load(index_dir / NORMS_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"{(index_dir / CHUNKS_FILE).resolve().as_uri()}?mode=ro",
+                                     uri=True, check_same_thread=False)
+        self._embedding_function = embedding_function
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def chunks(self, rows: List[int]) -> List[Tuple[str, str, Dict]]:
+        """(id, document, metadata) of each row, in the given order."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = rows[start:start + _SQL_BATCH]
+                found.update(
+                    (row, (chunk_id, document, json.loads(metadata)))
+                    for row, chunk_id, document, metadata in self._conn.execute(
+                        f"SELECT row, id, document, metadata FROM chunks WHERE row IN "
+                        f"({','.join('?' * len(batch))})", batch
+                    )
+                )
+        return [found[row] for row in rows]
+
+    def rows_for_sources(self, sources: List[str]) -> np.ndarray:
+        """Row indices of the chunks stored under any of `sources`, in row order."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row FROM chunks WHERE source IN ({','.join('?' * len(sources))}) ORDER BY row",
+                list(sources)
+            ).fetchall()
+        return np.array([row for row, in rows], dtype=np.int64)
+
+    def search(self, embedding: List[float], k: int = 4,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices and squared-L2 distances of the exact top-k rows, closest first.
+
+        With `rows`, only those rows are read and scored (metadata pre-filtering).
+        """
+        return self.search_many([embedding], k, rows)[0]
+
+    def search_many(self, embeddings: List[List[float]], k: int = 4,
+                    rows: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for several query vectors with one pass over the matrix (a matrix-matrix product)."""
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        count = len(self.matrix) if rows is None else len(rows)
+        dots = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, _BLOCK_ROWS):
+            if rows is None:
+                block = self.matrix[start:start + _BLOCK_ROWS]
+            else:
+                block = self.matrix[rows[start:start + _BLOCK_ROWS]]
+            dots[start:start + len(block)] = block.astype(np.float32, copy=False) @ queries.T
+        norms = self.norms if rows is None else self.norms[rows]
+        # ||q - d||^2 = ||q||^2 + ||d||^2 - 2 q.d, i.e. Chroma's default "l2" space
+        distances = np.maximum(np.square(queries).sum(axis=1) + norms[:, None] - 2 * dots, 0.0)
+
+        k = min(k, count)
+        results = []
+        for column in distances.T:
+            if k <= 0:
+                results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            top = np.argpartition(column, k - 1)[:k]
+            top = top[np.argsort(column[top], kind="stable")]
+            results.append(((top if rows is None else rows[top]), column[top]))
+        return results
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> Dict:
+        """Chunks by id, shaped like Chroma's collection.get(); unknown ids are skipped."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[start:start + _SQL_BATCH])
+                found.update(
+                    (chunk_id, row) for chunk_id, row in self._conn.execute(
+                        f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+        rows = [found[chunk_id] for chunk_id in ids if chunk_id in found]
+        chunks = self.chunks(rows)
+        result = {
+            "ids": [chunk_id for chunk_id, _, _ in chunks],
+            "documents": [document for _, document, _ in chunks],
+            "metadatas": [metadata for _, _, metadata in chunks],
+        }
+        if include and "embeddings" in include:
+            result["embeddings"] = self.matrix[rows].astype(np.float32)
+        return result
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          **kwargs) -> List[Tuple[Document, float]]:
+        rows, distances = self.search(embedding, k)
+        return [
+            (Document(page_content=document, metadata=metadata or {}), float(distance))
+            for (_, document, metadata), distance in zip(self.chunks(rows.tolist()), distances.tolist())
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._embedding_function.embed_query(query), k
+        )
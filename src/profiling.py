@@ -0,0 +1,94 @@
+"""
+Stage-level timing for the ingestion pipeline
+Accumulates wall time and item counts per stage and per file type so
+benchmark runs can be compared as JSON
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """Peak resident set size of this process and of its (finished) worker processes."""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+class StageProfiler:
+    """Accumulates wall time and counts per pipeline stage.
+
+    Stages may nest (e.g. "embed" inside "write"); each reports its own
+    inclusive time, so nested stages must not be summed with their parent.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.file_types = {}
+        self._started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, items: int = 0):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "items": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["items"] += items
+
+    @contextmanager
+    def stage(self, stage: str, items: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, items)
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """Yield from `iterable`, charging the time spent producing each item to `stage`."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start)
+                return
+            self.add(stage, time.perf_counter() - start, 1)
+            yield item
+
+    def record_file(self, suffix: str, size_bytes: int, chunks: int, seconds: float):
+        entry = self.file_types.setdefault(
+            suffix or "(none)", {"files": 0, "bytes": 0, "chunks": 0, "seconds": 0.0}
+        )
+        entry["files"] += 1
+        entry["bytes"] += size_bytes
+        entry["chunks"] += chunks
+        entry["seconds"] += seconds
+
+    def report(self) -> Dict:
+        """JSON-serializable snapshot of all stages since the last reset."""
+        return {
+            "wall_seconds": round(time.perf_counter() - self._started, 4),
+            "stages": {
+                name: {**entry, "seconds": round(entry["seconds"], 4)}
+                for name, entry in self.stages.items()
+            },
+            "file_types": {
+                suffix: {**entry, "seconds": round(entry["seconds"], 4)}
+                for suffix, entry in sorted(self.file_types.items())
+            },
+            "peak_rss_mb": peak_rss_mb(),
+        }
@@ -0,0 +1,98 @@
+"""
+Keyword router from questions to policy categories
+A confident match restricts retrieval to that category's documents; ambiguous
+or unmatched questions fall back to searching the whole index
+"""
+
+import json
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .lexical_index import tokenize
+
+# Categories match evaluation_questions.json. "sources" are substrings of the
+# policy file names in the category; keywords are matched as whole words/phrases.
+DEFAULT_ROUTES = {
+    "PTO": {
+        "sources": ["pto"],
+        "keywords": ["pto", "paid time off", "time off", "vacation", "sick", "accrual", "accrue",
+                     "rollover", "rolled over", "carryover", "carry over", "leave", "bereavement",
+                     "payout", "paid out"],
+    },
+    "Expenses": {
+        "sources": ["expense"],
+        "keywords": ["expense", "reimbursement", "reimburse", "receipt", "per diem", "meal", "allowance",
+                     "mileage", "hotel", "travel", "flight", "airfare", "lodging", "breakfast", "lunch",
+                     "dinner", "corporate card"],
+    },
+    "Security": {
+        "sources": ["security"],
+        "keywords": ["security", "password", "mfa", "multi-factor", "two-factor", "2fa", "authentication",
+                     "phishing", "vpn", "encryption", "encrypt", "incident", "breach", "access review",
+                     "data classification", "confidential"],
+    },
+    "Holidays": {
+        "sources": ["holiday"],
+        "keywords": ["holiday", "christmas", "christmas eve", "thanksgiving", "new year", "labor day",
+                     "memorial day", "independence day", "juneteenth", "floating holiday", "weekend",
+                     "observe", "observed"],
+    },
+    "Remote Work": {
+        "sources": ["remote"],
+        "keywords": ["remote", "work home", "wfh", "telework", "home office", "hybrid", "internet",
+                     "equipment", "core hours", "core business hours", "coworking", "stipend",
+                     "response time"],
+    },
+}
+
+
+def load_routes(path: str = "") -> Dict[str, Dict]:
+    """Routes from a JSON file shaped like DEFAULT_ROUTES, or the built-in ones."""
+    if not path:
+        return DEFAULT_ROUTES
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class QueryRouter:
+    """Maps a question to the sources of one category when its keywords clearly win."""
+
+    def __init__(self, routes: Dict[str, Dict], min_matches: int = 1, margin: int = 1):
+        self.min_matches = min_matches
+        self.margin = margin
+        # Keywords go through the same tokenizer as queries ("work from home" -> "work home")
+        self.routes = {
+            category: (
+                [pattern.lower() for pattern in route.get("sources", [])],
+                {" ".join(tokenize(keyword)) for keyword in route.get("keywords", [])} - {""},
+            )
+            for category, route in routes.items()
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "QueryRouter":
+        return cls(load_routes(config.ROUTER_RULES_FILE), config.ROUTER_MIN_MATCHES, config.ROUTER_MARGIN)
+
+    def classify(self, query: str) -> Tuple[Optional[str], Dict[str, int]]:
+        """The winning category (None when not confident) and keyword matches per category."""
+        text = f" {' '.join(tokenize(query))} "
+        scores = Counter({
+            category: sum(1 for keyword in keywords if f" {keyword} " in text or f" {keyword}s " in text)
+            for category, (_, keywords) in self.routes.items()
+        })
+        ranked = scores.most_common(2) + [(None, 0)]
+        (best, top), (_, runner_up) = ranked[0], ranked[1]
+        if top < self.min_matches or top - runner_up < self.margin:
+            return None, dict(scores)
+        return best, dict(scores)
+
+    def route(self, query: str, sources: Iterable[str]) -> Tuple[Optional[str], Optional[List[str]]]:
+        """(category, sources to search), or (None, None) to search the whole index."""
+        category, _ = self.classify(query)
+        if category is None:
+            return None, None
+        patterns = self.routes[category][0]
+        matched = sorted(source for source in sources if any(p in source.lower() for p in patterns))
+        if not matched:
+            return None, None  # no indexed document belongs to this category
+        return category, matched
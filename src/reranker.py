@@ -0,0 +1,56 @@
+"""
+Cross-encoder reranking of retrieved candidates under a latency budget
+Scores (question, chunk) pairs with a small local cross-encoder; if scoring
+cannot finish within the budget the retrieval order is kept
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """Reorders candidate chunks by cross-encoder relevance to the question."""
+
+    def __init__(self, model_name: str, batch_size: int = 16, budget_ms: float = 150, model=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_seconds = budget_ms / 1000
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name)
+            # The first call pays for lazy initialization; keep it out of the first request's budget
+            model.predict([("warm up", "warm up")])
+        self.model = model
+        self.timeouts = 0
+
+    @classmethod
+    def from_config(cls, config) -> "CrossEncoderReranker":
+        return cls(config.RERANK_MODEL, config.RERANK_BATCH_SIZE, config.RERANK_BUDGET_MS)
+
+    def rerank(self, query: str, docs: List[Dict]) -> Optional[List[Dict]]:
+        """Docs sorted by cross-encoder score (best first), or None if the budget ran out.
+
+        The budget is checked after every batch, including the last: a batch
+        already started is finished, but its scores are discarded if it ran over,
+        so the latency of a slow model is bounded by one batch.
+        """
+        if len(docs) < 2:
+            return docs
+        start = time.perf_counter()
+        scores = []
+        for offset in range(0, len(docs), self.batch_size):
+            batch = docs[offset:offset + self.batch_size]
+            scores.extend(float(s) for s in self.model.predict([(query, doc["content"]) for doc in batch]))
+            if time.perf_counter() - start > self.budget_seconds:
+                self.timeouts += 1
+                logger.warning("Rerank budget of %.0f ms exceeded after %d of %d candidates; keeping retrieval order",
+                               self.budget_seconds * 1000, len(scores), len(docs))
+                return None
+
+        for doc, score in zip(docs, scores):
+            doc["rerank_score"] = score
+        # Stable sort: equal scores keep their retrieval order
+        return sorted(docs, key=lambda doc: -doc["rerank_score"])
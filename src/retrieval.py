@@ -1,13 +1,31 @@
 # src/retrieval.py (Improved retrieval and prompt engineering)
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple, Union
+import asyncio
+import json
 import logging
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 
+from .answer_cache import AnswerCache
 from .config import Config
+from .context_packer import format_source_header, pack_context
+from .embedding_cache import QueryEmbeddingCache
+from .embeddings import embed_queries, get_embeddings
+from .index_store import active_version, close_vector_store, version_dir
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .manifest import IngestionManifest, hash_text
+from .matrix_store import MatrixVectorStore, matrix_exists
+from .query_router import QueryRouter
+from .reranker import CrossEncoderReranker
+from .sharded_store import ShardLayout, ShardedVectorStore
+from .vector_compression import ProjectedEmbeddings, VectorProjection
 
-# CHANGE: Import from the new dedicated package
-from langchain_huggingface import HuggingFaceEmbeddings
+import numpy as np
 from langchain_community.vectorstores import Chroma
 
 # Conditional LLM imports
@@ -21,19 +39,98 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 
+class _AnswerStream:
+    """Event bookkeeping shared by stream_query() and astream_query().
+
+    Built from the retrieved chunks; the two callers only differ in how they
+    iterate the LLM stream, feeding each chunk to token() and ending with finish().
+    """
+
+    def __init__(self, retriever: "RAGRetriever", question: str, retrieved_docs: List[Dict],
+                 error: Optional[Exception] = None):
+        self.retriever = retriever
+        self.question = question
+        prepared = retriever._build_prompt(question, retrieved_docs) if error is None else None
+        self.prompt, self.retrieved_docs = prepared if prepared is not None else (None, [])
+        # Refusals and failed retrievals are complete before generation; the prompt is None for them
+        if error is not None:
+            self.result = retriever._error_result(error, [])
+        else:
+            self.result = retriever._refusal() if prepared is None else None
+        self._parts = []
+        self._start = time.perf_counter()
+
+    def opening_events(self) -> List[Dict]:
+        events = [{"type": "retrieval", "retrieved_docs": self.retrieved_docs}]
+        if self.result is not None:
+            events.append({"type": "token", "text": self.result["answer"]})
+        return events
+
+    def token(self, chunk) -> Optional[Dict]:
+        """Token event for an LLM stream chunk, or None for an empty one."""
+        if not chunk.content:
+            return None
+        if not self._parts:
+            logger.info("First token after %.0f ms for query: %s",
+                        (time.perf_counter() - self._start) * 1000, self.question)
+        self._parts.append(chunk.content)
+        return {"type": "token", "text": chunk.content}
+
+    def finish(self, error: Optional[Exception] = None) -> Dict:
+        if error is not None:
+            self.result = self.retriever._error_result(error, self.retrieved_docs)
+        else:
+            logger.info("Generated answer successfully for query: %s", self.question)
+            self.result = {
+                "answer": "".join(self._parts),
+                "citations": self.retriever._build_citations(self.retrieved_docs),
+                "retrieved_docs": self.retrieved_docs
+            }
+        return self.result
+
+
 class RAGRetriever:
     """Retrieval-Augmented Generation (RAG) retriever for company policies."""
 
     def __init__(self):
         self.config = Config()
-        logger.info("Initializing embeddings...")
-        self.embeddings = HuggingFaceEmbeddings(model_name=self.config.EMBEDDING_MODEL)
+        logger.info("Initializing %s embeddings...", self.config.EMBEDDING_BACKEND)
+        self.embeddings = get_embeddings(self.config)
+        self.query_cache = QueryEmbeddingCache(self.config.QUERY_EMBEDDING_CACHE_SIZE)
 
-        logger.info("Loading vector store from %s...", self.config.CHROMA_DIR)
-        self.vector_store = Chroma(
-            persist_directory=self.config.CHROMA_DIR,
-            embedding_function=self.embeddings
-        )
+        self._swap_lock = threading.Lock()
+        self._retired = None  # (vector store, lexical index) of the version served before this one
+        # Blocking embedding/search work of the async pipeline
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=self.config.RETRIEVAL_WORKERS,
+                                                      thread_name_prefix="retrieval")
+        self._last_version_check = time.monotonic()
+        self.index_version = active_version(self.config.CHROMA_DIR)
+        self.vector_store = self._open_index(self.index_version)
+        self.lexical_index = self._open_lexical_index(self.index_version)
+        self.router = QueryRouter.from_config(self.config) if self.config.QUERY_ROUTING else None
+        self.indexed_sources = self._indexed_sources(self.index_version)
+        self.reranker = None
+        if self.config.RERANK_ENABLED:
+            logger.info("Loading reranker %s...", self.config.RERANK_MODEL)
+            self.reranker = CrossEncoderReranker.from_config(self.config)
+        self.answer_cache = None
+        if self.config.ANSWER_CACHE_PATH:
+            self.answer_cache = AnswerCache(
+                self.config.ANSWER_CACHE_PATH, self.config.ANSWER_CACHE_MAX_ENTRIES,
+                self.config.ANSWER_CACHE_TTL_SECONDS, self.config.ANSWER_CACHE_SIMILARITY
+            )
+        # Cached answers are only valid for the settings that produced them
+        self._answer_settings = hash_text(json.dumps({
+            "llm": self.config.GROQ_MODEL if self.config.USE_GROQ else "openai",
+            "temperature": self.config.TEMPERATURE,
+            "max_tokens": self.config.MAX_TOKENS,
+            "top_k": self.config.TOP_K,
+            "context_budget": self.config.CONTEXT_TOKEN_BUDGET,
+            "hybrid": self.config.HYBRID_SEARCH,
+            "routing": self.config.QUERY_ROUTING,
+            "max_distance": self.config.MAX_RELEVANCE_DISTANCE,
+            "rerank": self.config.RERANK_MODEL if self.config.RERANK_ENABLED else None,
+        }, sort_keys=True))[:12]
 
         # Dynamic LLM selection
         if self.config.USE_GROQ:
@@ -53,51 +150,296 @@ class RAGRetriever:
                 openai_api_key=os.getenv('OPENAI_API_KEY', '')
             )
 
-    def retrieve_documents(self, query: str, k: Optional[int] = None) -> List[Dict]:
-        """Retrieve top-k relevant documents from vector store with better scoring."""
-        # Use higher K for retrieval, then select best ones
-        k_retrieval = (k or self.config.TOP_K) * 2  # Retrieve more, then filter
-        
+    def _index_dir(self, version: Optional[str]) -> Path:
+        return version_dir(self.config.CHROMA_DIR, version) if version else Path(self.config.CHROMA_DIR)
+
+    def _open_lexical_index(self, version: Optional[str]) -> Optional[LexicalIndex]:
+        path = self._index_dir(version) / self.config.LEXICAL_INDEX_FILE
+        if not self.config.HYBRID_SEARCH or not path.exists():
+            return None
+        return LexicalIndex(str(path), k1=self.config.BM25_K1, b=self.config.BM25_B)
+
+    def _indexed_sources(self, version: Optional[str]) -> List[str]:
+        """Document names in an index version, from its ingestion manifest (for routing)."""
+        manifest = IngestionManifest.load(str(self._index_dir(version) / self.config.MANIFEST_FILE))
+        return manifest.file_names() if manifest else []
+
+    def _open_index(self, version: Optional[str]) -> Union[Chroma, MatrixVectorStore, ShardedVectorStore]:
+        index_dir = self._index_dir(version)
+        logger.info("Loading vector store from %s...", index_dir)
+        # Versions built with compact vectors carry their projection for query vectors
+        projection = VectorProjection.load(index_dir)
+        embedding_function = ProjectedEmbeddings(self.embeddings, projection) if projection else self.embeddings
+        if self.config.VECTOR_BACKEND.lower() == "matrix":
+            if matrix_exists(index_dir):
+                return MatrixVectorStore(index_dir, embedding_function)
+            logger.warning("No vector matrix in %s (rebuild with VECTOR_BACKEND=matrix); using Chroma",
+                           index_dir)
+        # The shard layout a version was built with is recorded in its manifest
+        manifest = IngestionManifest.load(str(index_dir / self.config.MANIFEST_FILE))
+        if manifest is not None and manifest.settings.get("shards"):
+            layout = ShardLayout.from_description(manifest.settings["shards"])
+            return ShardedVectorStore(index_dir, layout, embedding_function, self.config.SHARD_SEARCH_WORKERS)
+        return Chroma(
+            persist_directory=str(index_dir),
+            embedding_function=embedding_function
+        )
+
+    def refresh_index(self, force: bool = False) -> bool:
+        """Swap to a newly promoted index version, if any. Returns True on swap.
+
+        Checks are throttled to INDEX_REFRESH_SECONDS. Requests already running
+        keep the store they started with; the previous version stays on disk
+        (and open) until the next promotion, so nothing is dropped during a swap.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_version_check < self.config.INDEX_REFRESH_SECONDS:
+            return False
+        if not self._swap_lock.acquire(blocking=False):
+            return False  # another request is already swapping
         try:
-            results = self.vector_store.similarity_search_with_score(query, k=k_retrieval)
+            self._last_version_check = now
+            version = active_version(self.config.CHROMA_DIR)
+            if version is None or version == self.index_version:
+                return False
+            vector_store = self._open_index(version)
+            lexical_index = self._open_lexical_index(version)
+            sources = self._indexed_sources(version)
+            retired = (self.vector_store, self.lexical_index)
+            self.vector_store, self.lexical_index, self.indexed_sources, self.index_version = (
+                vector_store, lexical_index, sources, version
+            )
+            logger.info("Swapped to index version %s", version)
+            # The version before the previous one has been pruned from disk by this promotion;
+            # release its handles (the previous one may still serve in-flight requests)
+            self._release(self._retired)
+            self._retired = retired
+            return True
         except Exception as e:
-            logger.error("Error during document retrieval: %s", e)
+            logger.error("Failed to swap to new index version: %s", e)
+            return False
+        finally:
+            self._swap_lock.release()
+
+    @staticmethod
+    def _release(handles: Optional[Tuple]):
+        if handles is None:
+            return
+        vector_store, lexical_index = handles
+        try:
+            close_vector_store(vector_store)
+            if lexical_index is not None:
+                lexical_index.close()
+        except Exception as e:
+            logger.warning("Failed to release a retired index version: %s", e)
+
+    def embed_query(self, query: str) -> List[float]:
+        """Query vector, served from the LRU cache for repeated questions."""
+        return self.query_cache.get_or_compute(query, self.embeddings.embed_query)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Query vectors for several questions; cache misses are embedded in one model call.
+
+        Misses are encoded as queries, so the cache holds the same vectors embed_query() stores.
+        """
+        return self.query_cache.get_or_compute_many(queries, lambda texts: embed_queries(self.embeddings, texts))
+
+    @staticmethod
+    def _to_retrieved_doc(chunk_id: str, content: str, metadata: Optional[Dict], distance: float) -> Dict:
+        metadata = metadata or {}
+        retrieved_doc = {
+            "id": chunk_id,
+            "content": content,
+            "source": metadata.get("source", "Unknown"),
+            "chunk_id": metadata.get("chunk_id", 0),
+            "score": float(distance),
+        }
+        if "page" in metadata:
+            retrieved_doc["page"] = metadata["page"]
+        if metadata.get("duplicate_sources"):
+            # Near-identical text also appears in these documents
+            retrieved_doc["duplicate_sources"] = metadata["duplicate_sources"].split(",")
+        return retrieved_doc
+
+    def _search_vectors(self, vector_store, query_vector: List[float], k: int,
+                        sources: Optional[List[str]] = None) -> List[Dict]:
+        """Nearest chunks by vector distance (lower is better), with their ids.
+
+        `sources` restricts the search to those documents' chunks.
+        """
+        return self._search_vectors_many(vector_store, [query_vector], k, [sources])[0]
+
+    def _search_vectors_many(self, vector_store, query_vectors: List[List[float]], k: int,
+                             sources: List[Optional[List[str]]]) -> List[List[Dict]]:
+        """_search_vectors() for several queries: one batched search per distinct source filter."""
+        groups = {}
+        for i, query_sources in enumerate(sources):
+            groups.setdefault(tuple(query_sources) if query_sources else None, []).append(i)
+
+        results = [None] * len(query_vectors)
+        for group_sources, indices in groups.items():
+            vectors = [query_vectors[i] for i in indices]
+            if isinstance(vector_store, MatrixVectorStore):
+                rows = vector_store.rows_for_sources(list(group_sources)) if group_sources else None
+                hits = [
+                    [(*chunk, distance)
+                     for chunk, distance in zip(vector_store.chunks(top.tolist()), distances.tolist())]
+                    for top, distances in vector_store.search_many(vectors, k, rows=rows)
+                ]
+            else:
+                where = None
+                if group_sources:
+                    where = ({"source": group_sources[0]} if len(group_sources) == 1
+                             else {"source": {"$in": list(group_sources)}})
+                result = vector_store._collection.query(
+                    query_embeddings=vectors, n_results=k, where=where,
+                    include=["documents", "metadatas", "distances"]
+                )
+                hits = [zip(*columns) for columns in
+                        zip(result["ids"], result["documents"], result["metadatas"], result["distances"])]
+            for i, query_hits in zip(indices, hits):
+                results[i] = [self._to_retrieved_doc(*hit) for hit in query_hits]
+        return results
+
+    def _fetch_chunks(self, vector_store, chunk_ids: List[str], query_vector: List[float]) -> List[Dict]:
+        """Load lexical-only hits, scoring them with the same vector distance as dense hits."""
+        collection = vector_store if isinstance(vector_store, MatrixVectorStore) else vector_store._collection
+        found = collection.get(ids=chunk_ids, include=["documents", "metadatas", "embeddings"])
+        if not found["ids"]:
             return []
+        vectors = np.asarray(found["embeddings"], dtype=np.float32)
+        distances = np.square(vectors - np.asarray(query_vector, dtype=np.float32)).sum(axis=1)
+        return [self._to_retrieved_doc(*hit) for hit in
+                zip(found["ids"], found["documents"], found["metadatas"], distances.tolist())]
 
-        # Process and score results
-        retrieved_docs = []
-        for doc, score in results:
-            retrieved_docs.append({
-                "content": doc.page_content,
-                "source": doc.metadata.get("source", "Unknown"),
-                "chunk_id": doc.metadata.get("chunk_id", 0),
-                "score": float(score),
-            })
-        
-        # Sort by relevance (lower score is better for distance)
-        retrieved_docs.sort(key=lambda x: x["score"])
-        
-        # Take top K after sorting
+    def _fuse_lexical(self, vector_store, lexical_index: LexicalIndex, query: str,
+                      query_vector: List[float], dense_docs: List[Dict], k: int,
+                      sources: Optional[List[str]] = None) -> List[Dict]:
+        """Reciprocal-rank fusion of vector and BM25 rankings."""
+        hits = lexical_index.search(query, k)
+        if not hits:
+            return dense_docs
+        docs = {doc["id"]: doc for doc in dense_docs}
+        missing = [chunk_id for chunk_id, _ in hits if chunk_id not in docs]
+        if missing:
+            docs.update((doc["id"], doc) for doc in self._fetch_chunks(vector_store, missing, query_vector))
+        if sources:
+            # Keyword hits outside the routed category are dropped like the vector ones
+            hits = [(chunk_id, score) for chunk_id, score in hits
+                    if chunk_id in docs and docs[chunk_id]["source"] in sources]
+        bm25_scores = dict(hits)
+
+        fused = []
+        rankings = [[doc["id"] for doc in dense_docs], [chunk_id for chunk_id, _ in hits]]
+        for chunk_id, rrf_score in reciprocal_rank_fusion(rankings, k=self.config.RRF_K):
+            if chunk_id not in docs:
+                continue  # lexical hit missing from the vector store version being read
+            doc = docs[chunk_id]
+            doc["rrf_score"] = rrf_score
+            if chunk_id in bm25_scores:
+                doc["bm25_score"] = bm25_scores[chunk_id]
+            fused.append(doc)
+        return fused
+
+    def _rerank(self, query: str, docs: List[Dict]) -> List[Dict]:
+        """Cross-encoder order for the candidates, or their retrieval order on timeout or error."""
+        try:
+            reranked = self.reranker.rerank(query, docs)
+        except Exception as e:
+            logger.error("Error during reranking: %s", e)
+            return docs
+        return docs if reranked is None else reranked
+
+    def retrieve_documents(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        """Retrieve top-k relevant documents: vector search, fused with BM25 when available.
+
+        Raises if retrieval fails, so a failure is not mistaken for a question with no matches.
+        """
+        return self.retrieve_documents_batch([query], k, raise_errors=True)[0]
+
+    def retrieve_documents_batch(self, queries: List[str], k: Optional[int] = None,
+                                 raise_errors: bool = False) -> List[List[Dict]]:
+        """retrieve_documents() for several queries, with one embedding call and batched vector search.
+
+        Returns one result list per query, in order, matching the single-query path.
+        A query whose retrieval fails gets an empty list unless raise_errors is set.
+        """
+        if not queries:
+            return []
+        self.refresh_index()
+        vector_store, lexical_index, indexed_sources = self.vector_store, self.lexical_index, self.indexed_sources
+
+        # Each retriever contributes a few extra candidates; ranking picks the final top-k
         final_k = k or self.config.TOP_K
-        retrieved_docs = retrieved_docs[:final_k]
+        k_retrieval = max(final_k, math.ceil(final_k * self.config.RETRIEVAL_OVERFETCH))
+        routes = [self.router.route(query, indexed_sources) if self.router else (None, None) for query in queries]
         
-        logger.info("Retrieved %d documents for query: %s", len(retrieved_docs), query)
-        return retrieved_docs
+        try:
+            query_vectors = self.embed_queries(queries)
+            if isinstance(vector_store.embeddings, ProjectedEmbeddings):
+                query_vectors = vector_store.embeddings.projection.apply(query_vectors)
+            dense_results = self._search_vectors_many(vector_store, query_vectors, k_retrieval,
+                                                      [sources for _, sources in routes])
+        except Exception as e:
+            logger.error("Error during document retrieval: %s", e)
+            if raise_errors:
+                raise
+            return [[] for _ in queries]
 
-    def generate_answer(self, query: str, retrieved_docs: List[Dict]) -> Dict:
-        """Generate answer using retrieved documents with improved prompt."""
+        results = []
+        for query, query_vector, (category, sources), retrieved_docs in zip(
+                queries, query_vectors, routes, dense_results):
+            try:
+                if sources and not retrieved_docs:
+                    category, sources = None, None
+                    retrieved_docs = self._search_vectors(vector_store, query_vector, k_retrieval)
+                if category:
+                    logger.info("Routed query to %s (%s)", category, ", ".join(sources))
+                if lexical_index is not None:
+                    retrieved_docs = self._fuse_lexical(vector_store, lexical_index, query, query_vector,
+                                                        retrieved_docs, k_retrieval, sources)
+            except Exception as e:
+                logger.error("Error during document retrieval: %s", e)
+                if raise_errors:
+                    raise
+                retrieved_docs = []
+
+            # Vector hits arrive sorted by distance (lower is better); fused hits by RRF score
+            if self.reranker is not None:
+                retrieved_docs = self._rerank(query, retrieved_docs[:k_retrieval])
+            retrieved_docs = retrieved_docs[:final_k]
+            logger.info("Retrieved %d documents for query: %s", len(retrieved_docs), query)
+            results.append(retrieved_docs)
+        return results
+
+    def is_confident(self, retrieved_docs: List[Dict]) -> bool:
+        """Whether the closest retrieved chunk is within MAX_RELEVANCE_DISTANCE (always true when unset)."""
+        threshold = self.config.MAX_RELEVANCE_DISTANCE
+        return not threshold or min(doc["score"] for doc in retrieved_docs) <= threshold
+
+    @staticmethod
+    def _refusal() -> Dict:
+        return {
+            "answer": "I can only answer questions about our company policies. "
+                      "No relevant information found for your question.",
+            "citations": [],
+            "retrieved_docs": []
+        }
+
+    def _build_prompt(self, query: str, retrieved_docs: List[Dict]) -> Optional[Tuple[str, List[Dict]]]:
+        """(prompt, documents in the context), or None when the question should be refused."""
+        if retrieved_docs and not self.is_confident(retrieved_docs):
+            # Off-topic question: refuse without paying for an LLM round-trip
+            logger.info("Closest chunk is beyond MAX_RELEVANCE_DISTANCE; skipping LLM for query: %s", query)
+            retrieved_docs = []
         if not retrieved_docs:
-            return {
-                "answer": "I can only answer questions about our company policies. "
-                          "No relevant information found for your question.",
-                "citations": [],
-                "retrieved_docs": []
-            }
+            return None
 
-        # Build context with all information
+        # Fill the context budget by relevance; citations only cover what was sent
+        retrieved_docs = pack_context(retrieved_docs, self.config.CONTEXT_TOKEN_BUDGET)
         context_parts = []
         for i, doc in enumerate(retrieved_docs):
-            context_parts.append(f"[Source {i+1}: {doc['source']}]\n{doc['content']}")
+            context_parts.append(f"{format_source_header(i + 1, doc)}{doc['content']}")
 
         context = "\n\n---\n\n".join(context_parts)
 
@@ -121,43 +463,223 @@ CONTEXT FROM COMPANY POLICIES:
 QUESTION: {query}
 
 ANSWER (include citations [1], [2], etc.):"""
+        return prompt, retrieved_docs
+
+    @staticmethod
+    def _build_citations(retrieved_docs: List[Dict]) -> List[Dict]:
+        """Build citations from all retrieved documents."""
+        citations = []
+        seen_sources = set()
+        
+        for i, doc in enumerate(retrieved_docs):
+            source = doc["source"]
+            # Only add each source once, but include snippet from best match
+            if source not in seen_sources:
+                seen_sources.add(source)
+                snippet = doc["content"][:300] + "..." if len(doc["content"]) > 300 else doc["content"]
+                citation = {
+                    "index": len(citations) + 1,
+                    "source": source,
+                    "snippet": snippet
+                }
+                if "page" in doc:
+                    citation["page"] = doc["page"]
+                if "duplicate_sources" in doc:
+                    citation["also_in"] = doc["duplicate_sources"]
+                citations.append(citation)
+        return citations
+
+    @staticmethod
+    def _error_result(error: Exception, retrieved_docs: List[Dict]) -> Dict:
+        logger.error("Error answering query: %s", error)
+        return {
+            "answer": f"Error generating response: {str(error)}",
+            "citations": [],
+            "retrieved_docs": retrieved_docs,
+            "error": str(error)
+        }
+
+    def _answer(self, question: str) -> Dict:
+        """Retrieve and generate; a failed retrieval is an error result, not a refusal."""
+        try:
+            retrieved_docs = self.retrieve_documents(question)
+        except Exception as e:
+            return self._error_result(e, [])
+        return self.generate_answer(question, retrieved_docs)
+
+    def generate_answer(self, query: str, retrieved_docs: List[Dict]) -> Dict:
+        """Generate answer using retrieved documents with improved prompt."""
+        prepared = self._build_prompt(query, retrieved_docs)
+        if prepared is None:
+            return self._refusal()
+        prompt, retrieved_docs = prepared
 
         try:
             response = self.llm.invoke(prompt)
             answer_text = response.content
-            
-            # Build citations from all retrieved documents
-            citations = []
-            seen_sources = set()
-            
-            for i, doc in enumerate(retrieved_docs):
-                source = doc["source"]
-                # Only add each source once, but include snippet from best match
-                if source not in seen_sources:
-                    seen_sources.add(source)
-                    snippet = doc["content"][:300] + "..." if len(doc["content"]) > 300 else doc["content"]
-                    citations.append({
-                        "index": len(citations) + 1,
-                        "source": source,
-                        "snippet": snippet
-                    })
-            
             logger.info("Generated answer successfully for query: %s", query)
             return {
                 "answer": answer_text,
-                "citations": citations,
+                "citations": self._build_citations(retrieved_docs),
                 "retrieved_docs": retrieved_docs
             }
         except Exception as e:
-            logger.error("Error generating answer: %s", e)
+            return self._error_result(e, retrieved_docs)
+
+    def _cache_lookup(self, question: str) -> Tuple[Optional[Dict], str, Optional[List[float]]]:
+        """(cached result or None, cache version, query vector) for a question.
+
+        The exact tier is checked first, so an exact hit skips the embedding
+        forward pass and no query vector is returned.
+        """
+        self.refresh_index()
+        cache_version = f"{self.index_version or ''}:{self._answer_settings}"
+        cached = self.answer_cache.get_exact(question, cache_version)
+        if cached is not None:
+            logger.info("Answer cache hit (exact) for query: %s", question)
+            return cached, cache_version, None
+        query_vector = self.embed_query(question)  # also warms the query LRU for retrieval
+        cached = self.answer_cache.get_similar(query_vector, cache_version)
+        if cached is not None:
+            logger.info("Answer cache hit (semantic) for query: %s", question)
+        return cached, cache_version, query_vector
+
+    @staticmethod
+    def _cache_hit_events(cached: Dict) -> List[Dict]:
+        return [
+            {"type": "retrieval", "retrieved_docs": cached["retrieved_docs"]},
+            {"type": "token", "text": cached["answer"]},
+            {"type": "answer", "result": cached},
+        ]
+
+    def _cacheable(self, result: Dict) -> bool:
+        """Whether a result should be stored (failed retrievals and LLM calls never are)."""
+        return self.answer_cache is not None and "error" not in result
+
+    def stream_query(self, question: str) -> Iterator[Dict]:
+        """query() as a stream of events, so the answer can be shown while it is generated.
+
+        Yields {"type": "retrieval", "retrieved_docs": [...]} once the context is
+        chosen, then {"type": "token", "text": ...} deltas as the LLM produces them,
+        and finally {"type": "answer", "result": {...}} with the same result dict as
+        query(), including citations. Cached answers and refusals arrive as one token.
+        """
+        cache_version = query_vector = None
+        if self.answer_cache is not None:
+            cached, cache_version, query_vector = self._cache_lookup(question)
+            if cached is not None:
+                yield from self._cache_hit_events(cached)
+                return
+
+        try:
+            retrieved_docs, error = self.retrieve_documents(question), None
+        except Exception as e:
+            retrieved_docs, error = [], e
+        stream = _AnswerStream(self, question, retrieved_docs, error)
+        yield from stream.opening_events()
+        if stream.prompt is not None:
+            try:
+                for chunk in self.llm.stream(stream.prompt):
+                    event = stream.token(chunk)
+                    if event is not None:
+                        yield event
+                stream.finish()
+            except Exception as e:
+                stream.finish(e)
+
+        if self._cacheable(stream.result):
+            self.answer_cache.put(question, query_vector, cache_version, stream.result)
+        yield {"type": "answer", "result": stream.result}
+
+    def query(self, question: str) -> Dict:
+        """Run full RAG pipeline: retrieve documents and generate answer, answer cache first."""
+        if self.answer_cache is None:
+            return self._answer(question)
+
+        cached, cache_version, query_vector = self._cache_lookup(question)
+        if cached is not None:
+            return cached
+
+        result = self._answer(question)
+        if self._cacheable(result):
+            self.answer_cache.put(question, query_vector, cache_version, result)
+        return result
+
+    async def _run_blocking(self, func, *args):
+        """Run blocking embedding, search or cache work on the retrieval thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._retrieval_executor, func, *args)
+
+    async def aretrieve(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        """retrieve_documents() without blocking the event loop."""
+        return await self._run_blocking(self.retrieve_documents, query, k)
+
+    async def _aanswer(self, question: str) -> Dict:
+        """_answer() with awaited retrieval and LLM calls."""
+        try:
+            retrieved_docs = await self.aretrieve(question)
+        except Exception as e:
+            return self._error_result(e, [])
+        return await self.agenerate(question, retrieved_docs)
+
+    async def agenerate(self, query: str, retrieved_docs: List[Dict]) -> Dict:
+        """generate_answer() with an awaited LLM call."""
+        prepared = self._build_prompt(query, retrieved_docs)
+        if prepared is None:
+            return self._refusal()
+        prompt, retrieved_docs = prepared
+
+        try:
+            response = await self.llm.ainvoke(prompt)
+            logger.info("Generated answer successfully for query: %s", query)
             return {
-                "answer": f"Error generating response: {str(e)}",
-                "citations": [],
+                "answer": response.content,
+                "citations": self._build_citations(retrieved_docs),
                 "retrieved_docs": retrieved_docs
             }
+        except Exception as e:
+            return self._error_result(e, retrieved_docs)
 
-    def query(self, question: str) -> Dict:
-        """Run full RAG pipeline: retrieve documents and generate answer."""
-        retrieved_docs = self.retrieve_documents(question)
-        result = self.generate_answer(question, retrieved_docs)
-        return result
\ No newline at end of file
+    async def aquery(self, question: str) -> Dict:
+        """query() for asyncio callers: many questions can wait on the LLM at once without a thread each."""
+        if self.answer_cache is None:
+            return await self._aanswer(question)
+
+        cached, cache_version, query_vector = await self._run_blocking(self._cache_lookup, question)
+        if cached is not None:
+            return cached
+
+        result = await self._aanswer(question)
+        if self._cacheable(result):
+            await self._run_blocking(self.answer_cache.put, question, query_vector, cache_version, result)
+        return result
+
+    async def astream_query(self, question: str) -> AsyncIterator[Dict]:
+        """stream_query() for asyncio callers; yields the same events."""
+        cache_version = query_vector = None
+        if self.answer_cache is not None:
+            cached, cache_version, query_vector = await self._run_blocking(self._cache_lookup, question)
+            if cached is not None:
+                for event in self._cache_hit_events(cached):
+                    yield event
+                return
+
+        try:
+            retrieved_docs, error = await self.aretrieve(question), None
+        except Exception as e:
+            retrieved_docs, error = [], e
+        stream = _AnswerStream(self, question, retrieved_docs, error)
+        for event in stream.opening_events():
+            yield event
+        if stream.prompt is not None:
+            try:
+                async for chunk in self.llm.astream(stream.prompt):
+                    event = stream.token(chunk)
+                    if event is not None:
+                        yield event
+                stream.finish()
+            except Exception as e:
+                stream.finish(e)
+
+        if self._cacheable(stream.result):
+            await self._run_blocking(self.answer_cache.put, question, query_vector, cache_version, stream.result)
+        yield {"type": "answer", "result": stream.result}
\ No newline at end of file
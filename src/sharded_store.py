@@ -0,0 +1,226 @@
+"""
+Vector store partitioned into several Chroma collections (shards)
+Chunks are assigned to a shard by their source document, either by policy
+category or by hash. Queries fan out across shards on a thread pool and the
+per-shard top-k lists are merged with a heap.
+"""
+
+import heapq
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import chromadb
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .index_store import close_chroma_client
+from .query_router import load_routes
+
+COLLECTION_PREFIX = "policies-"
+
+
+class ShardLayout:
+    """Deterministic source document -> shard name mapping."""
+
+    def __init__(self, method: str, names: List[str], patterns: Optional[Dict[str, List[str]]] = None):
+        if method not in ("hash", "category"):
+            raise ValueError(f"Unknown vector sharding method: {method}")
+        self.method = method
+        self._names = list(names)
+        self._patterns = patterns or {}
+
+    @classmethod
+    def create(cls, method: str, shards: int = 4, routes: Optional[Dict[str, Dict]] = None) -> "ShardLayout":
+        if method == "hash":
+            return cls(method, [f"shard-{i:02d}" for i in range(max(1, shards))])
+        # One shard per policy category (as routed by QueryRouter), plus one for everything else
+        patterns = {
+            re.sub(r"[^a-z0-9]+", "-", category.lower()).strip("-"):
+                [pattern.lower() for pattern in route.get("sources", [])]
+            for category, route in (routes or load_routes()).items()
+        }
+        return cls(method, list(patterns) + ["other"], patterns)
+
+    @classmethod
+    def from_config(cls, config) -> Optional["ShardLayout"]:
+        """The configured layout, or None for a single unsharded collection."""
+        method = config.VECTOR_SHARDING.lower()
+        if method == "none":
+            return None
+        return cls.create(method, config.VECTOR_SHARDS, load_routes(config.ROUTER_RULES_FILE))
+
+    def describe(self) -> Dict:
+        """JSON-serializable form, stored in the ingestion manifest settings."""
+        return {"method": self.method, "names": self._names, "patterns": self._patterns}
+
+    @classmethod
+    def from_description(cls, description: Dict) -> "ShardLayout":
+        return cls(description["method"], description["names"], description.get("patterns"))
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def shard_for(self, source: str) -> str:
+        if self.method == "hash":
+            return self._names[zlib.crc32(source.encode("utf-8")) % len(self._names)]
+        for name, patterns in self._patterns.items():
+            if any(pattern in source.lower() for pattern in patterns):
+                return name
+        return "other"
+
+
+class ShardedCollection:
+    """The subset of the Chroma collection API used by ingestion and retrieval, over all shards."""
+
+    def __init__(self, shards: Dict[str, Chroma], layout: ShardLayout, workers: int = 0):
+        self.shards = shards
+        self.layout = layout
+        self._executor = ThreadPoolExecutor(max_workers=workers or len(shards),
+                                            thread_name_prefix="shard-search")
+
+    def _collections(self, names=None):
+        return [self.shards[name]._collection for name in (names or self.shards)]
+
+    def count(self) -> int:
+        return sum(collection.count() for collection in self._collections())
+
+    def upsert(self, ids: List[str], embeddings, metadatas: List[Dict], documents: List[str]):
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self.layout.shard_for(metadata["source"]), []).append(i)
+        for name, rows in groups.items():
+            self.shards[name]._collection.upsert(
+                ids=[ids[i] for i in rows], embeddings=[embeddings[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows], documents=[documents[i] for i in rows]
+            )
+
+    def update(self, ids: List[str], metadatas: List[Dict]):
+        """Update metadata of stored chunks, wherever they live (ids not stored are ignored)."""
+        positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        for collection in self._collections():
+            found = collection.get(ids=ids, include=[])["ids"]
+            if found:
+                collection.update(ids=found, metadatas=[metadatas[positions[chunk_id]] for chunk_id in found])
+
+    def delete(self, ids: List[str]):
+        for collection in self._collections():
+            collection.delete(ids=ids)
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict:
+        """Chunks by id from every shard, or a page over the shards concatenated in layout order."""
+        include = ["documents", "metadatas"] if include is None else include
+        result = {"ids": [], **{field: [] for field in include}}
+        if ids is not None:
+            pages = [collection.get(ids=ids, include=include) for collection in self._collections()]
+        else:
+            pages, skip = [], offset or 0
+            remaining = limit if limit is not None else float("inf")
+            for collection in self._collections():
+                count = collection.count()
+                if skip >= count:
+                    skip -= count
+                    continue
+                take = int(min(remaining, count - skip))
+                pages.append(collection.get(include=include, limit=take, offset=skip))
+                skip, remaining = 0, remaining - take
+                if remaining <= 0:
+                    break
+        for page in pages:
+            result["ids"].extend(page["ids"])
+            for field in include:
+                result[field].extend(page[field])
+        return result
+
+    def _shards_for_where(self, where: Optional[Dict]) -> List[str]:
+        """Shards that can hold chunks matching a `source` filter (all shards otherwise)."""
+        sources = (where or {}).get("source")
+        if isinstance(sources, dict):
+            sources = sources.get("$in")
+        if isinstance(sources, str):
+            sources = [sources]
+        if not sources:
+            return list(self.shards)
+        owners = {self.layout.shard_for(source) for source in sources}
+        return [name for name in self.shards if name in owners]
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 4, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict:
+        """Top n_results per query across shards: parallel per-shard searches merged by distance."""
+        include = list(include or ["documents", "metadatas", "distances"])
+        fields = include if "distances" in include else include + ["distances"]
+        names = self._shards_for_where(where)
+        futures = [
+            self._executor.submit(self.shards[name]._collection.query, query_embeddings=query_embeddings,
+                                  n_results=n_results, where=where, include=fields)
+            for name in names
+        ]
+        pages = [future.result() for future in futures]
+
+        result = {"ids": [], **{field: [] for field in include}}
+        for q in range(len(query_embeddings)):
+            # (distance, shard, position): shard order breaks ties deterministically
+            candidates = (
+                (page["distances"][q][i], s, i)
+                for s, page in enumerate(pages) for i in range(len(page["ids"][q]))
+            )
+            top = heapq.nsmallest(n_results, candidates)
+            result["ids"].append([pages[s]["ids"][q][i] for _, s, i in top])
+            for field in include:
+                result[field].append([pages[s][field][q][i] for _, s, i in top])
+        return result
+
+
+class ShardedVectorStore:
+    """One index version's chunks split across per-shard Chroma collections."""
+
+    def __init__(self, index_dir: Path, layout: ShardLayout, embedding_function: Optional[Embeddings] = None,
+                 workers: int = 0):
+        self.layout = layout
+        self._client = chromadb.PersistentClient(path=str(index_dir))
+        self._embedding_function = embedding_function
+        self._collection = ShardedCollection(
+            {name: self._open_shard(name) for name in layout.names()}, layout, workers
+        )
+
+    def _open_shard(self, name: str) -> Chroma:
+        return Chroma(client=self._client, collection_name=COLLECTION_PREFIX + name,
+                      embedding_function=self._embedding_function)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding_function
+
+    def close(self):
+        """Stop the fan-out threads and release the chromadb client."""
+        self._collection._executor.shutdown(wait=False)
+        close_chroma_client(self._client)
+
+    def reset_shard(self, name: str):
+        """Drop one shard's collection and start it empty (for rebuilding that shard alone)."""
+        self._client.delete_collection(COLLECTION_PREFIX + name)
+        self._collection.shards[name] = self._open_shard(name)
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict:
+        return self._collection.get(ids=ids, include=include)
+
+    def delete(self, ids: List[str]):
+        self._collection.delete(ids)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4,
+                                                          **kwargs) -> List[Tuple[Document, float]]:
+        result = self._collection.query(query_embeddings=[embedding], n_results=k, where=kwargs.get("filter"))
+        return [
+            (Document(page_content=document, metadata=metadata or {}), distance)
+            for document, metadata, distance in zip(result["documents"][0], result["metadatas"][0],
+                                                    result["distances"][0])
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._embedding_function.embed_query(query), k, **kwargs
+        )
@@ -0,0 +1,191 @@
+"""
+Compact vector storage: dimension reduction and float16 precision
+A projection (PCA fitted at ingest, or plain truncation) is stored with each
+index version and applied to both chunk and query vectors
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+PROJECTION_FILE = "projection.npz"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+
+
+class VectorProjection:
+    """Maps full embeddings to compact ones: optional PCA/truncation, renormalization, dtype."""
+
+    def __init__(self, method: str = "none", dimensions: int = 0, dtype: str = "float32",
+                 mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        if method not in ("none", "pca", "truncate"):
+            raise ValueError(f"Unknown vector reduction method: {method}")
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.method = method
+        self.dimensions = dimensions
+        self.dtype = dtype
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def from_config(cls, config) -> "VectorProjection":
+        return cls(config.VECTOR_REDUCTION.lower(), config.VECTOR_DIMENSIONS, config.VECTOR_DTYPE.lower())
+
+    @property
+    def is_identity(self) -> bool:
+        return self.method == "none" and self.dtype == "float32"
+
+    def fit(self, vectors: Sequence[Sequence[float]]) -> "VectorProjection":
+        """Fit PCA components on a sample of full-dimension vectors (no-op for other methods)."""
+        if self.method != "pca":
+            return self
+        sample = np.asarray(vectors, dtype=np.float64)
+        if len(sample) <= self.dimensions:
+            raise ValueError(f"PCA to {self.dimensions} dimensions needs more than "
+                             f"{self.dimensions} sample vectors, got {len(sample)}")
+        self.mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+        self.components = vt[:self.dimensions].astype(np.float32)
+        self.mean = self.mean.astype(np.float32)
+        return self
+
+    def transform(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        """Project, renormalize and round to the storage dtype; returns a 2-D array of that dtype."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.method == "pca":
+            matrix = _normalize((matrix - self.mean) @ self.components.T)
+        elif self.method == "truncate" and self.dimensions:
+            matrix = _normalize(matrix[:, :self.dimensions])
+        return matrix.astype(np.float16 if self.dtype == "float16" else np.float32)
+
+    def apply(self, vectors: Sequence[Sequence[float]]) -> List[List[float]]:
+        """transform() as plain float lists, for vector stores that only accept float32."""
+        return self.transform(vectors).astype(np.float32).tolist()
+
+    def save(self, index_dir: Path):
+        arrays = {"settings": np.array(json.dumps({
+            "method": self.method, "dimensions": self.dimensions, "dtype": self.dtype
+        }))}
+        if self.components is not None:
+            arrays.update(mean=self.mean, components=self.components)
+        np.savez(Path(index_dir) / PROJECTION_FILE, **arrays)
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["VectorProjection"]:
+        """The projection stored with an index version, or None for full-precision indexes."""
+        path = Path(index_dir) / PROJECTION_FILE
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            settings = json.loads(str(data["settings"]))
+            return cls(settings["method"], settings["dimensions"], settings["dtype"],
+                       mean=data["mean"] if "mean" in data else None,
+                       components=data["components"] if "components" in data else None)
+
+    def bytes_per_vector(self, full_dimensions: int) -> int:
+        dimensions = self.dimensions if self.method != "none" and self.dimensions else full_dimensions
+        return dimensions * (2 if self.dtype == "float16" else 4)
+
+
+class ProjectedEmbeddings(Embeddings):
+    """Embeddings wrapper that applies an index's VectorProjection to every vector."""
+
+    def __init__(self, embeddings: Embeddings, projection: VectorProjection):
+        self.embeddings = embeddings
+        self.projection = projection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.apply(self.embeddings.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection.apply([self.embeddings.embed_query(text)])[0]
+
+
+def recall_at_k(doc_vectors: np.ndarray, query_vectors: np.ndarray,
+                projection: VectorProjection, k: int = 4) -> float:
+    """Fraction of the exact full-precision top-k neighbours that the compact vectors also return."""
+    k = min(k, len(doc_vectors))
+    full = _normalize(query_vectors) @ _normalize(doc_vectors).T
+    compact = (projection.transform(query_vectors).astype(np.float32)
+               @ projection.transform(doc_vectors).astype(np.float32).T)
+    expected = np.argsort(-full, axis=1)[:, :k]
+    found = np.argsort(-compact, axis=1)[:, :k]
+    return float(np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)]))
+
+
+def compression_report(doc_vectors: np.ndarray, query_vectors: np.ndarray,
+                       dimensions: Sequence[int], k: int = 4) -> List[Dict]:
+    """recall@k and bytes/vector for float16 and PCA/truncation variants against float32."""
+    full_dimensions = doc_vectors.shape[1]
+    variants = [VectorProjection("none", 0, "float16")]
+    for dims in dimensions:
+        if dims >= full_dimensions:
+            continue
+        for method in ("pca", "truncate"):
+            if method == "pca" and len(doc_vectors) <= dims:
+                continue  # not enough vectors to fit this many components
+            for dtype in ("float32", "float16"):
+                variants.append(VectorProjection(method, dims, dtype))
+
+    rows = [{"method": "none", "dimensions": full_dimensions, "dtype": "float32",
+             "bytes_per_vector": full_dimensions * 4, f"recall@{k}": 1.0}]
+    for projection in variants:
+        projection.fit(doc_vectors)
+        rows.append({
+            "method": projection.method,
+            "dimensions": projection.dimensions or full_dimensions,
+            "dtype": projection.dtype,
+            "bytes_per_vector": projection.bytes_per_vector(full_dimensions),
+            f"recall@{k}": round(recall_at_k(doc_vectors, query_vectors, projection, k), 4),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .config import Config
+    from .embeddings import get_embeddings
+    from .index_store import active_index_dir
+
+    parser = argparse.ArgumentParser(
+        description="Compare recall@k of compact vector storage against full float32 vectors")
+    parser.add_argument("--dimensions", default="256,192,128,96,64",
+                        help="Comma-separated reduced dimensionalities to evaluate")
+    parser.add_argument("--k", type=int, default=Config.TOP_K)
+    parser.add_argument("--questions", default="evaluation/evaluation_questions.json")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    from langchain_community.vectorstores import Chroma
+
+    config = Config()
+    index_dir = active_index_dir(config.CHROMA_DIR)
+    if index_dir is None:
+        raise SystemExit("No vector store found; run rebuild_vectorstore.py first")
+    # Re-embed the indexed chunk texts at full precision, whatever the index stores
+    texts = Chroma(persist_directory=str(index_dir))._collection.get(include=["documents"])["documents"]
+    with open(args.questions, "r", encoding="utf-8") as f:
+        queries = [q["question"] for q in json.load(f)["questions"]]
+
+    embeddings = get_embeddings(config)
+    doc_vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    query_vectors = np.asarray([embeddings.embed_query(q) for q in queries], dtype=np.float32)
+    rows = compression_report(doc_vectors, query_vectors,
+                              [int(d) for d in args.dimensions.split(",") if d], k=args.k)
+    report = {"chunks": len(texts), "queries": len(queries), "k": args.k, "variants": rows}
+
+    print(f"{'method':<10}{'dims':>6}{'dtype':>9}{'bytes/vec':>11}{f'recall@{args.k}':>11}")
+    for row in rows:
+        print(f"{row['method']:<10}{row['dimensions']:>6}{row['dtype']:>9}"
+              f"{row['bytes_per_vector']:>11}{row[f'recall@{args.k}']:>11.4f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
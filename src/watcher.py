@@ -0,0 +1,171 @@
+"""
+Live directory watcher for the policy folder
+Debounces bursts of file events and re-ingests only the affected files,
+promoting a new index version that running retrievers swap to
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from .config import Config
+from .index_store import close_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def _is_ignored(name: str) -> bool:
+    """Skip hidden files and editor swap/backup files."""
+    return name.startswith(".") or name.endswith(("~", ".swp", ".tmp", ".part"))
+
+
+class PolicyWatcher:
+    """Watches a directory and reports settled sets of changed file names.
+
+    Uses inotify (through watchdog) when installed and falls back to polling
+    file mtimes/sizes otherwise. `on_change` runs on the watcher thread once no
+    new event arrived for `debounce_seconds`; events during a run are queued
+    for the next one.
+    """
+
+    def __init__(self, directory: str, on_change: Callable[[Set[str]], None],
+                 debounce_seconds: float = 2.0, poll_seconds: float = 1.0):
+        self.directory = Path(directory)
+        self.on_change = on_change
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self._pending = set()
+        self._last_event = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._snapshot = {}
+
+    def notify(self, names: Iterable[str]):
+        """Record changed file names (relative to the watched directory)."""
+        names = {name for name in names if not _is_ignored(name)}
+        if names:
+            with self._lock:
+                self._pending.update(names)
+                self._last_event = time.monotonic()
+
+    def _take_settled(self) -> Set[str]:
+        with self._lock:
+            if not self._pending or time.monotonic() - self._last_event < self.debounce_seconds:
+                return set()
+            names, self._pending = self._pending, set()
+            return names
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def _poll(self):
+        snapshot = self._scan()
+        changed = {
+            name for name in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(name) != self._snapshot.get(name)
+        }
+        self._snapshot = snapshot
+        self.notify(changed)
+
+    def _start_inotify(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                paths = [event.src_path, getattr(event, "dest_path", "")]
+                watcher.notify(
+                    Path(os.fsdecode(path)).name for path in paths
+                    if path and Path(os.fsdecode(path)).parent.resolve() == watcher.directory.resolve()
+                )
+
+        self._observer = Observer()
+        self._observer.schedule(_Handler(), str(self.directory), recursive=False)
+        self._observer.start()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._observer is None:
+                self._poll()
+            names = self._take_settled()
+            if names:
+                try:
+                    self.on_change(names)
+                except Exception as e:
+                    logger.error("Re-ingestion after file changes failed: %s", e)
+            self._stop.wait(min(self.poll_seconds, self.debounce_seconds / 2))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._start_inotify():
+            logger.info("Watching %s with inotify", self.directory)
+        else:
+            self._snapshot = self._scan()
+            logger.info("Watching %s by polling every %.1fs", self.directory, self.poll_seconds)
+        self._thread = threading.Thread(target=self._run, name="policy-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def start_policy_watcher(ingestion=None, config: Optional[Config] = None) -> PolicyWatcher:
+    """Start watching Config.DATA_DIR, feeding changed files through incremental ingestion."""
+    config = config or Config()
+    if ingestion is None:
+        from .ingestion import DocumentIngestion
+        ingestion = DocumentIngestion()
+
+    def reingest(names: Set[str]):
+        logger.info("Policy files changed: %s", ", ".join(sorted(names)))
+        # The retrievers open the promoted version themselves; don't keep this process's handle
+        close_vector_store(ingestion.ingest_all(only=names))
+
+    watcher = PolicyWatcher(
+        config.DATA_DIR,
+        reingest,
+        debounce_seconds=config.WATCH_DEBOUNCE_SECONDS,
+        poll_seconds=config.WATCH_POLL_SECONDS
+    )
+    watcher.start()
+    return watcher
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    watcher = start_policy_watcher()
+    print(f"Watching {Config.DATA_DIR} for policy changes (Ctrl+C to stop)...")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -6,6 +6,7 @@ Tests all major components and endpoints
 import sys
 import os
 import json
+import time
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -88,6 +89,1249 @@ class TestEvaluation:
             pytest.skip(f"Evaluation questions file issue: {e}")
 
 
+class TestIngestionManifest:
+    """Tests for the incremental ingestion manifest."""
+    
+    def test_manifest_round_trip(self, tmp_path):
+        """Test that a saved manifest loads back with the same files."""
+        from src.manifest import IngestionManifest
+        settings = {'embedding_model': 'm', 'chunk_size': 400, 'chunk_overlap': 50}
+        manifest = IngestionManifest(str(tmp_path / 'manifest.json'), settings)
+        manifest.set_file('a.md', 'abc', [{'id': 'a.md:1:0', 'hash': '1', 'chunk_id': 0}])
+        manifest.save()
+        
+        loaded = IngestionManifest.load(str(tmp_path / 'manifest.json'))
+        assert loaded.matches(settings)
+        assert loaded.content_hash('a.md') == 'abc'
+        assert loaded.chunk_ids('a.md') == ['a.md:1:0']
+    
+    def test_missing_manifest_returns_none(self, tmp_path):
+        """Test that a missing manifest signals a full rebuild."""
+        from src.manifest import IngestionManifest
+        assert IngestionManifest.load(str(tmp_path / 'missing.json')) is None
+
+
+class TestDocumentLoading:
+    """Tests for parallel document loading."""
+
+    def _ingestion(self, monkeypatch):
+        pytest.importorskip('langchain_text_splitters')
+        pytest.importorskip('pypdf')
+        from src import ingestion
+        from src.config import Config
+        monkeypatch.setattr(Config, 'EMBEDDING_CACHE_PATH', '')
+        monkeypatch.setattr(ingestion, 'get_embeddings', lambda config: None)
+        return ingestion.DocumentIngestion()
+
+    def test_process_pool_keeps_order_and_captures_errors(self, tmp_path, monkeypatch):
+        """Test that pooled loading yields files in input order with per-file errors."""
+        loader = self._ingestion(monkeypatch)
+        (tmp_path / 'a.md').write_text("# PTO\n\nEmployees accrue 15 days per year.\n")
+        (tmp_path / 'b.pdf').write_bytes(b"not a pdf")
+        (tmp_path / 'c.txt').write_text("Expenses are reimbursed within 30 days.")
+        paths = [tmp_path / 'a.md', tmp_path / 'b.pdf', tmp_path / 'c.txt']
+
+        results = list(loader.load_documents(paths, workers=2))
+        assert [path for path, _, _ in results] == paths
+        assert results[0][2] is None and results[0][1]['source'] == 'a.md'
+        assert results[1][1] is None and results[1][2]
+        assert results[2][1]['sections'][0]['text'] == "Expenses are reimbursed within 30 days."
+
+    def test_single_file_is_loaded_without_a_pool(self, tmp_path, monkeypatch):
+        """Test that a single changed file does not start worker processes."""
+        loader = self._ingestion(monkeypatch)
+        from src import ingestion
+        monkeypatch.setattr(ingestion, 'ProcessPoolExecutor', None)
+        (tmp_path / 'a.md').write_text("# PTO\n\nEmployees accrue 15 days per year.\n")
+
+        results = list(loader.load_documents([tmp_path / 'a.md'], workers=4))
+        assert results[0][1]['source'] == 'a.md' and results[0][2] is None
+
+    def test_parallel_pdf_pages_keep_order_and_page_numbers(self, tmp_path, monkeypatch):
+        """Test that page ranges extracted on a pool stream back in page order."""
+        self._ingestion(monkeypatch)
+        from concurrent.futures import ProcessPoolExecutor
+        from benchmark_ingestion import _write_pdf
+        from src.config import Config
+        from src.ingestion import DocumentIngestion, iter_pdf_pages
+        monkeypatch.setattr(Config, 'PDF_PAGES_PER_TASK', 2)
+        path = tmp_path / 'handbook.pdf'
+        _write_pdf(path, [f"Section {i} of the handbook" if i != 4 else "" for i in range(1, 8)])
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            pages = list(iter_pdf_pages(str(path), executor, pages_per_task=2, window=2))
+            assert [number for number, _ in pages] == list(range(1, 8))
+            assert pages[2][1].strip() == "Section 3 of the handbook"
+
+            doc = DocumentIngestion.load_document(str(path), lazy=True, executor=executor)
+            sections = list(doc['sections'])
+        assert [s['metadata']['page'] for s in sections] == [1, 2, 3, 5, 6, 7]
+        assert sections[3]['text'] == "Section 5 of the handbook"
+
+
+class TestIncrementalIngestion:
+    """Tests for incremental ingestion into versioned index builds."""
+
+    def _ingestion(self, tmp_path, monkeypatch, **settings):
+        pytest.importorskip('chromadb')
+        pytest.importorskip('langchain_text_splitters')
+        import hashlib
+        from langchain_core.embeddings import Embeddings
+        from src import ingestion
+        from src.config import Config
+
+        class CountingEmbeddings(Embeddings):
+            def __init__(self):
+                self.embedded = []
+
+            def embed_documents(self, texts):
+                self.embedded.extend(texts)
+                return [self.embed_query(t) for t in texts]
+
+            def embed_query(self, text):
+                return [b / 255 for b in hashlib.sha256(text.encode()).digest()[:8]]
+
+        embeddings = CountingEmbeddings()
+        defaults = {'DATA_DIR': str(tmp_path / 'policies'), 'CHROMA_DIR': str(tmp_path / 'index'),
+                    'EMBEDDING_CACHE_PATH': '', 'INGEST_WORKERS': 1, 'CHUNK_SIZE': 1000,
+                    'DEDUP_ENABLED': True, 'HYBRID_SEARCH': True, 'VECTOR_BACKEND': 'chroma',
+                    'VECTOR_SHARDING': 'none', 'VECTOR_REDUCTION': 'none', 'VECTOR_DTYPE': 'float32'}
+        for name, value in {**defaults, **settings}.items():
+            monkeypatch.setattr(Config, name, value)
+        monkeypatch.setattr(ingestion, 'get_embeddings', lambda config: embeddings)
+        (tmp_path / 'policies').mkdir(exist_ok=True)
+        return ingestion.DocumentIngestion(), embeddings
+
+    @staticmethod
+    def _policy(title, sections, seed=0):
+        """Markdown policy with 80 random words per section (one chunk each)."""
+        import random
+        rng = random.Random(seed)
+        words = [f"{w}{i}" for i, w in enumerate(("employee approval request leave device travel "
+                                                  "report access benefit review " * 30).split())]
+        body = "\n\n".join(f"## Section {i}\n\n" + " ".join(rng.sample(words, 80)) + " quarterly."
+                           for i in range(sections))
+        return f"# {title}\n\n{body}\n"
+
+    @staticmethod
+    def _manifest(ingestion):
+        from src.index_store import active_index_dir
+        from src.manifest import IngestionManifest
+        return IngestionManifest.load(str(active_index_dir(ingestion.config.CHROMA_DIR)
+                                          / ingestion.config.MANIFEST_FILE))
+
+    def test_small_edit_within_a_chunk(self, tmp_path, monkeypatch):
+        """Test that a one-word edit replaces the chunk instead of deduplicating against itself."""
+        ingestion, embeddings = self._ingestion(tmp_path, monkeypatch)
+        policy = tmp_path / 'policies' / 'security_policy.md'
+        text = self._policy('Security', 3)
+        policy.write_text(text)
+        assert ingestion.ingest_all()._collection.count() == 3
+
+        embeddings.embedded.clear()
+        policy.write_text(text.replace('quarterly.', 'monthly.', 1))
+        store = ingestion.ingest_all()
+        assert store._collection.count() == 3
+        assert len(embeddings.embedded) == 1 and embeddings.embedded[0].endswith('monthly.')
+        records = self._manifest(ingestion).chunks('security_policy.md')
+        assert not any('duplicate_of' in r for r in records)
+        assert sorted(store.get()['ids']) == sorted(r['id'] for r in records)
+
+    def test_edit_of_a_chunk_duplicated_in_the_same_file(self, tmp_path, monkeypatch):
+        """Test that an unchanged copy is re-matched when the chunk it duplicated is edited."""
+        ingestion, _ = self._ingestion(tmp_path, monkeypatch)
+        policy = tmp_path / 'policies' / 'travel_policy.md'
+        section = self._policy('Travel', 1).split('\n\n', 1)[1]
+        text = f"# Travel\n\n{section}\n{section.replace('Section 0', 'Section 1')}"
+        policy.write_text(text)
+        ingestion.ingest_all()
+        assert sum('duplicate_of' in r for r in self._manifest(ingestion).chunks('travel_policy.md')) == 1
+
+        policy.write_text(text.replace('quarterly.', 'monthly.', 1))
+        store = ingestion.ingest_all()
+        records = self._manifest(ingestion).chunks('travel_policy.md')
+        stored = store.get()['ids']
+        assert len(stored) == 1 and stored[0].startswith('travel_policy.md:')
+        assert [r.get('duplicate_of', r['id']) for r in records] == stored * 2
+
+    def test_unchanged_run_embeds_nothing(self, tmp_path, monkeypatch):
+        """Test that re-running on an unchanged corpus neither embeds nor builds a version."""
+        from src.index_store import active_version
+        ingestion, embeddings = self._ingestion(tmp_path, monkeypatch)
+        (tmp_path / 'policies' / 'pto_policy.md').write_text(self._policy('PTO', 2, seed=1))
+        (tmp_path / 'policies' / 'expense_policy.md').write_text(self._policy('Expenses', 2, seed=2))
+        ingestion.ingest_all()
+        version = active_version(ingestion.config.CHROMA_DIR)
+
+        embeddings.embedded.clear()
+        assert ingestion.ingest_all()._collection.count() == 4
+        assert embeddings.embedded == []
+        assert active_version(ingestion.config.CHROMA_DIR) == version
+
+    def test_edit_reembeds_only_changed_chunks(self, tmp_path, monkeypatch):
+        """Test that replacing one section embeds that chunk only and removes the old one."""
+        ingestion, embeddings = self._ingestion(tmp_path, monkeypatch)
+        pto = tmp_path / 'policies' / 'pto_policy.md'
+        (tmp_path / 'policies' / 'expense_policy.md').write_text(self._policy('Expenses', 2, seed=2))
+        pto.write_text(self._policy('PTO', 3, seed=1))
+        ingestion.ingest_all()
+
+        embeddings.embedded.clear()
+        sections = pto.read_text().split('\n\n## ')
+        sections[2] = self._policy('PTO', 2, seed=9).split('\n\n## ')[2]
+        pto.write_text('\n\n## '.join(sections))
+        store = ingestion.ingest_all()
+        assert len(embeddings.embedded) == 1 and embeddings.embedded[0].startswith('PTO > Section 1')
+        assert store._collection.count() == 5
+        assert sorted(store.get()['ids']) == sorted(
+            r['id'] for name in ('pto_policy.md', 'expense_policy.md')
+            for r in self._manifest(ingestion).chunks(name))
+
+    def test_removed_file_is_deleted(self, tmp_path, monkeypatch):
+        """Test that chunks of a deleted policy leave the vector store and the manifest."""
+        ingestion, _ = self._ingestion(tmp_path, monkeypatch)
+        (tmp_path / 'policies' / 'pto_policy.md').write_text(self._policy('PTO', 2, seed=1))
+        (tmp_path / 'policies' / 'expense_policy.md').write_text(self._policy('Expenses', 2, seed=2))
+        ingestion.ingest_all()
+
+        (tmp_path / 'policies' / 'expense_policy.md').unlink()
+        store = ingestion.ingest_all()
+        assert {m['source'] for m in store.get()['metadatas']} == {'pto_policy.md'}
+        assert self._manifest(ingestion).file_names() == ['pto_policy.md']
+
+    @staticmethod
+    def _chunks(source, texts, fail_after=None):
+        from src.manifest import hash_text
+        for i, text in enumerate(texts):
+            if i == fail_after:
+                raise IOError("page extraction failed")
+            yield {'id': f"{source}:{hash_text(text)[:16]}:0", 'hash': hash_text(text), 'content': text,
+                   'source': source, 'chunk_id': i, 'file_path': source, 'metadata': {}}
+
+    def _writer(self, tmp_path, monkeypatch, batch_size):
+        from src.ingestion import _BatchWriter
+        from src.manifest import IngestionManifest
+        ingestion, embeddings = self._ingestion(tmp_path, monkeypatch)
+        manifest = IngestionManifest(str(tmp_path / 'build' / 'manifest.json'), {})
+        store = ingestion.open_vector_store(tmp_path / 'build')
+        return _BatchWriter(store, manifest, batch_size), store, manifest, embeddings
+
+    def test_failed_file_is_rolled_back(self, tmp_path, monkeypatch):
+        """Test that a file failing mid-read removes its flushed chunks and keeps the old version."""
+        writer, store, manifest, _ = self._writer(tmp_path, monkeypatch, batch_size=2)
+        writer.write_file('a.md', 'v1', self._chunks('a.md', ['old one', 'old two']))
+        writer.finalize()
+        old_ids = sorted(store.get()['ids'])
+
+        with pytest.raises(IOError):
+            writer.write_file('a.md', 'v2', self._chunks('a.md', ['new one', 'new two', 'new three'],
+                                                         fail_after=2))
+        writer.finalize()
+        assert sorted(store.get()['ids']) == old_ids
+        assert manifest.content_hash('a.md') == 'v1'
+
+    def test_files_are_recorded_once_their_batch_is_written(self, tmp_path, monkeypatch):
+        """Test that a file reaches the manifest only after all of its chunks were upserted."""
+        writer, store, manifest, embeddings = self._writer(tmp_path, monkeypatch, batch_size=3)
+        writer.write_file('a.md', 'ha', self._chunks('a.md', ['a one', 'a two']))
+        assert manifest.content_hash('a.md') is None and embeddings.embedded == []
+
+        writer.write_file('b.md', 'hb', self._chunks('b.md', ['b one', 'b two']))
+        assert embeddings.embedded == ['a one', 'a two', 'b one']
+        assert manifest.content_hash('a.md') == 'ha' and manifest.content_hash('b.md') is None
+
+        writer.finalize()
+        assert manifest.content_hash('b.md') == 'hb'
+        assert store._collection.count() == 4
+
+    def test_interrupted_build_is_discarded(self, tmp_path, monkeypatch):
+        """Test that Ctrl+C during a build removes its staging version."""
+        from src.index_store import VERSIONS_DIR, active_version
+        ingestion, _ = self._ingestion(tmp_path, monkeypatch)
+        policy = tmp_path / 'policies' / 'pto_policy.md'
+        policy.write_text(self._policy('PTO', 2, seed=1))
+        ingestion.ingest_all()
+        version = active_version(ingestion.config.CHROMA_DIR)
+
+        def interrupt(*args):
+            raise KeyboardInterrupt
+        monkeypatch.setattr(ingestion, 'validate_index', interrupt)
+        policy.write_text(self._policy('PTO', 3, seed=1))
+        with pytest.raises(KeyboardInterrupt):
+            ingestion.ingest_all()
+        assert [p.name for p in (tmp_path / 'index' / VERSIONS_DIR).iterdir()] == [version]
+
+
+class TestIndexVersions:
+    """Tests for versioned index directories."""
+
+    def test_prune_follows_promotion_order(self, tmp_path):
+        """Test that the last promoted versions are kept whatever their names sort as."""
+        from src.index_store import VERSIONS_DIR, active_version, promote_version
+        root = str(tmp_path)
+        for name in ['v3', 'v2', 'v1', 'staging', 'v0']:
+            (tmp_path / VERSIONS_DIR / name).mkdir(parents=True)
+            if name != 'staging':
+                promote_version(root, tmp_path / VERSIONS_DIR / name, keep=2)
+
+        assert active_version(root) == 'v0'
+        assert sorted(p.name for p in (tmp_path / VERSIONS_DIR).iterdir()) == ['staging', 'v0', 'v1']
+        assert (tmp_path / 'HISTORY').read_text().split() == ['v1', 'v0']
+
+    def test_build_lock_serializes_builds(self, tmp_path):
+        """Test that a second build waits until the first one releases the lock."""
+        import threading
+        from src.index_store import build_lock
+        order = []
+
+        def second_build():
+            with build_lock(str(tmp_path)):
+                order.append('second')
+
+        with build_lock(str(tmp_path)):
+            thread = threading.Thread(target=second_build)
+            thread.start()
+            thread.join(timeout=0.2)
+            assert thread.is_alive()
+            order.append('first')
+        thread.join(timeout=5)
+        assert order == ['first', 'second']
+
+    def test_closing_a_store_releases_its_chroma_system(self, tmp_path):
+        """Test that a retired version's chromadb system does not stay cached."""
+        pytest.importorskip('chromadb')
+        pytest.importorskip('langchain_community')
+        from chromadb.api.shared_system_client import SharedSystemClient
+        from langchain_community.vectorstores import Chroma
+        from src.index_store import close_vector_store
+        if not hasattr(SharedSystemClient, '_release_system'):
+            pytest.skip('chromadb clients are not reference counted before 1.0')
+        store = Chroma(persist_directory=str(tmp_path / 'v1'), embedding_function=None)
+        assert str(tmp_path / 'v1') in SharedSystemClient._identifier_to_system
+
+        close_vector_store(store)
+        assert str(tmp_path / 'v1') not in SharedSystemClient._identifier_to_system
+
+
+class TestEmbeddingCache:
+    """Tests for the persistent embedding cache."""
+    
+    def test_cached_embeddings_only_compute_new_texts(self, tmp_path):
+        """Test that repeated texts are served from the cache."""
+        pytest.importorskip('langchain_core')
+        from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+        
+        class CountingEmbeddings:
+            calls = 0
+            
+            def embed_documents(self, texts):
+                self.calls += len(texts)
+                return [[float(len(t)), 1.0] for t in texts]
+        
+        model = CountingEmbeddings()
+        cached = CachedEmbeddings(model, EmbeddingCache(str(tmp_path / 'cache.db')), 'test-model')
+        first = cached.embed_documents(['alpha', 'beta'])
+        second = cached.embed_documents(['beta', 'gamma', 'alpha'])
+        
+        assert model.calls == 3
+        assert second[0] == first[1]
+        assert second[2] == first[0]
+    
+    def test_cache_evicts_beyond_capacity(self, tmp_path):
+        """Test that the cache is size-bounded."""
+        pytest.importorskip('langchain_core')
+        from src.embedding_cache import EmbeddingCache
+        cache = EmbeddingCache(str(tmp_path / 'cache.db'), max_entries=2)
+        cache.put_many('m', {'a': [1.0], 'b': [2.0], 'c': [3.0]})
+        assert len(cache) == 2
+    
+    def test_query_cache_is_lru_over_normalized_queries(self):
+        """Test that repeated questions skip the model and old ones are evicted."""
+        pytest.importorskip('langchain_core')
+        from src.embedding_cache import QueryEmbeddingCache
+        cache = QueryEmbeddingCache(max_entries=2)
+        calls = []
+        embed = lambda q: calls.append(q) or [float(len(calls))]
+        
+        cache.get_or_compute('How many PTO days?', embed)
+        assert cache.get_or_compute('  How many PTO   days? ', embed) == [1.0]
+        # Case is kept: a cased embedding model may tell "IT" from "it"
+        assert cache.get_or_compute('how many pto days?', embed) == [2.0]
+        cache.get_or_compute('b', embed)
+        cache.get_or_compute('How many PTO days?', embed)
+        assert len(calls) == 4
+        assert cache.stats() == {'entries': 2, 'hits': 1, 'misses': 4}
+
+    def test_query_cache_batches_misses(self):
+        """Test that a batch embeds only unseen queries, once each, in one call."""
+        pytest.importorskip('langchain_core')
+        from src.embedding_cache import QueryEmbeddingCache
+        cache = QueryEmbeddingCache(max_entries=10)
+        cache.get_or_compute('a', lambda q: [0.0])
+        batches = []
+        embed_many = lambda qs: batches.append(qs) or [[float(len(q))] for q in qs]
+        
+        vectors = cache.get_or_compute_many(['a', 'bb', ' bb ', 'ccc'], embed_many)
+        assert batches == [['bb', 'ccc']]
+        assert vectors == [[0.0], [2.0], [2.0], [3.0]]
+
+
+class TestMarkdownParser:
+    """Tests for the single-pass markdown parser."""
+    
+    def test_sections_carry_heading_path(self):
+        """Test that nested headings produce a heading path per section."""
+        from src.markdown_parser import parse_markdown
+        sections = parse_markdown("# Policy\n\n## Accrual\n- **15 days** per [year](http://x)\n")
+        assert len(sections) == 1
+        assert sections[0]['metadata']['heading'] == 'Policy > Accrual'
+        assert sections[0]['text'] == 'Policy > Accrual\n- 15 days per year'
+    
+    def test_fenced_code_is_not_a_heading(self):
+        """Test that '#' lines inside code fences stay in the body."""
+        from src.markdown_parser import parse_markdown
+        sections = parse_markdown("# Title\n```\n# comment\n```\n")
+        assert len(sections) == 1
+        assert '# comment' in sections[0]['text']
+
+    def _ingestion(self, monkeypatch):
+        pytest.importorskip('langchain_text_splitters')
+        pytest.importorskip('pypdf')
+        from src import ingestion
+        from src.config import Config
+        monkeypatch.setattr(Config, 'EMBEDDING_CACHE_PATH', '')
+        monkeypatch.setattr(ingestion, 'get_embeddings', lambda config: None)
+        return ingestion.DocumentIngestion()
+
+    def test_sections_are_packed_across_heading_levels(self, monkeypatch):
+        """Test that small sections share a chunk that states their common heading path once."""
+        from src.markdown_parser import parse_markdown
+        loader = self._ingestion(monkeypatch)
+        md = "# Policy\n## Leave\n- 15 days\n### Sick\n- 5 days\n## Pay\nMonthly.\n"
+        chunks = list(loader._split_sections(parse_markdown(md)))
+        assert chunks == [("Policy\nLeave\n- 15 days\n\nLeave > Sick\n- 5 days\n\nPay\nMonthly.",
+                           {'heading': 'Policy'})]
+
+    def test_continued_section_repeats_its_heading(self, monkeypatch):
+        """Test that a section cut at a line boundary restates its heading in the next chunk."""
+        from src.config import Config
+        from src.markdown_parser import parse_markdown
+        monkeypatch.setattr(Config, 'CHUNK_SIZE', 75)
+        loader = self._ingestion(monkeypatch)
+        items = "".join(f"- Item number {i} of the list\n" for i in range(4))
+        chunks = list(loader._split_sections(parse_markdown(f"# Policy\n## Rules\n{items}")))
+        assert [text for text, _ in chunks] == [
+            "Policy > Rules\n- Item number 0 of the list\n- Item number 1 of the list",
+            "Policy > Rules\n- Item number 2 of the list\n- Item number 3 of the list",
+        ]
+
+    def test_fewer_chunks_than_the_previous_splitter(self, monkeypatch):
+        """Test that the bundled policies need fewer chunks than HTML-rendered text split with overlap."""
+        markdown = pytest.importorskip('markdown')
+        from bs4 import BeautifulSoup
+        from src.markdown_parser import parse_markdown
+        loader = self._ingestion(monkeypatch)
+        old = new = 0
+        for name in sorted(os.listdir('data/policies')):
+            with open(os.path.join('data/policies', name), encoding='utf-8') as f:
+                md = f.read()
+            text = BeautifulSoup(markdown.markdown(md), 'html.parser').get_text().strip()
+            old += len(loader.text_splitter.split_text(text))
+            chunks = [text for text, _ in loader._split_sections(parse_markdown(md))]
+            assert all(len(chunk) <= loader.config.CHUNK_SIZE for chunk in chunks)
+            new += len(chunks)
+        assert 0 < new < old
+
+
+class TestNearDuplicateIndex:
+    """Tests for MinHash/LSH near-duplicate detection."""
+    
+    def test_near_duplicate_is_found(self, tmp_path):
+        """Test that lightly edited boilerplate matches the stored chunk."""
+        from src.dedup import MinHasher, NearDuplicateIndex
+        hasher = MinHasher()
+        index = NearDuplicateIndex(str(tmp_path / 'dedup.db'), threshold=0.7)
+        footer = ("This document is confidential and intended solely for employees of the company. "
+                  "Do not distribute outside the organization without written approval from legal.")
+        index.add('a:1:0', hasher.signature(footer))
+        
+        assert index.find(hasher.signature(footer.replace('legal.', 'Legal!'))) == 'a:1:0'
+        assert index.find(hasher.signature("Employees accrue 15 days of PTO per year.")) is None
+
+
+class TestContextPacker:
+    """Tests for token-budgeted context packing."""
+    
+    def test_context_stays_within_budget(self):
+        """Test that packed context never exceeds the token budget."""
+        from src.context_packer import TokenCounter, format_source_header, pack_context
+        counter = TokenCounter()
+        docs = [{'source': f'doc{i}.md', 'content': 'policy text ' * (40 * (i + 1))} for i in range(4)]
+        packed = pack_context(docs, 300, counter)
+        
+        context = "\n\n---\n\n".join(
+            format_source_header(i + 1, d) + d['content'] for i, d in enumerate(packed))
+        assert counter.count(context) <= 300
+        assert packed[0]['source'] == 'doc0.md'
+        assert 'truncated' not in packed[0]
+
+
+class TestPolicyWatcher:
+    """Tests for the debounced policy folder watcher."""
+
+    def test_events_are_debounced(self, tmp_path):
+        """Test that a burst of events is reported once, after it settles."""
+        from src.watcher import PolicyWatcher
+        watcher = PolicyWatcher(str(tmp_path), lambda names: None, debounce_seconds=0.2)
+        watcher.notify(['a.md', '.a.md.swp'])
+        watcher.notify(['b.md'])
+        assert watcher._take_settled() == set()
+
+        watcher._last_event -= 1
+        assert watcher._take_settled() == {'a.md', 'b.md'}
+        assert watcher._take_settled() == set()
+
+
+class TestStageProfiler:
+    """Tests for ingestion stage profiling."""
+
+    def test_timed_iter_counts_items(self):
+        """Test that timed iteration charges each produced item to its stage."""
+        from src.profiling import StageProfiler
+        profiler = StageProfiler()
+        assert list(profiler.timed_iter('chunk', range(3))) == [0, 1, 2]
+        with profiler.stage('embed', 3):
+            pass
+
+        report = profiler.report()
+        assert report['stages']['chunk']['items'] == 3
+        assert report['stages']['embed'] == {'seconds': report['stages']['embed']['seconds'],
+                                             'calls': 1, 'items': 3}
+        json.dumps(report)
+
+
+class TestEmbeddingBackends:
+    """Tests for pluggable embedding backends."""
+
+    def test_mean_pooling_ignores_padding(self):
+        """Test that padded positions do not change the pooled, normalized vector."""
+        np = pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.embeddings import _pool
+        hidden = np.array([[[1.0, 0.0], [3.0, 4.0], [100.0, 100.0]]])
+        vectors = _pool(hidden, np.array([[1, 1, 0]]), 'mean', normalize=True)
+        assert np.allclose(vectors[0], [2.0 / np.hypot(2.0, 2.0), 2.0 / np.hypot(2.0, 2.0)])
+
+    def test_backend_is_part_of_model_identity(self):
+        """Test that switching to quantized ONNX vectors forces a rebuild."""
+        pytest.importorskip('langchain_core')
+        from src.config import Config
+        from src.embeddings import embedding_model_id
+        config = Config()
+        config.EMBEDDING_BACKEND = 'onnx'
+        config.ONNX_QUANTIZED = True
+        assert embedding_model_id(config) == f'{config.EMBEDDING_MODEL}@onnx-int8'
+
+    def test_registry_shares_one_model(self, monkeypatch):
+        """Test that ingestion and retrieval get the same loaded model instance."""
+        pytest.importorskip('langchain_core')
+        from src import embeddings
+        from src.config import Config
+        monkeypatch.setattr(embeddings, '_registry', {})
+        monkeypatch.setattr(embeddings, 'create_embeddings', lambda config: object())
+        assert embeddings.get_embeddings(Config()) is embeddings.get_embeddings(Config())
+
+    def test_batched_queries_use_the_query_prompt(self):
+        """Test that batched query embedding encodes with the query kwargs, like embed_query()."""
+        pytest.importorskip('langchain_core')
+        from src.embeddings import embed_queries
+
+        class PromptedEmbeddings:
+            encode_kwargs = {}
+            query_encode_kwargs = {'prompt': 'query: '}
+
+            def _embed(self, texts, encode_kwargs):
+                return [[len(encode_kwargs.get('prompt', '') + text)] for text in texts]
+
+            def embed_query(self, text):
+                return self._embed([text], self.query_encode_kwargs)[0]
+
+        model = PromptedEmbeddings()
+        assert embed_queries(model, ['a', 'bb']) == [model.embed_query('a'), model.embed_query('bb')]
+
+
+class TestVectorCompression:
+    """Tests for compact (reduced / float16) vector storage."""
+
+    def test_pca_projection_round_trip(self, tmp_path):
+        """Test that a fitted projection reloads and keeps neighbours of low-rank data."""
+        np = pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.vector_compression import VectorProjection, recall_at_k
+        rng = np.random.default_rng(0)
+        docs = rng.normal(size=(200, 4)) @ rng.normal(size=(4, 32))
+        projection = VectorProjection('pca', 8, 'float16').fit(docs)
+        projection.save(tmp_path)
+        
+        loaded = VectorProjection.load(tmp_path)
+        assert loaded.transform(docs[:2]).shape == (2, 8)
+        assert loaded.transform(docs[:2]).dtype == np.float16
+        assert recall_at_k(docs, docs[:20], loaded, k=4) >= 0.9
+        assert VectorProjection.load(tmp_path / 'missing') is None
+
+
+class TestMatrixVectorStore:
+    """Tests for the memory-mapped exact-search backend."""
+
+    def test_exact_top_k_matches_brute_force(self, tmp_path):
+        """Test that exported vectors are searched exactly with squared-L2 scores."""
+        np = pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.matrix_store import MatrixVectorStore, export_matrix
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(50, 8)).astype(np.float32)
+        
+        class FakeCollection:
+            def count(self):
+                return len(vectors)
+            
+            def get(self, include, limit, offset):
+                rows = range(offset, min(offset + limit, len(vectors)))
+                return {'ids': [f'id{i}' for i in rows], 'embeddings': vectors[offset:offset + limit],
+                        'documents': [f'doc {i}' for i in rows], 'metadatas': [{'source': 'a.md'} for _ in rows]}
+        
+        export_matrix(FakeCollection(), tmp_path)
+        store = MatrixVectorStore(tmp_path)
+        query = rng.normal(size=8).astype(np.float32)
+        results = store.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=3)
+        
+        expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:3]
+        assert [doc.page_content for doc, _ in results] == [f'doc {i}' for i in expected]
+        assert results[0][1] == pytest.approx(float(((vectors[expected[0]] - query) ** 2).sum()), rel=1e-4)
+        store.close()
+
+    def test_chunk_table_is_queried_not_loaded(self, tmp_path):
+        """Test that chunks are looked up by id and row from the exported table."""
+        np = pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.matrix_store import MatrixVectorStore, export_matrix
+        vectors = np.arange(12, dtype=np.float32).reshape(6, 2)
+
+        class FakeCollection:
+            def count(self):
+                return len(vectors)
+
+            def get(self, include, limit, offset):
+                rows = range(offset, min(offset + limit, len(vectors)))
+                return {'ids': [f'id{i}' for i in rows], 'embeddings': vectors[offset:offset + limit],
+                        'documents': [f'doc {i}' for i in rows],
+                        'metadatas': [{'source': 'a.md', 'chunk': i} for i in rows]}
+
+        assert export_matrix(FakeCollection(), tmp_path) == 6
+        store = MatrixVectorStore(tmp_path)
+        assert len(store) == 6 and not hasattr(store, 'documents')
+        found = store.get(ids=['id4', 'missing', 'id1'], include=['embeddings'])
+        assert found['ids'] == ['id4', 'id1']
+        assert found['metadatas'] == [{'source': 'a.md', 'chunk': 4}, {'source': 'a.md', 'chunk': 1}]
+        assert found['embeddings'].tolist() == [[8.0, 9.0], [2.0, 3.0]]
+        assert store.chunks([5, 0]) == [('id5', 'doc 5', {'source': 'a.md', 'chunk': 5}),
+                                        ('id0', 'doc 0', {'source': 'a.md', 'chunk': 0})]
+        store.close()
+
+
+class TestLexicalIndex:
+    """Tests for BM25 keyword search and rank fusion."""
+
+    def test_bm25_matches_exact_terms(self, tmp_path):
+        """Test that exact identifiers are found and re-adding a chunk replaces it."""
+        from src.lexical_index import LexicalIndex
+        index = LexicalIndex(str(tmp_path / 'lexical.sqlite3'))
+        index.add_many([
+            ('a', 'Contractors submit a W-9 form before their first invoice.'),
+            ('b', 'Enable MFA on every account that supports it.'),
+            ('c', 'Employees accrue paid time off each month.'),
+        ])
+        index.commit()
+        assert index.search('Where do I send my W-9?')[0][0] == 'a'
+        assert index.search('mfa')[0][0] == 'b'
+        
+        index.add_many([('b', 'Passwords must be rotated yearly.')])
+        index.commit()
+        assert index.search('mfa') == []
+        assert len(index) == 3
+        index.close()
+
+    def test_reciprocal_rank_fusion(self):
+        """Test that items ranked well by both lists come first."""
+        from src.lexical_index import reciprocal_rank_fusion
+        fused = reciprocal_rank_fusion([['x', 'y', 'z'], ['y', 'w']], k=60)
+        assert [item for item, _ in fused] == ['y', 'x', 'w', 'z']
+
+
+class TestQueryRouter:
+    """Tests for category routing of questions."""
+
+    def test_routes_confident_questions_only(self):
+        """Test that clear questions are routed and ambiguous ones search everything."""
+        from src.query_router import DEFAULT_ROUTES, QueryRouter
+        router = QueryRouter(DEFAULT_ROUTES)
+        sources = ['pto_policy.md', 'expense_policy.md', 'security_policy.md', 'holiday_policy.md']
+        
+        assert router.route('Is multi-factor authentication required?', sources) == (
+            'Security', ['security_policy.md'])
+        assert router.route('What is the mileage reimbursement rate?', sources)[1] == ['expense_policy.md']
+        assert router.route('Can I use PTO on a holiday?', sources) == (None, None)
+        assert router.route('Hello there', sources) == (None, None)
+        # A category with no indexed documents falls back to a global search
+        assert router.route('Do I need a VPN when working from home?', ['pto_policy.md']) == (None, None)
+
+    def test_matrix_search_restricted_to_rows(self, tmp_path):
+        """Test that pre-filtered matrix search only returns chunks of the given sources."""
+        np = pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.matrix_store import MatrixVectorStore, export_matrix
+        vectors = np.random.default_rng(2).normal(size=(20, 4)).astype(np.float32)
+        
+        class FakeCollection:
+            def count(self):
+                return len(vectors)
+            
+            def get(self, include, limit, offset):
+                rows = range(offset, min(offset + limit, len(vectors)))
+                return {'ids': [f'id{i}' for i in rows], 'embeddings': vectors[offset:offset + limit],
+                        'documents': [f'doc {i}' for i in rows],
+                        'metadatas': [{'source': 'a.md' if i % 2 else 'b.md'} for i in rows]}
+        
+        export_matrix(FakeCollection(), tmp_path)
+        store = MatrixVectorStore(tmp_path)
+        rows, distances = store.search(vectors[3].tolist(), k=3, rows=store.rows_for_sources(['a.md']))
+        assert rows[0] == 3 and distances[0] == pytest.approx(0.0, abs=1e-5)
+        assert all(row % 2 for row in rows.tolist())
+
+        batch = store.search_many([vectors[3].tolist(), vectors[8].tolist()], k=3)
+        for query, (batch_rows, _) in zip((vectors[3], vectors[8]), batch):
+            assert batch_rows.tolist() == store.search(query.tolist(), k=3)[0].tolist()
+
+
+class TestThresholdCalibration:
+    """Tests for the retrieval confidence threshold calibration."""
+
+    def test_threshold_separates_off_topic_questions(self):
+        """Test that the threshold keeps answerable questions and refuses distant ones."""
+        pytest.importorskip('numpy')
+        from src.evaluation import calibrate_distance_threshold
+        report = calibrate_distance_threshold([0.3, 0.5, 0.6], [0.9, 1.1], margin=0.05)
+        assert report['threshold'] == pytest.approx(0.65)
+        assert report['positive_recall'] == 1.0
+        assert report['negative_rejection'] == 1.0
+        assert report['separable']
+        
+        # Trading recall for rejection when the sets overlap
+        report = calibrate_distance_threshold([0.3, 0.4, 0.5, 1.0], [0.7], target_recall=0.75, margin=0.0)
+        assert report['threshold'] == pytest.approx(0.5)
+        assert report['positive_recall'] == 0.75 and report['negative_rejection'] == 1.0
+
+
+class TestAnswerCache:
+    """Tests for the two-tier answer cache."""
+
+    def test_exact_and_semantic_hits(self, tmp_path):
+        """Test that rephrased and paraphrased questions hit, and unrelated ones miss."""
+        pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.answer_cache import AnswerCache
+        cache = AnswerCache(str(tmp_path / 'answers.sqlite3'), similarity_threshold=0.95)
+        cache.put('How many PTO days?', [1.0, 0.0, 0.0], 'v1', {'answer': '15 days'})
+        
+        assert cache.get_exact('  How many PTO  days? ', 'v1') == {'answer': '15 days'}
+        assert cache.get_exact('How much PTO do I get?', 'v1') is None
+        assert cache.get_similar([0.99, 0.1, 0.0], 'v1') == {'answer': '15 days'}
+        assert cache.get_similar([0.0, 0.0, 1.0], 'v1') is None
+        
+        # Reopened from disk, still valid for the same index version
+        reopened = AnswerCache(str(tmp_path / 'answers.sqlite3'))
+        assert reopened.get_exact('How many PTO days?', 'v1') is not None
+        assert reopened.get_similar([1.0, 0.0, 0.0], 'v1') is not None
+
+    def test_invalidation_ttl_and_lru(self, tmp_path):
+        """Test that a new index version, expiry and capacity all drop entries."""
+        pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.answer_cache import AnswerCache
+        cache = AnswerCache(str(tmp_path / 'answers.sqlite3'), max_entries=2)
+        cache.put('a', [1.0, 0.0], 'v1', {'answer': 'a'})
+        assert cache.get_exact('a', 'v2') is None
+        assert cache.stats()['entries'] == 0
+        
+        cache.put('a', [1.0, 0.0], 'v2', {'answer': 'a'})
+        cache.put('b', [0.0, 1.0], 'v2', {'answer': 'b'})
+        cache.get_exact('a', 'v2')
+        cache.put('c', [0.7, 0.7], 'v2', {'answer': 'c'})
+        assert cache.get_exact('b', 'v2') is None  # least recently used
+        assert cache.get_similar([0.0, 1.0], 'v2') is None
+        assert cache.get_exact('a', 'v2') is not None
+        
+        cache.ttl_seconds = 0
+        assert cache.get_exact('a', 'v2') is None
+        assert cache.get_similar([1.0, 0.0], 'v2') is None
+
+    def test_answer_from_replaced_version_is_not_stored(self, tmp_path):
+        """Test that a request finishing after an index swap leaves the new version's entries alone."""
+        pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.answer_cache import AnswerCache
+        cache = AnswerCache(str(tmp_path / 'answers.sqlite3'))
+        assert cache.get_exact('a', 'v1') is None
+        cache.get_exact('b', 'v2')
+        cache.put('b', [0.0, 1.0], 'v2', {'answer': 'b'})
+
+        cache.put('a', [1.0, 0.0], 'v1', {'answer': 'stale'})
+        assert cache.get_exact('a', 'v1') is None
+        assert cache.get_exact('b', 'v2') == {'answer': 'b'}
+        assert cache.stats()['entries'] == 1
+
+    def test_processes_on_different_versions_keep_their_own_answers(self, tmp_path):
+        """Test that a process still serving an older index version cannot overwrite or serve into a newer one."""
+        pytest.importorskip('numpy')
+        pytest.importorskip('langchain_core')
+        from src.answer_cache import AnswerCache
+        path = str(tmp_path / 'answers.sqlite3')
+        old, new = AnswerCache(path), AnswerCache(path)
+        old.put('How many PTO days?', [1.0, 0.0], 'v1', {'answer': '15 days'})
+        new.put('How many PTO days?', [1.0, 0.0], 'v2', {'answer': '20 days'})
+        old.put('How many PTO days?', [1.0, 0.0], 'v1', {'answer': '15 days'})
+
+        assert new.get_exact('How many PTO days?', 'v2') == {'answer': '20 days'}
+        assert new.get_similar([1.0, 0.0], 'v2') == {'answer': '20 days'}
+        assert old.get_exact('How many PTO days?', 'v1') == {'answer': '15 days'}
+
+    def test_exact_hit_skips_the_query_embedding(self, tmp_path):
+        """Test that RAGRetriever only embeds a question after an exact-tier miss."""
+        pytest.importorskip("langchain_groq")
+        from src.answer_cache import AnswerCache
+        from src.config import Config
+        from src.retrieval import RAGRetriever
+        retriever = RAGRetriever.__new__(RAGRetriever)
+        retriever.config = Config()
+        retriever.answer_cache = AnswerCache(str(tmp_path / 'answers.sqlite3'))
+        retriever.refresh_index = lambda: False
+        retriever.index_version = 'v1'
+        retriever._answer_settings = 'settings'
+        embedded = []
+        retriever.embed_query = lambda question: embedded.append(question) or [1.0, 0.0]
+
+        cached, cache_version, vector = retriever._cache_lookup('How many PTO days?')
+        assert cached is None and vector == [1.0, 0.0] and embedded == ['How many PTO days?']
+        retriever.answer_cache.put('How many PTO days?', vector, cache_version, {'answer': '15 days'})
+
+        cached, _, vector = retriever._cache_lookup(' How many PTO  days?')
+        assert cached == {'answer': '15 days'} and vector is None
+        assert embedded == ['How many PTO days?']
+
+
+class TestReranker:
+    """Tests for cross-encoder reranking under a latency budget."""
+
+    class FakeCrossEncoder:
+        def __init__(self, delay=0.0):
+            self.delay = delay
+            self.calls = 0
+
+        def predict(self, pairs):
+            time.sleep(self.delay)
+            self.calls += 1
+            return [len(set(q.lower().split()) & set(d.lower().split())) for q, d in pairs]
+
+    def test_reorders_by_cross_encoder_score(self):
+        """Test that candidates are batch-scored and sorted best first."""
+        from src.reranker import CrossEncoderReranker
+        model = self.FakeCrossEncoder()
+        reranker = CrossEncoderReranker('fake', batch_size=2, model=model)
+        docs = [{'content': 'holiday schedule'}, {'content': 'pto days per year'}, {'content': 'pto days'}]
+        
+        reranked = reranker.rerank('how many pto days per year', docs)
+        assert [d['content'] for d in reranked] == ['pto days per year', 'pto days', 'holiday schedule']
+        assert model.calls == 2
+
+    def test_budget_exceeded_keeps_retrieval_order(self):
+        """Test that scoring stops and returns None when the budget runs out."""
+        from src.reranker import CrossEncoderReranker
+        reranker = CrossEncoderReranker('fake', batch_size=1, budget_ms=5, model=self.FakeCrossEncoder(delay=0.02))
+        docs = [{'content': 'a'}, {'content': 'b'}, {'content': 'c'}]
+        assert reranker.rerank('b', docs) is None
+        assert reranker.timeouts == 1
+
+    def test_budget_applies_to_a_single_batch(self):
+        """Test that a slow model over the default batch size still falls back to retrieval order."""
+        from src.reranker import CrossEncoderReranker
+        model = self.FakeCrossEncoder(delay=0.05)
+        reranker = CrossEncoderReranker('fake', budget_ms=20, model=model)
+        docs = [{'content': 'holiday schedule'}, {'content': 'pto days per year'}, {'content': 'pto days'}]
+        assert reranker.rerank('how many pto days per year', docs) is None
+        assert model.calls == 1 and reranker.timeouts == 1
+        assert 'rerank_score' not in docs[0]
+
+
+class TestShardedStore:
+    """Tests for the sharded vector store."""
+
+    def test_layouts_are_deterministic(self):
+        """Test that sources map to stable shards for both sharding methods."""
+        pytest.importorskip('chromadb')
+        pytest.importorskip('langchain_community')
+        from src.sharded_store import ShardLayout
+        layout = ShardLayout.create('hash', shards=3)
+        assert layout.names() == ['shard-00', 'shard-01', 'shard-02']
+        assert layout.shard_for('pto_policy.md') == layout.shard_for('pto_policy.md')
+        
+        layout = ShardLayout.from_description(ShardLayout.create('category').describe())
+        assert layout.shard_for('pto_policy.md') == 'pto'
+        assert layout.shard_for('remote_work_policy.md') == 'remote-work'
+        assert layout.shard_for('dress_code.md') == 'other'
+
+    def test_fan_out_query_merges_top_k(self, tmp_path):
+        """Test that per-shard results are merged into the global top-k by distance."""
+        pytest.importorskip('chromadb')
+        pytest.importorskip('langchain_community')
+        from src.sharded_store import ShardLayout, ShardedVectorStore
+        store = ShardedVectorStore(tmp_path, ShardLayout.create('category'))
+        sources = ['pto_policy.md', 'expense_policy.md', 'security_policy.md', 'holiday_policy.md']
+        vectors = [[float(i), 0.0] for i in range(8)]
+        store._collection.upsert(ids=[f'id{i}' for i in range(8)], embeddings=vectors,
+                                 metadatas=[{'source': sources[i % 4]} for i in range(8)],
+                                 documents=[f'doc {i}' for i in range(8)])
+        assert store._collection.count() == 8
+        assert store._collection.shards['pto']._collection.count() == 2
+        
+        result = store._collection.query(query_embeddings=[[2.2, 0.0], [6.9, 0.0]], n_results=3)
+        assert result['ids'] == [['id2', 'id3', 'id1'], ['id7', 'id6', 'id5']]
+        result = store._collection.query(query_embeddings=[[2.2, 0.0]], n_results=3,
+                                         where={'source': 'pto_policy.md'})
+        assert result['ids'] == [['id4', 'id0']]
+        assert len(store._collection.get(limit=5, offset=6)['ids']) == 2
+
+
+class TestStreaming:
+    """Tests for streaming and async RAGRetriever query paths."""
+    
+    def test_stream_events(self):
+        """Retrieval comes first, then token deltas, then the full result with citations."""
+        pytest.importorskip("langchain_groq")
+        from types import SimpleNamespace
+        from src.retrieval import RAGRetriever
+        from src.config import Config
+        
+        retriever = RAGRetriever.__new__(RAGRetriever)
+        retriever.config = Config()
+        retriever.config.MAX_RELEVANCE_DISTANCE = 0
+        retriever.answer_cache = None
+        doc = {'id': 'c1', 'content': 'Employees get 15 PTO days.', 'source': 'pto_policy.md', 'score': 0.2}
+        retriever.retrieve_documents = lambda question, k=None: [dict(doc)]
+        retriever.llm = SimpleNamespace(
+            stream=lambda prompt: iter([SimpleNamespace(content=t) for t in ['15 days', '', ' [1]']])
+        )
+        
+        events = list(retriever.stream_query('How many PTO days?'))
+        assert [e['type'] for e in events] == ['retrieval', 'token', 'token', 'answer']
+        result = events[-1]['result']
+        assert result['answer'] == '15 days [1]'
+        assert result['citations'][0]['source'] == 'pto_policy.md'
+
+    def test_async_stream_matches_sync_stream(self, tmp_path):
+        """astream_query yields the same events as stream_query, including refusals and cache hits."""
+        pytest.importorskip("langchain_groq")
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from types import SimpleNamespace
+        from src.answer_cache import AnswerCache
+        from src.retrieval import RAGRetriever
+        from src.config import Config
+
+        async def astream(prompt):
+            for text in ['15 days', '', ' [1]']:
+                yield SimpleNamespace(content=text)
+
+        retriever = RAGRetriever.__new__(RAGRetriever)
+        retriever.config = Config()
+        retriever.config.MAX_RELEVANCE_DISTANCE = 1.0
+        retriever.answer_cache = AnswerCache(str(tmp_path / 'answers.sqlite3'))
+        retriever._retrieval_executor = ThreadPoolExecutor(max_workers=2)
+        retriever.refresh_index = lambda: False
+        retriever.index_version, retriever._answer_settings = 'v1', 'settings'
+        retriever.embed_query = lambda question: [1.0, 0.0] if 'PTO' in question else [0.0, 1.0]
+        docs = {'PTO': {'id': 'c1', 'content': 'Employees get 15 PTO days.', 'source': 'pto_policy.md',
+                        'score': 0.2},
+                'Mars': {'id': 'c2', 'content': 'Unrelated.', 'source': 'other.md', 'score': 1.8}}
+        retriever.retrieve_documents = lambda question, k=None: [dict(docs[question.split()[-1]])]
+        retriever.llm = SimpleNamespace(
+            stream=lambda prompt: iter([SimpleNamespace(content=t) for t in ['15 days', '', ' [1]']]),
+            astream=astream
+        )
+
+        async def collect(question):
+            return [event async for event in retriever.astream_query(question)]
+
+        for question in ['Days of PTO', 'Weather on Mars']:
+            expected = list(retriever.stream_query(question))
+            retriever.answer_cache.close()
+            (tmp_path / 'answers.sqlite3').unlink()
+            retriever.answer_cache = AnswerCache(str(tmp_path / 'answers.sqlite3'))
+            assert asyncio.run(collect(question)) == expected
+            # The second call is served from the cache as a single token
+            cached = asyncio.run(collect(question))
+            assert [e['type'] for e in cached] == ['retrieval', 'token', 'answer']
+            assert cached == list(retriever.stream_query(question))
+        assert [e['type'] for e in expected] == ['retrieval', 'token', 'answer']
+        assert expected[-1]['result']['citations'] == []
+
+    def test_async_query(self):
+        """aquery awaits the LLM and returns the same result shape as query."""
+        pytest.importorskip("langchain_groq")
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from types import SimpleNamespace
+        from src.retrieval import RAGRetriever
+        from src.config import Config
+        
+        async def ainvoke(prompt):
+            await asyncio.sleep(0.05)
+            return SimpleNamespace(content='15 days [1]')
+        
+        retriever = RAGRetriever.__new__(RAGRetriever)
+        retriever.config = Config()
+        retriever.config.MAX_RELEVANCE_DISTANCE = 0
+        retriever.answer_cache = None
+        retriever._retrieval_executor = ThreadPoolExecutor(max_workers=2)
+        doc = {'id': 'c1', 'content': 'Employees get 15 PTO days.', 'source': 'pto_policy.md', 'score': 0.2}
+        retriever.retrieve_documents = lambda question, k=None: [dict(doc)]
+        retriever.llm = SimpleNamespace(ainvoke=ainvoke)
+        
+        async def run_all():
+            return await asyncio.gather(*[retriever.aquery(f'PTO question {i}') for i in range(20)])
+        
+        start = time.time()
+        results = asyncio.run(run_all())
+        # LLM waits overlap instead of running one after another
+        assert time.time() - start < 0.5
+        assert all(r['answer'] == '15 days [1]' and r['citations'] for r in results)
+
+
+class TestRetrieverPipeline:
+    """Tests for RAGRetriever retrieval over a small temporary index."""
+
+    # Every chunk but the form one contains "the", so the form chunk is the farthest by vector
+    POLICIES = {
+        'pto_policy.md': "# PTO Policy\n\n## Accrual\nEmployees accrue fifteen days of paid time off over the year.\n\n"
+                         "## Rollover\nUp to five unused days roll over into the next year.\n",
+        'expense_policy.md': "# Expense Policy\n\n## Meals\nMeals during the business trip are reimbursed daily.\n\n"
+                             "## Forms\nContractors submit form W9X-552 before their first invoice is paid.\n",
+        'security_policy.md': "# Security Policy\n\n## Passwords\nPasswords are rotated every quarter and the MFA "
+                              "app protects them.\n\n## Devices\nLaptops use full disk encryption across the fleet.\n",
+    }
+
+    @staticmethod
+    def _embeddings(query_prefix=''):
+        import hashlib
+        import math
+        import re
+        from langchain_core.embeddings import Embeddings
+
+        class WordEmbeddings(Embeddings):
+            """Bag of words; like many small models, it has no useful vector for codes such as W9X-552."""
+
+            def __init__(self):
+                self.calls = []
+
+            def _embed(self, text):
+                vector = [0.0] * 256
+                for word in re.findall(r"[a-z0-9-]+", text.lower()):
+                    if not any(c.isdigit() for c in word):
+                        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 256] += 1.0
+                norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+                return [v / norm for v in vector]
+
+            def embed_documents(self, texts):
+                self.calls.append(('documents', list(texts)))
+                return [self._embed(text) for text in texts]
+
+            def embed_query(self, text):
+                self.calls.append(('query', text))
+                # A query prompt, as instruction-tuned models use
+                return self._embed(query_prefix + text)
+
+        return WordEmbeddings()
+
+    def _retriever(self, tmp_path, monkeypatch, embeddings=None, **settings):
+        pytest.importorskip('langchain_groq')
+        pytest.importorskip('chromadb')
+        pytest.importorskip('langchain_text_splitters')
+        from src import ingestion, retrieval
+        from src.config import Config
+        from src.index_store import close_vector_store
+        embeddings = embeddings or self._embeddings()
+        defaults = {'DATA_DIR': str(tmp_path / 'policies'), 'CHROMA_DIR': str(tmp_path / 'index'),
+                    'EMBEDDING_CACHE_PATH': '', 'ANSWER_CACHE_PATH': '', 'INGEST_WORKERS': 1,
+                    'CHUNK_SIZE': 120, 'DEDUP_ENABLED': False, 'HYBRID_SEARCH': True, 'QUERY_ROUTING': True,
+                    'VECTOR_BACKEND': 'chroma', 'VECTOR_SHARDING': 'none', 'VECTOR_REDUCTION': 'none',
+                    'VECTOR_DTYPE': 'float32', 'RERANK_ENABLED': False, 'MAX_RELEVANCE_DISTANCE': 0,
+                    'TOP_K': 2, 'RETRIEVAL_OVERFETCH': 2.0, 'GROQ_API_KEY': 'test'}
+        for name, value in {**defaults, **settings}.items():
+            monkeypatch.setattr(Config, name, value)
+        monkeypatch.setattr(ingestion, 'get_embeddings', lambda config: embeddings)
+        monkeypatch.setattr(retrieval, 'get_embeddings', lambda config: embeddings)
+        (tmp_path / 'policies').mkdir()
+        for name, text in self.POLICIES.items():
+            (tmp_path / 'policies' / name).write_text(text)
+        close_vector_store(ingestion.DocumentIngestion().ingest_all())
+        return retrieval.RAGRetriever()
+
+    def test_exact_term_found_only_by_keywords_reaches_top_k(self, tmp_path, monkeypatch):
+        """Test that BM25 fusion surfaces a form-code chunk vector search misses, scored like dense hits."""
+        retriever = self._retriever(tmp_path, monkeypatch, QUERY_ROUTING=False)
+        query = 'Where do the W9X-552 go?'
+        query_vector = retriever.embed_query(query)
+        dense = retriever._search_vectors(retriever.vector_store, query_vector, k=4)
+        assert all('W9X-552' not in doc['content'] for doc in dense)
+
+        docs = retriever.retrieve_documents(query)
+        form = next(doc for doc in docs if 'W9X-552' in doc['content'])
+        assert form['bm25_score'] > 0
+
+        # Lexical-only hits get the squared-L2 distance a dense search would report
+        everything = retriever._search_vectors(retriever.vector_store, query_vector, k=100)
+        assert form['score'] == pytest.approx(
+            next(doc['score'] for doc in everything if doc['id'] == form['id']), abs=1e-5)
+        assert max(doc['score'] for doc in dense) <= form['score']
+
+    def test_routed_query_only_returns_category_chunks(self, tmp_path, monkeypatch):
+        """Test that a confidently routed question is searched within its category's documents."""
+        retriever = self._retriever(tmp_path, monkeypatch)
+        query = 'How many PTO days do employees accrue?'
+        assert retriever.router.route(query, retriever.indexed_sources)[0] == 'PTO'
+
+        docs = retriever.retrieve_documents(query, k=4)
+        assert len(docs) == 2 and {doc['source'] for doc in docs} == {'pto_policy.md'}
+
+    def test_ambiguous_query_searches_globally(self, tmp_path, monkeypatch):
+        """Test that a question matching several categories equally searches the whole index."""
+        retriever = self._retriever(tmp_path, monkeypatch)
+        query = 'Can PTO days be used for meals during the trip?'
+        assert retriever.router.route(query, retriever.indexed_sources) == (None, None)
+
+        docs = retriever.retrieve_documents(query, k=4)
+        assert len(docs) == 4 and len({doc['source'] for doc in docs}) > 1
+
+    def test_route_without_indexed_chunks_falls_back(self, tmp_path, monkeypatch):
+        """Test that a category with nothing to search falls back to a global search."""
+        retriever = self._retriever(tmp_path, monkeypatch)
+        query = 'Is there an internet stipend for remote employees?'
+        # No remote work policy is indexed, so the router does not route
+        assert retriever.router.route(query, retriever.indexed_sources) == (None, None)
+        assert len(retriever.retrieve_documents(query)) == 2
+
+        # Listed in the manifest but missing from the vector store: the routed search is empty
+        retriever.indexed_sources = retriever.indexed_sources + ['remote_work_policy.md']
+        assert retriever.router.route(query, retriever.indexed_sources)[0] == 'Remote Work'
+        docs = retriever.retrieve_documents(query)
+        assert len(docs) == 2 and 'remote_work_policy.md' not in {doc['source'] for doc in docs}
+
+    def test_batch_retrieval_matches_single_queries(self, tmp_path, monkeypatch):
+        """Test that batched retrieval equals one-by-one retrieval, whichever path filled the query cache."""
+        from src.embedding_cache import QueryEmbeddingCache
+        embeddings = self._embeddings(query_prefix='query: ')
+        retriever = self._retriever(tmp_path, monkeypatch, embeddings=embeddings)
+        retriever.indexed_sources = retriever.indexed_sources + ['remote_work_policy.md']
+        queries = ['How many PTO days do employees accrue?',           # routed
+                   'Can PTO days be used for meals during the trip?',  # ambiguous, global
+                   'Is there an internet stipend for remote employees?']  # routed, nothing indexed
+        assert [retriever.router.route(q, retriever.indexed_sources)[0] for q in queries] == [
+            'PTO', None, 'Remote Work']
+
+        def fresh_cache():
+            retriever.query_cache = QueryEmbeddingCache(100)
+
+        fresh_cache()
+        singles = [retriever.retrieve_documents(q) for q in queries]
+        fresh_cache()
+        assert retriever.retrieve_documents_batch(queries) == singles
+        # Warmed by embed_query(), as answer-cache lookups do
+        fresh_cache()
+        for query in queries:
+            retriever.embed_query(query)
+        assert retriever.retrieve_documents_batch(queries) == singles
+        # Warmed by the batch path, then read one by one
+        fresh_cache()
+        retriever.embed_queries(queries)
+        assert [retriever.retrieve_documents(q) for q in queries] == singles
+
+        fresh_cache()
+        assert retriever.embed_queries(queries) == [embeddings.embed_query(q) for q in queries]
+
+    @staticmethod
+    def _recording_llm():
+        from types import SimpleNamespace
+        prompts = []
+
+        def invoke(prompt):
+            prompts.append(prompt)
+            return SimpleNamespace(content='Employees accrue PTO monthly [1].')
+
+        async def ainvoke(prompt):
+            return invoke(prompt)
+
+        return SimpleNamespace(invoke=invoke, ainvoke=ainvoke, prompts=prompts)
+
+    def test_off_topic_question_is_refused_without_llm_call(self, tmp_path, monkeypatch):
+        """Test that a question beyond MAX_RELEVANCE_DISTANCE is refused before the LLM, sync and async."""
+        import asyncio
+        retriever = self._retriever(tmp_path, monkeypatch, MAX_RELEVANCE_DISTANCE=1.2)
+        retriever.llm = self._recording_llm()
+        question = 'What is the capital of France?'
+        assert min(doc['score'] for doc in retriever.retrieve_documents(question)) > 1.2
+
+        assert retriever.query(question) == retriever._refusal()
+        assert asyncio.run(retriever.aquery(question)) == retriever._refusal()
+        assert retriever.llm.prompts == []
+
+    def test_confident_question_reaches_llm(self, tmp_path, monkeypatch):
+        """Test that a question within MAX_RELEVANCE_DISTANCE is answered by the LLM, sync and async."""
+        import asyncio
+        retriever = self._retriever(tmp_path, monkeypatch, MAX_RELEVANCE_DISTANCE=1.2)
+        retriever.llm = self._recording_llm()
+        question = 'How many PTO days do employees accrue?'
+        assert min(doc['score'] for doc in retriever.retrieve_documents(question)) <= 1.2
+
+        for result in (retriever.query(question), asyncio.run(retriever.aquery(question))):
+            assert result['answer'] == 'Employees accrue PTO monthly [1].'
+            assert result['citations'] and result['citations'][0]['source'] == 'pto_policy.md'
+        assert len(retriever.llm.prompts) == 2
+
+    def test_failed_retrieval_is_not_cached(self, tmp_path, monkeypatch):
+        """Test that a retrieval error is reported as an error and the next ask retrieves again."""
+        import asyncio
+        retriever = self._retriever(tmp_path, monkeypatch, ANSWER_CACHE_PATH=str(tmp_path / 'answers.sqlite3'))
+        retriever.llm = self._recording_llm()
+        search = retriever._search_vectors_many
+        searches = []
+
+        def failing_search(*args):
+            searches.append(args)
+            if len(searches) == 1:
+                raise RuntimeError('vector store unavailable')
+            return search(*args)
+
+        retriever._search_vectors_many = failing_search
+        question = 'How many PTO days do employees accrue?'
+        result = retriever.query(question)
+        assert 'vector store unavailable' in result['error'] and result['retrieved_docs'] == []
+        assert retriever.answer_cache.stats()['entries'] == 0
+
+        result = asyncio.run(retriever.aquery(question))
+        assert len(searches) == 2 and 'error' not in result
+        assert result['citations'][0]['source'] == 'pto_policy.md'
+        assert retriever.query(question) == result and len(searches) == 2
+
+
 @pytest.mark.skipif(not GRADIO_AVAILABLE, reason="Gradio not available")
 class TestGradioInterface:
     """Tests for Gradio interface."""